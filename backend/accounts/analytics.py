@@ -0,0 +1,278 @@
+"""
+Rollup tables behind the analytics endpoints.
+
+AppointmentDailyStat holds appointment counts and revenue per (day, doctor, status,
+payment_status). Saving or deleting an appointment moves its count (and paid fee)
+from the row it was in to the row it is in now, with an F() update on each.
+PatientDemographicStat holds patient counts per (age bucket, gender) and is adjusted
+by +1/-1 as users are created, edited or deleted.
+
+Writes that skip model signals (QuerySet.update, bulk_create) must call the refresh
+helpers themselves, or run `manage.py rebuild_analytics` afterwards.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, CharField, Count, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Appointment, AppointmentDailyStat, PatientDemographicStat, User
+
+AGE_BUCKETS = (
+    ("0-18", None, 18),
+    ("19-35", 18, 35),
+    ("36-50", 35, 50),
+    ("51-65", 50, 65),
+    ("65+", 65, None),
+)
+UNKNOWN_AGE = "unknown"
+
+
+def age_bucket(age):
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return UNKNOWN_AGE
+    for name, low, high in AGE_BUCKETS:
+        if (low is None or age > low) and (high is None or age <= high):
+            return name
+    return UNKNOWN_AGE
+
+
+def _age_bucket_expression():
+    whens = []
+    for name, low, high in AGE_BUCKETS:
+        q = Q()
+        if low is not None:
+            q &= Q(age__gt=low)
+        if high is not None:
+            q &= Q(age__lte=high)
+        whens.append(When(q, then=Value(name)))
+    return Case(*whens, default=Value(UNKNOWN_AGE), output_field=CharField())
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def _day_bounds(day):
+    start = day_start(day)
+    return start, start + timedelta(days=1)
+
+
+def appointment_day(date):
+    if isinstance(date, str):
+        date = parse_datetime(date)
+    if timezone.is_naive(date):
+        return date.date()
+    return timezone.localtime(date).date()
+
+
+# --- Appointment rollup ---
+
+def appointment_stat(appointment):
+    """
+    What one appointment adds to the rollup: ((day, doctor_id, status, payment_status),
+    revenue), or None when a field it needs wasn't loaded.
+    """
+    state = appointment.__dict__
+    if any(state.get(field) is None for field in ("date", "doctor_id", "status", "payment_status")):
+        return None
+    paid = state["payment_status"] == "paid" and state.get("fee_paid") is not None
+    revenue = Decimal(str(state["fee_paid"])) if paid else Decimal(0)
+    return (appointment_day(state["date"]), state["doctor_id"], state["status"], state["payment_status"]), revenue
+
+
+def _bump_appointment_stat(key, count, revenue):
+    day, doctor_id, status, payment_status = key
+    stats = AppointmentDailyStat.objects.filter(day=day, doctor_id=doctor_id, status=status, payment_status=payment_status)
+    if stats.update(count=F("count") + count, revenue=F("revenue") + revenue):
+        return
+    try:
+        with transaction.atomic():
+            AppointmentDailyStat.objects.create(
+                day=day, doctor_id=doctor_id, status=status, payment_status=payment_status, count=count, revenue=revenue,
+            )
+    except IntegrityError:
+        stats.update(count=F("count") + count, revenue=F("revenue") + revenue)
+
+
+def apply_appointment_changes(changes):
+    """
+    `changes` are (old, new) appointment_stat pairs, None for "no row" (created or
+    deleted). Applies the net change to each rollup row once.
+    """
+    deltas = {}
+    for old, new in changes:
+        if old == new:
+            continue
+        for stat, sign in ((old, -1), (new, 1)):
+            if stat is not None:
+                key, revenue = stat
+                count, total = deltas.get(key, (0, Decimal(0)))
+                deltas[key] = (count + sign, total + sign * revenue)
+    for key, (count, revenue) in deltas.items():
+        if count or revenue:
+            _bump_appointment_stat(key, count, revenue)
+
+
+def _appointment_groups(queryset):
+    return queryset.values("status", "payment_status").annotate(
+        total=Count("id"),
+        paid_revenue=Sum("fee_paid", filter=Q(payment_status="paid")),
+    )
+
+
+def refresh_appointment_day(doctor_id, day):
+    """
+    Recompute the rollup rows for one doctor on one day from the appointments table,
+    for saves whose previous state wasn't loaded.
+    """
+    start, end = _day_bounds(day)
+    groups = list(_appointment_groups(
+        Appointment.objects.filter(doctor_id=doctor_id, date__gte=start, date__lt=end)
+    ))
+    rows = [
+        AppointmentDailyStat(
+            day=day, doctor_id=doctor_id, status=g["status"], payment_status=g["payment_status"],
+            count=g["total"], revenue=g["paid_revenue"] or 0,
+        )
+        for g in groups
+    ]
+    # A concurrent refresh of the same key can insert first; the second attempt
+    # deletes those rows and writes its own (identical) counts.
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                AppointmentDailyStat.objects.filter(doctor_id=doctor_id, day=day).delete()
+                AppointmentDailyStat.objects.bulk_create(rows)
+            return
+        except IntegrityError:
+            if attempt:
+                raise
+
+
+def rebuild_appointment_stats():
+    groups = (
+        Appointment.objects.annotate(day=TruncDate("date"))
+        .values("day", "doctor_id", "status", "payment_status")
+        .annotate(total=Count("id"), paid_revenue=Sum("fee_paid", filter=Q(payment_status="paid")))
+        .order_by()
+    )
+    with transaction.atomic():
+        AppointmentDailyStat.objects.all().delete()
+        AppointmentDailyStat.objects.bulk_create(
+            (
+                AppointmentDailyStat(
+                    day=g["day"], doctor_id=g["doctor_id"], status=g["status"], payment_status=g["payment_status"],
+                    count=g["total"], revenue=g["paid_revenue"] or 0,
+                )
+                for g in groups.iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+def _appointment_stats(start_day, end_day=None, doctor=None):
+    stats = AppointmentDailyStat.objects.filter(day__gte=start_day)
+    if end_day is not None:
+        stats = stats.filter(day__lte=end_day)
+    if doctor is not None:
+        stats = stats.filter(doctor=doctor)
+    return stats
+
+
+def appointment_total(start_day, end_day=None, doctor=None):
+    return _appointment_stats(start_day, end_day, doctor).aggregate(total=Sum("count"))["total"] or 0
+
+
+def appointment_status_counts(start_day, end_day=None, doctor=None):
+    rows = (
+        _appointment_stats(start_day, end_day, doctor)
+        .values("status").annotate(count=Sum("count")).filter(count__gt=0).order_by("status")
+    )
+    return [{"status": r["status"], "count": r["count"]} for r in rows]
+
+
+def revenue_total(start_day, end_day=None, doctor=None):
+    stats = _appointment_stats(start_day, end_day, doctor).filter(payment_status="paid")
+    return stats.aggregate(total=Sum("revenue"))["total"] or 0
+
+
+def monthly_revenue(start_day, doctor=None):
+    return list(
+        _appointment_stats(start_day, doctor=doctor).filter(payment_status="paid")
+        .annotate(month=TruncMonth("day")).values("month")
+        .annotate(revenue=Sum("revenue")).order_by("month")
+    )
+
+
+# --- Patient demographics ---
+
+def demographic_key(user):
+    """(age_bucket, gender) the user counts towards, or None if not a patient."""
+    state = user.__dict__
+    if state.get("role") != "patient":
+        return None
+    return age_bucket(state.get("age")), state.get("gender") or ""
+
+
+def _bump_demographic(key, delta):
+    bucket, gender = key
+    stats = PatientDemographicStat.objects.filter(age_bucket=bucket, gender=gender)
+    if stats.update(count=F("count") + delta):
+        return
+    try:
+        with transaction.atomic():
+            PatientDemographicStat.objects.create(age_bucket=bucket, gender=gender, count=delta)
+    except IntegrityError:
+        stats.update(count=F("count") + delta)
+
+
+def apply_demographic_change(old_key, new_key):
+    if old_key == new_key:
+        return
+    if old_key is not None:
+        _bump_demographic(old_key, -1)
+    if new_key is not None:
+        _bump_demographic(new_key, 1)
+
+
+def rebuild_demographic_stats():
+    groups = (
+        User.objects.filter(role="patient")
+        .annotate(bucket=_age_bucket_expression(), gender_key=Coalesce("gender", Value("")))
+        .values("bucket", "gender_key").annotate(total=Count("id")).order_by()
+    )
+    with transaction.atomic():
+        PatientDemographicStat.objects.all().delete()
+        PatientDemographicStat.objects.bulk_create(
+            PatientDemographicStat(age_bucket=g["bucket"], gender=g["gender_key"], count=g["total"]) for g in groups
+        )
+
+
+def total_patients():
+    return PatientDemographicStat.objects.aggregate(total=Sum("count"))["total"] or 0
+
+
+def age_distribution():
+    counts = dict(
+        PatientDemographicStat.objects.values("age_bucket").annotate(total=Sum("count")).values_list("age_bucket", "total")
+    )
+    return [(name, counts.get(name, 0)) for name, _, _ in AGE_BUCKETS]
+
+
+def gender_distribution():
+    rows = (
+        PatientDemographicStat.objects.values("gender").annotate(total=Sum("count"))
+        .filter(total__gt=0).order_by("gender")
+    )
+    return [(r["gender"] or None, r["total"]) for r in rows]
+
+
+def rebuild_all():
+    rebuild_appointment_stats()
+    rebuild_demographic_stats()
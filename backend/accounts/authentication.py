@@ -0,0 +1,76 @@
+"""
+JWT authentication without a full User load on every request.
+
+JWTAuthentication reads the whole accounts_user row (medical history, address,
+...) for each request. TokenClaimsAuthentication builds request.user as a
+TokenUser from the few columns views check (id, username, role, is_active, age,
+gender) and keeps those in Django's cache (see CACHES in settings) under
+token_user:<id>. A view that touches any other field loads it from the database
+then. Tokens carry only the user id; role and active flag always come from the
+cached row, never from the token.
+
+User signals drop the entry after every save or delete commits (see
+signals.user_saved), so a role change or deactivation applies on the next
+request. With a shared cache (REDIS_URL) that reaches every worker; with the
+per-process local memory cache other workers keep their own copies, so there
+entries live AUTH_USER_CACHE_SECONDS instead.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import TokenUser, User
+
+TOKEN_USER_FIELDS = ("id", "username", "role", "is_active", "age", "gender")
+USER_TIMEOUT = 60 * 60  # seconds; saves drop the entry, this only bounds idle users
+
+_MISSING = object()
+
+
+def user_timeout():
+    if settings.CACHES["default"]["BACKEND"] == "django.core.cache.backends.locmem.LocMemCache":
+        return getattr(settings, "AUTH_USER_CACHE_SECONDS", 30)
+    return USER_TIMEOUT
+
+
+def user_key(user_id):
+    return f"token_user:{user_id}"
+
+
+def forget_user(user_id):
+    cache.delete(user_key(user_id))
+
+
+def _user_row(user_id):
+    row = cache.get(user_key(user_id), _MISSING)
+    if row is _MISSING:
+        row = User.objects.filter(pk=user_id).values(*TOKEN_USER_FIELDS).first()
+        cache.set(user_key(user_id), row, user_timeout())
+    return row
+
+
+def token_user(user_id):
+    """A TokenUser for `user_id`, or None if there is no such user."""
+    row = _user_row(user_id)
+    if row is None:
+        return None
+    # from_db wants the loaded values in model field order
+    names = [f.attname for f in User._meta.concrete_fields if f.attname in row]
+    return TokenUser.from_db(User.objects.db, names, [row[name] for name in names])
+
+
+class TokenClaimsAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        user = token_user(user_id)
+        if user is None:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
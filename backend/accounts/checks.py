@@ -0,0 +1,64 @@
+"""
+System checks run by runserver, migrate and `manage.py check`.
+
+database_pooling reports how the default database connection is reused, so a
+deploy log shows whether DB_CONN_MAX_AGE / DB_POOL took effect. events_broker
+warns when pushed events can't reach every worker's clients.
+"""
+import importlib.util
+
+from django.conf import settings
+from django.core.checks import Error, Info, Tags, Warning, register
+from django.db import connections
+
+
+def pooling_mode(alias="default"):
+    db = settings.DATABASES[alias]
+    pool = db.get("OPTIONS", {}).get("pool")
+    if pool:
+        sizes = pool if isinstance(pool, dict) else {}
+        min_size = sizes.get("min_size", 4)  # psycopg_pool's defaults
+        return f"psycopg pool (min_size={min_size}, max_size={sizes.get('max_size') or min_size})"
+    max_age = db.get("CONN_MAX_AGE", 0)
+    if max_age is None:
+        return "persistent connections (never closed)"
+    if max_age > 0:
+        return f"persistent connections (CONN_MAX_AGE={max_age}s)"
+    return "new connection per request (CONN_MAX_AGE=0)"
+
+
+@register(Tags.database)
+def database_pooling(app_configs, **kwargs):
+    db = settings.DATABASES["default"]
+    messages = [Info(f"Database connections: {pooling_mode()} on {connections['default'].vendor}.", id="accounts.I001")]
+
+    if getattr(settings, "DB_POOL", False) and not db.get("OPTIONS", {}).get("pool"):
+        messages.append(Warning(
+            "DB_POOL is set but the default database is not PostgreSQL; the pool is not used.",
+            hint="Connection pooling needs DATABASE_URL=postgresql://...",
+            id="accounts.W001",
+        ))
+    if db.get("OPTIONS", {}).get("pool") and not (
+        importlib.util.find_spec("psycopg") and importlib.util.find_spec("psycopg_pool")
+    ):
+        messages.append(Error(
+            "DB_POOL needs psycopg 3 with its pool package.",
+            hint="pip install 'psycopg[binary,pool]'",
+            id="accounts.E001",
+        ))
+    return messages
+
+
+@register()
+def events_broker(app_configs, **kwargs):
+    broker = getattr(settings, "EVENTS_BROKER", "accounts.events.InProcessBroker")
+    workers = getattr(settings, "WEB_CONCURRENCY", 1)
+    if broker == "accounts.events.InProcessBroker" and workers > 1:
+        return [Warning(
+            f"The in-process events broker only reaches clients of the worker that published; "
+            f"WEB_CONCURRENCY={workers}.",
+            hint="Run one worker, or set EVENTS_BROKER to a shared (e.g. Redis pub/sub) broker. "
+                 "Clients still resync every minute, so updates are delayed rather than lost.",
+            id="accounts.W002",
+        )]
+    return []
@@ -0,0 +1,60 @@
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.response import Response
+
+
+def list_version(queryset, *extra_aggregates, **named_aggregates):
+    """
+    One cheap aggregate that changes whenever the list would: row count and max id,
+    plus whatever else the caller passes (e.g. Max("updated_at") or a filtered Count
+    for a flag the list shows).
+    """
+    aggregates = {"_count": Count("id"), "_max_id": Max("id"), **named_aggregates}
+    for i, aggregate in enumerate(extra_aggregates):
+        aggregates[f"_extra_{i}"] = aggregate
+    # order_by() drops the list ordering so the aggregate doesn't sort anything
+    values = queryset.order_by().aggregate(**aggregates)
+    return tuple(values[key] for key in sorted(values))
+
+
+def conditional_list(resource, version):
+    """
+    ETag / If-None-Match for a GET list view.
+
+    `version(request, *args, **kwargs)` returns a tuple describing the current state
+    of the rows this user would see (see list_version), or None to skip. The ETag
+    is a hash of that plus the user and query string, so an unchanged poll is
+    answered with 304 after a single aggregate query, before the view runs its
+    serializer.
+
+    Goes under @api_view/@permission_classes so request.user is authenticated.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method != "GET":
+                return view(request, *args, **kwargs)
+            state = version(request, *args, **kwargs)
+            if state is None:
+                return view(request, *args, **kwargs)
+
+            params = sorted((k, v) for k, v in request.query_params.lists() if k != "_t")
+            raw = repr((resource, request.user.id, request.user.role, kwargs, params, state))
+            etag = quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+            if_none_match = request.headers.get("If-None-Match")
+            if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == "*"):
+                response = Response(status=304)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response["ETag"] = etag
+            # Let browsers keep the body but always revalidate
+            response["Cache-Control"] = "private, no-cache"
+            return response
+        return wrapped
+    return decorator
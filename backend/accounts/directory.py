@@ -0,0 +1,48 @@
+"""
+Cached doctor directory for the booking screens.
+
+The whole directory is one small list kept in Django's cache (see CACHES in
+settings) and filtered in Python per request. User signals drop it whenever a
+doctor is created, edited, toggles availability or is deleted.
+"""
+from django.core.cache import cache
+
+from .models import User
+
+DIRECTORY_CACHE_KEY = "directory:doctors"
+DIRECTORY_TIMEOUT = 600  # seconds; invalidation normally beats this
+
+# User fields the directory shows; saves that touch none of them leave it alone
+DIRECTORY_FIELDS = {"username", "specialization", "is_available", "consultation_fee", "role"}
+
+
+def get_directory():
+    doctors = cache.get(DIRECTORY_CACHE_KEY)
+    if doctors is None:
+        doctors = [
+            {
+                "id": d["id"],
+                "username": d["username"],
+                "specialization": d["specialization"] or "General Practice",
+                "is_available": d["is_available"],
+                "consultation_fee": d["consultation_fee"],
+            }
+            for d in User.objects.filter(role="doctor").order_by("id")
+            .values("id", "username", "specialization", "is_available", "consultation_fee")
+        ]
+        cache.set(DIRECTORY_CACHE_KEY, doctors, DIRECTORY_TIMEOUT)
+    return doctors
+
+
+def invalidate_directory():
+    cache.delete(DIRECTORY_CACHE_KEY)
+
+
+def find_doctors(specialization=None, available=None):
+    doctors = get_directory()
+    if specialization:
+        specialization = specialization.lower()
+        doctors = [d for d in doctors if d["specialization"].lower() == specialization]
+    if available is not None:
+        doctors = [d for d in doctors if d["is_available"] == available]
+    return doctors
@@ -0,0 +1,89 @@
+"""
+Pharmacy dispensing queue: the undispensed prescriptions, oldest first.
+
+Reads only touch pending scripts through the partial index on is_dispensed=False
+(Prescription.Meta), so polling costs what the queue holds, not the prescription
+history. Every response carries a cursor; passing it back returns just what
+changed since: scripts with a higher id than any seen so far (`results`) and ids
+dispensed since (`dispensed`). New scripts are paged by id rather than by their
+`date`, which is taken before the insert commits and on whichever server's clock.
+The dispensed window reaches OVERLAP back past the cursor's timestamp, so a
+dispense committed a moment after that is still reported; clients merge by id,
+so a repeat is harmless.
+
+    page = queue()                      # whole queue
+    page = queue(since=page["cursor"])  # delta
+"""
+import base64
+import binascii
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .fast_serializers import PRESCRIPTION_LIST
+from .models import Prescription
+from .pagination import InvalidCursor
+
+OVERLAP = timedelta(seconds=5)
+MAX_BATCH = 500
+
+
+def encode_cursor(last_id, as_of):
+    # "<highest script id returned>|<iso time the read started>", opaque to clients
+    return base64.urlsafe_b64encode(f"{last_id}|{as_of.isoformat()}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        last_id, as_of = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        last_id, as_of = int(last_id), parse_datetime(as_of)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor("Invalid cursor")
+    if as_of is None:
+        raise InvalidCursor("Invalid cursor")
+    return last_id, as_of
+
+
+def pending():
+    return Prescription.objects.filter(is_dispensed=False)
+
+
+def queue(since=None):
+    """The whole queue, or with `since` (a cursor) only what changed after it."""
+    # Taken before reading, so anything dispensed during the reads is in the next delta
+    as_of = timezone.now()
+    scripts = pending()
+    dispensed = []
+    last_id = 0
+    if since:
+        last_id, dispensed_since = decode_cursor(since)
+        scripts = scripts.filter(id__gt=last_id)
+        dispensed = list(
+            Prescription.objects.filter(dispensed_at__gte=dispensed_since - OVERLAP)
+            .order_by("id").values_list("id", flat=True)
+        )
+    results = PRESCRIPTION_LIST.data(scripts.order_by("date", "id"))
+    return {
+        "results": results,
+        "dispensed": dispensed,
+        "cursor": encode_cursor(max([last_id, *(script["id"] for script in results)]), as_of),
+    }
+
+
+def dispense(ids):
+    """
+    Mark the pending scripts among `ids` dispensed with one UPDATE. Returns the ids
+    that were dispensed now; the rest were missing or already dispensed.
+    """
+    from .signals import prescriptions_dispensed
+
+    with transaction.atomic():
+        rows = list(pending().filter(id__in=ids).select_for_update().values("id", "patient_id"))
+        if rows:
+            Prescription.objects.filter(id__in=[row["id"] for row in rows]).update(
+                is_dispensed=True, dispensed_at=timezone.now(),
+            )
+            prescriptions_dispensed(rows)
+    return sorted(row["id"] for row in rows)
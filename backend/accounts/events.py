@@ -0,0 +1,120 @@
+import asyncio
+import itertools
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def role_channel(role):
+    return f"role:{role}"
+
+
+class Subscription:
+    def __init__(self, broker, channels, loop, maxsize):
+        self.broker = broker
+        self.channels = set(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, event):
+        # Called from any thread; hop onto the subscriber's event loop
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Loop already closed: the client went away
+            self.broker.unsubscribe(self)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A stalled client shouldn't grow memory forever; it will resync on reconnect
+            logger.warning("Dropping event for slow subscriber on %s", sorted(self.channels))
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Fan-out of events to streaming connections in this process.
+
+    publish() is safe to call from sync views running in worker threads. With
+    several server processes each one only sees its own publishes, so multi-process
+    deployments should point EVENTS_BROKER at a shared implementation (e.g. Redis
+    pub/sub) exposing the same publish/subscribe/unsubscribe methods; the
+    accounts.W002 check warns otherwise. Clients also resync periodically while
+    connected (events.api.js), so a missed event only delays an update.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._ids = itertools.count(1)
+
+    def subscribe(self, channels, loop=None):
+        subscription = Subscription(self, channels, loop or asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def publish(self, channels, event_type, data):
+        event = {"id": next(self._ids), "type": event_type, "data": data}
+        with self._lock:
+            targets = set()
+            for channel in channels:
+                targets.update(self._subscribers.get(channel, ()))
+        for subscription in targets:
+            subscription.deliver(event)
+        return len(targets)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, "EVENTS_BROKER", "accounts.events.InProcessBroker")
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish(channels, event_type, data):
+    try:
+        return get_broker().publish(channels, event_type, data)
+    except Exception:
+        # Push is best effort; clients still resync with a normal fetch
+        logger.exception("Failed to publish %s event", event_type)
+        return 0
+
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], cls=DjangoJSONEncoder)}\n\n"
@@ -0,0 +1,105 @@
+"""
+Streaming CSV / NDJSON exports of the accounts tables.
+
+Rows are read with values_list(...).iterator(chunk_size=...) and written out one
+at a time through StreamingHttpResponse, so memory stays flat no matter how many
+rows the export covers and no model instances or serializers are built.
+"""
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .models import Appointment, LabReport, MedicalRecord, Prescription
+
+CHUNK_SIZE = 2000
+
+# resource -> (model, [(column, lookup), ...])
+EXPORTS = {
+    "appointments": (Appointment, [
+        ("id", "id"), ("date", "date"), ("status", "status"),
+        ("patient_id", "patient_id"), ("patient", "patient__username"),
+        ("doctor_id", "doctor_id"), ("doctor", "doctor__username"),
+        ("consultation_type", "consultation_type"), ("token_number", "token_number"),
+        ("payment_status", "payment_status"), ("fee_paid", "fee_paid"),
+        ("reason", "reason"), ("diagnosis", "diagnosis"), ("vitals", "vitals"),
+        ("decline_reason", "decline_reason"), ("created_at", "created_at"),
+    ]),
+    "lab-reports": (LabReport, [
+        ("id", "id"), ("date", "date"), ("patient_id", "patient_id"), ("patient", "patient__username"),
+        ("doctor_id", "doctor_id"), ("doctor", "doctor__username"), ("test_name", "test_name"),
+        ("status", "status"), ("observed_value", "observed_value"), ("unit", "unit"),
+        ("reference_range", "reference_range"), ("specimen_type", "specimen_type"),
+        ("testing_method", "testing_method"), ("result", "result"),
+        ("clinical_interpretation", "clinical_interpretation"),
+    ]),
+    "prescriptions": (Prescription, [
+        ("id", "id"), ("date", "date"), ("patient_id", "patient_id"), ("patient", "patient__username"),
+        ("doctor_id", "doctor_id"), ("doctor", "doctor__username"), ("appointment_id", "appointment_id"),
+        ("is_dispensed", "is_dispensed"), ("medicines", "medicines"), ("notes", "notes"),
+    ]),
+    "medical-records": (MedicalRecord, [
+        ("id", "id"), ("date", "date"), ("patient_id", "patient_id"), ("patient", "patient__username"),
+        ("doctor_id", "doctor_id"), ("doctor", "doctor__username"), ("appointment_id", "appointment_id"),
+        ("diagnosis", "diagnosis"), ("treatment_plan", "treatment_plan"), ("notes", "notes"),
+    ]),
+}
+
+# Spreadsheets run a cell starting with one of these as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class _Echo:
+    """csv.writer target that hands each formatted line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(resource, queryset=None):
+    """(columns, row iterator) for one export; `queryset` narrows the rows (e.g. by date)."""
+    model, columns = EXPORTS[resource]
+    if queryset is None:
+        queryset = model.objects.all()
+    rows = (
+        queryset.order_by("date", "id")
+        .values_list(*(lookup for _, lookup in columns))
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    return [name for name, _ in columns], rows
+
+
+def _csv_cell(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    # Free text (reasons, notes, names) is user input; a leading ' keeps it literal
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(_csv_cell(value) for value in row)
+
+
+def _ndjson_lines(columns, rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + "\n"
+
+
+def streaming_export(resource, fmt, queryset=None, filename=None):
+    columns, rows = export_rows(resource, queryset)
+    lines = _csv_lines(columns, rows) if fmt == "csv" else _ndjson_lines(columns, rows)
+    response = StreamingHttpResponse(lines, content_type=FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{filename or resource}.{fmt}"'
+    response["Cache-Control"] = "no-store"
+    return response
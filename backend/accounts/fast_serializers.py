@@ -0,0 +1,115 @@
+"""
+Read-only list serialization from .values() rows.
+
+A DRF ModelSerializer walks every declared field for every object (attribute
+lookups through related instances, per-field method dispatch), which dominates
+CPU on long lists. ValuesSerializer reads the same serializer's field
+declarations once, maps each output key to a values() lookup plus a converter,
+and builds the output dicts straight from the row. Output is identical to
+`serializer_class(instances, many=True).data` for list endpoints.
+
+    APPOINTMENT_LIST = ValuesSerializer(AppointmentSerializer)
+    data = APPOINTMENT_LIST.data(queryset)
+"""
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import fields, relations
+
+from .serializers import AppointmentSerializer, LabReportSerializer, LabReportSummarySerializer, PrescriptionSerializer
+
+# Field types whose to_representation is a plain type cast of the database value
+_CASTS = (
+    (fields.BooleanField, bool),
+    (fields.IntegerField, int),
+    (fields.CharField, str),
+    (fields.ReadOnlyField, None),
+    (relations.PrimaryKeyRelatedField, None),
+)
+
+
+def _file_url(model_field):
+    # Same as FileField.to_representation without a request in the context
+    return lambda name: model_field.storage.url(name) if name else None
+
+
+class ValuesSerializer:
+    """
+    `overrides` maps a field name to (lookup, convert) for fields that can't be
+    derived from the declaration, i.e. SerializerMethodFields. Like a method
+    field, an override's convert is also called for NULL values.
+    """
+
+    def __init__(self, serializer_class, overrides=None):
+        self.serializer_class = serializer_class
+        self.overrides = overrides or {}
+        self._columns = None
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            self._columns = self._build_columns()
+        return self._columns
+
+    @property
+    def lookups(self):
+        return list(dict.fromkeys(lookup for _, lookup, _, _ in self.columns))
+
+    def _build_columns(self):
+        serializer = self.serializer_class()
+        model = serializer.Meta.model
+        columns = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if name in self.overrides:
+                lookup, convert = self.overrides[name]
+                columns.append((name, lookup, convert, True))
+                continue
+            if isinstance(field, fields.SerializerMethodField):
+                raise ImproperlyConfigured(f"{self.serializer_class.__name__}.{name} needs an override")
+            columns.append((name, field.source.replace(".", "__"), self._converter(model, field), False))
+        return columns
+
+    def _converter(self, model, field):
+        if isinstance(field, fields.FileField):
+            return _file_url(model._meta.get_field(field.source))
+        for field_type, cast in _CASTS:
+            if isinstance(field, field_type):
+                return cast
+        return field.to_representation
+
+    def values(self, queryset):
+        """values() queryset carrying everything the output needs (rows are dicts keyed by lookup)."""
+        return queryset.values(*self.lookups)
+
+    def serialize(self, rows):
+        columns = self.columns
+        data = []
+        append = data.append
+        for row in rows:
+            item = {}
+            for name, lookup, convert, convert_none in columns:
+                value = row[lookup]
+                if value is None and not convert_none:
+                    # DRF emits None for null attributes without calling the field
+                    item[name] = None
+                elif convert is None:
+                    item[name] = value
+                else:
+                    item[name] = convert(value)
+            append(item)
+        return data
+
+    def data(self, queryset):
+        return self.serialize(self.values(queryset))
+
+
+def _doctor_or_unknown(username):
+    return username or "Unknown"
+
+
+_LAB_DOCTOR = {"doctor": ("doctor__username", _doctor_or_unknown)}
+
+APPOINTMENT_LIST = ValuesSerializer(AppointmentSerializer)
+LAB_REPORT_LIST = ValuesSerializer(LabReportSerializer, overrides=_LAB_DOCTOR)
+LAB_REPORT_SUMMARY_LIST = ValuesSerializer(LabReportSummarySerializer, overrides=_LAB_DOCTOR)
+PRESCRIPTION_LIST = ValuesSerializer(PrescriptionSerializer)
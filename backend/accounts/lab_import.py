@@ -0,0 +1,190 @@
+"""
+Bulk lab-report ingestion for analyzer exports.
+
+Rows arrive as a JSON list, JSON lines or CSV (one report per row, with its own
+patient_id). Every row is validated before anything is written; patients and
+ordering doctors are resolved with one query each, the reports go in with
+bulk_create inside a single transaction, and each patient gets one notification
+and one email for the whole batch.
+"""
+import csv
+import io
+import json
+
+from django.db import transaction
+from rest_framework.parsers import BaseParser
+
+from . import outbox
+from .models import LabReport, User
+from .notifications import NotificationBatch
+
+MAX_ROWS = 10000
+BATCH_SIZE = 500
+
+CSV_TYPES = ("text/csv", "application/csv")
+JSON_LINES_TYPES = ("application/x-ndjson", "application/jsonl", "application/x-jsonlines")
+
+STATUSES = {choice for choice, _ in LabReport._meta.get_field("status").choices}
+TEXT_FIELDS = (
+    "test_name", "result", "observed_value", "unit", "reference_range",
+    "specimen_type", "testing_method", "clinical_interpretation",
+)
+DEFAULTS = {
+    "result": "",
+    "specimen_type": LabReport._meta.get_field("specimen_type").default,
+    "testing_method": LabReport._meta.get_field("testing_method").default,
+    "clinical_interpretation": "",
+    "status": "completed",
+}
+
+
+class LabImportError(ValueError):
+    def __init__(self, errors):
+        super().__init__("Lab import rejected")
+        self.errors = errors
+
+
+class RawTextParser(BaseParser):
+    """Hands CSV / JSON lines request bodies to the view as text."""
+    media_type = "*/*"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return stream.read().decode("utf-8-sig") if stream else ""
+
+
+def _rows_from_text(text, content_type, filename=""):
+    if content_type in CSV_TYPES or filename.endswith(".csv"):
+        return list(csv.DictReader(io.StringIO(text)))
+    rows = []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            rows.append(json.loads(line))
+        except ValueError:
+            raise LabImportError([{"row": line_no, "error": "Invalid JSON"}])
+    return rows
+
+
+def read_rows(request):
+    """Rows from an uploaded `file`, a CSV / JSON lines body, or JSON {"reports": [...]}."""
+    upload = request.FILES.get("file")
+    if upload is not None:
+        text = upload.read().decode("utf-8-sig")
+        return _rows_from_text(text, upload.content_type, upload.name.lower())
+
+    data = request.data
+    if isinstance(data, str):
+        return _rows_from_text(data, request.content_type.split(";")[0].strip())
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict) and isinstance(data.get("reports"), list):
+        return data["reports"]
+    raise LabImportError([{"row": None, "error": "Send a CSV / JSON lines file or a JSON body with a reports list"}])
+
+
+def _int_or_none(value):
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError
+
+
+def validate_rows(rows):
+    """Clean rows in place of the raw ones, or raise LabImportError listing every bad row."""
+    if not rows:
+        raise LabImportError([{"row": None, "error": "No reports to import"}])
+    if len(rows) > MAX_ROWS:
+        raise LabImportError([{"row": None, "error": f"At most {MAX_ROWS} reports per import"}])
+
+    cleaned, errors = [], []
+    for index, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({"row": index, "error": "Expected an object"})
+            continue
+        try:
+            patient_id = _int_or_none(row.get("patient_id"))
+            doctor_id = _int_or_none(row.get("doctor_id"))
+        except ValueError:
+            errors.append({"row": index, "error": "patient_id and doctor_id must be integers"})
+            continue
+        if patient_id is None:
+            errors.append({"row": index, "error": "patient_id is required"})
+            continue
+
+        item = {"patient_id": patient_id, "doctor_id": doctor_id}
+        for field in TEXT_FIELDS:
+            value = row.get(field)
+            item[field] = DEFAULTS.get(field) if value in (None, "") else str(value).strip()
+        item["status"] = row.get("status") or DEFAULTS["status"]
+
+        if not item["test_name"]:
+            errors.append({"row": index, "error": "test_name is required"})
+        elif item["status"] not in STATUSES:
+            errors.append({"row": index, "error": f"Invalid status {item['status']!r}"})
+        else:
+            too_long = [
+                field for field in TEXT_FIELDS
+                if item[field] and (limit := LabReport._meta.get_field(field).max_length) and len(item[field]) > limit
+            ]
+            if too_long:
+                errors.append({"row": index, "error": f"Too long: {', '.join(too_long)}"})
+            else:
+                cleaned.append(item)
+
+    if errors:
+        raise LabImportError(errors)
+    return cleaned
+
+
+def ingest(rows):
+    """Validate and write rows; returns the created LabReport objects."""
+    rows = validate_rows(rows)
+
+    patients = {
+        p.id: p for p in User.objects.filter(id__in={r["patient_id"] for r in rows}, role="patient")
+        .only("id", "username", "email")
+    }
+    doctor_ids = {r["doctor_id"] for r in rows if r["doctor_id"] is not None}
+    known_doctors = set(User.objects.filter(id__in=doctor_ids, role="doctor").values_list("id", flat=True))
+    errors = [
+        {"row": index, "error": "Unknown patient" if row["patient_id"] not in patients else "Unknown doctor"}
+        for index, row in enumerate(rows, start=1)
+        if row["patient_id"] not in patients or (row["doctor_id"] is not None and row["doctor_id"] not in known_doctors)
+    ]
+    if errors:
+        raise LabImportError(errors)
+
+    with transaction.atomic():
+        reports = LabReport.objects.bulk_create([LabReport(**row) for row in rows], batch_size=BATCH_SIZE)
+
+        tests_by_patient = {}
+        for row in rows:
+            tests_by_patient.setdefault(row["patient_id"], []).append(row["test_name"])
+
+        notifications = NotificationBatch()
+        messages = []
+        for patient_id, tests in tests_by_patient.items():
+            patient = patients[patient_id]
+            summary = _summarize(tests)
+            notifications.add(patient_id, f"{len(tests)} new lab result(s) are available: {summary}")
+            if patient.email:
+                messages.append(outbox.email(
+                    patient.email,
+                    "New Lab Reports Available",
+                    f"Dear {patient.username},\n\n{len(tests)} new lab result(s) ({summary}) have been added to your record.\n"
+                    "Please log in to your dashboard to view the full details.\n\nBest regards,\nHospital Team",
+                ))
+        notifications.send()
+        outbox.enqueue(*messages)
+    return reports
+
+
+def _summarize(tests, limit=3):
+    names = list(dict.fromkeys(tests))
+    summary = ", ".join(names[:limit])
+    if len(names) > limit:
+        summary += f" and {len(names) - limit} more"
+    return summary
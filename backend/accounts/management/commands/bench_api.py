@@ -0,0 +1,429 @@
+import json
+import math
+import os
+import subprocess
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from datetime import time as clock
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts import urls
+from accounts.models import Appointment, LabReport, Notification, Prescription, ScheduleException, User
+from accounts.seeding import Seeder
+
+API_PREFIX = "/api/accounts/"
+PASSWORD = "bench-password-1"
+
+# One benchmark case. `path` and `body` are format strings / callables taking
+# (ctx, i); `prepare(ctx, n)` creates n single-use targets (ctx["targets"]) for
+# requests that consume a row, e.g. cancelling an appointment.
+Route = namedtuple("Route", "method path role body prepare", defaults=(None, None))
+
+# view name -> cases, or a string saying why the view is not benchmarked
+ROUTES = {
+    "register": [Route("POST", "register/", None, lambda ctx, i: {
+        "username": f"bench_reg_{ctx['run']}_{i}", "password": PASSWORD, "role": "patient", "age": "30",
+        "gender": "Male", "phone_number": "5550100", "blood_group": "O+", "address": "1 Main St",
+        "medical_history": "None",
+    })],
+    "login": [Route("POST", "login/", None, lambda ctx, i: {"username": ctx["login"], "password": PASSWORD})],
+    "profile": [Route("GET", "profile/", "patient")],
+    "get_appointments": [
+        Route("GET", "appointments/", "patient"),
+        Route("GET", "appointments/", "admin"),
+        Route("GET", "appointments/?limit=50", "admin"),
+    ],
+    "create_appointment": [Route("POST", "appointments/create/", "writer", lambda ctx, i: {
+        "doctor_id": ctx["other_doctor"], "reason": "Headache and fever",
+        "date": (_working_day(ctx["future"], ctx["batch"] * 10 + i // 32) + timedelta(minutes=15 * (i % 32))).isoformat(),
+    })],
+    "update_appointment_status": [Route(
+        "PATCH", lambda ctx, i: f"appointments/{ctx['targets'][i]}/status/", "staff",
+        lambda ctx, i: {"status": "confirmed"}, lambda ctx, n: _pending_appointments(ctx, n),
+    )],
+    "bulk_update_appointment_status": [Route(
+        "POST", "appointments/bulk-status/", "staff",
+        lambda ctx, i: {"ids": ctx["targets"][i * 20:(i + 1) * 20], "status": "confirmed"},
+        lambda ctx, n: _pending_appointments(ctx, n * 20),
+    )],
+    "pay_appointment": "calls the Stripe API",
+    "create_payment_intent": "calls the Stripe API",
+    "get_stripe_config": [Route("GET", "stripe-config/", "patient")],
+    "cancel_my_appointment": [Route(
+        "POST", lambda ctx, i: f"appointments/{ctx['targets'][i]}/cancel/", "writer",
+        prepare=lambda ctx, n: _pending_appointments(ctx, n),
+    )],
+    "get_doctors": [Route("GET", "doctors/?available=true", "patient")],
+    "get_users": [Route("GET", "users/", "admin")],
+    "get_user_detail": [Route("GET", lambda ctx, i: f"users/{ctx['patient']}/", "admin")],
+    "admin_create_user": [Route("POST", "users/create/", "admin", lambda ctx, i: {
+        "username": f"bench_new_{ctx['run']}_{i}", "password": PASSWORD,
+        "email": f"new_{ctx['run']}_{i}@bench.test", "role": "staff",
+    })],
+    "delete_user": [Route(
+        "DELETE", lambda ctx, i: f"users/{ctx['targets'][i]}/delete/", "admin",
+        prepare=lambda ctx, n: _users(ctx, n, "delete"),
+    )],
+    "admin_update_user": [Route(
+        "PUT", lambda ctx, i: f"users/{ctx['other_doctor']}/update/", "admin",
+        lambda ctx, i: {"consultation_fee": 50 + i % 10},
+    )],
+    "request_password_reset": [Route("POST", "request-reset/", None, lambda ctx, i: {"email": ctx["email"]})],
+    "reset_password_confirm": [Route(
+        "POST", "confirm-reset/", None,
+        lambda ctx, i: {"email": f"reset_{ctx['run']}_{i}@bench.test", "code": "123456", "new_password": PASSWORD},
+        lambda ctx, n: _users(ctx, n, "reset", reset_code="123456"),
+    )],
+    "get_notifications": [Route("GET", "notifications/", "patient")],
+    "get_unread_notification_count": [Route("GET", "notifications/unread-count/", "patient")],
+    "mark_all_notifications_read": [Route("PUT", "notifications/read-all/", "patient")],
+    "mark_notification_read": [Route(
+        "PUT", lambda ctx, i: f"notifications/{ctx['notifications'][i % len(ctx['notifications'])]}/read/", "patient",
+    )],
+    "get_lab_reports": [
+        Route("GET", "lab-reports/", "patient"),
+        Route("GET", "lab-reports/?limit=50", "admin"),
+    ],
+    "get_lab_report": [Route("GET", lambda ctx, i: f"lab-reports/{ctx['lab_report']}/", "patient")],
+    "create_lab_report": [Route("POST", "lab-reports/create/", "staff", lambda ctx, i: {
+        "patient_id": ctx["writer"], "test_name": "CBC", "result": "Normal", "observed_value": "7.1", "unit": "mg/dL",
+    })],
+    "import_lab_reports": [Route("POST", "lab-reports/import/", "staff", lambda ctx, i: {"reports": [
+        {"patient_id": ctx["writer"], "test_name": "Glucose", "result": "Normal", "observed_value": str(80 + k)}
+        for k in range(50)
+    ]})],
+    "create_referral": [Route("POST", "referrals/create/", "doctor", lambda ctx, i: {
+        "patient_id": ctx["patient"], "to_doctor_id": ctx["other_doctor"], "reason": "Second opinion",
+    })],
+    "toggle_availability": [Route("POST", "doctor/toggle-availability/", "doctor")],
+    "doctor_schedule": [
+        Route("GET", "doctor/schedule/", "doctor"),
+        Route("PUT", "doctor/schedule/", "doctor", lambda ctx, i: {"templates": [
+            {"weekday": day, "start_time": "09:00", "end_time": "17:00", "slot_minutes": 15} for day in range(5)
+        ]}),
+    ],
+    "create_schedule_exception": [Route("POST", "doctor/schedule/exceptions/", "doctor", lambda ctx, i: {
+        "day": (ctx["future"].date() + timedelta(days=i % 60)).isoformat(), "reason": "Conference",
+    })],
+    "delete_schedule_exception": [Route(
+        "DELETE", lambda ctx, i: f"doctor/schedule/exceptions/{ctx['targets'][i]}/", "doctor",
+        prepare=lambda ctx, n: _schedule_exceptions(ctx, n),
+    )],
+    "find_slots": [Route("GET", "schedule/slots/", "patient")],
+    "doctor_queue": [Route("GET", "doctor/queue/", "doctor")],
+    "get_prescriptions": [Route("GET", "prescriptions/", "staff"), Route("GET", "prescriptions/", "patient")],
+    "create_prescription": [Route("POST", "prescriptions/create/", "doctor", lambda ctx, i: {
+        "patient_id": ctx["writer"], "medicines": "Paracetamol 500mg", "notes": "After meals",
+    })],
+    "dispensing_queue": [Route("GET", "prescriptions/queue/", "staff")],
+    "dispense_prescription": [Route(
+        "POST", lambda ctx, i: f"prescriptions/{ctx['targets'][i]}/dispense/", "staff",
+        prepare=lambda ctx, n: _prescriptions(ctx, n),
+    ), Route(
+        "POST", "prescriptions/dispense/", "staff", lambda ctx, i: {"ids": ctx["targets"][i * 20:(i + 1) * 20]},
+        lambda ctx, n: _prescriptions(ctx, n * 20),
+    )],
+    "get_medical_records": [Route("GET", lambda ctx, i: f"medical-records/{ctx['patient']}/", "doctor")],
+    "create_medical_record": [Route("POST", "medical-records/create/", "doctor", lambda ctx, i: {
+        "patient_id": ctx["writer"], "diagnosis": "Viral fever", "treatment_plan": "Rest", "notes": "",
+    })],
+    "admin_analytics": [Route("GET", "analytics/admin/", "admin")],
+    "doctor_analytics": [Route("GET", "analytics/doctor/", "doctor")],
+    "admin_export": [Route("GET", "exports/appointments.csv", "admin")],
+    "admin_profiling": [Route("GET", "admin/profiling/", "admin")],
+    "ai_insights": [Route("GET", "ai-insights/", "doctor")],
+    "events_stream": "server-sent event stream; needs the ASGI server",
+    "events_ticket": "only issued under the ASGI server; the bench client is WSGI",
+}
+
+
+def _working_day(start, n):
+    # The n-th Monday-Friday day from `start`; seeded doctors have no weekend hours to book
+    day = start
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    for _ in range(n):
+        day += timedelta(days=1)
+        while day.weekday() >= 5:
+            day += timedelta(days=1)
+    return day
+
+
+def _pending_appointments(ctx, n):
+    start = ctx["future"] + timedelta(days=400 + ctx["batch"] * 40)
+    appointments = Appointment.objects.bulk_create(
+        Appointment(
+            patient_id=ctx["writer"], doctor_id=ctx["doctor"], reason="Follow-up", status="pending",
+            date=start + timedelta(minutes=5 * k),
+        )
+        for k in range(n)
+    )
+    return [a.id for a in appointments]
+
+
+def _users(ctx, n, prefix, **fields):
+    users = User.objects.bulk_create(
+        User(username=f"bench_{prefix}_{ctx['run']}_{k}", email=f"{prefix}_{ctx['run']}_{k}@bench.test",
+             password=ctx["password_hash"], role="patient", **fields)
+        for k in range(n)
+    )
+    return [u.id for u in users]
+
+
+def _schedule_exceptions(ctx, n):
+    day = ctx["future"].date() + timedelta(days=200)
+    return [e.id for e in ScheduleException.objects.bulk_create(
+        ScheduleException(doctor_id=ctx["doctor"], day=day + timedelta(days=k % 30)) for k in range(n)
+    )]
+
+
+def _prescriptions(ctx, n):
+    return [p.id for p in Prescription.objects.bulk_create(
+        Prescription(doctor_id=ctx["doctor"], patient_id=ctx["writer"], medicines="Amoxicillin") for _ in range(n)
+    )]
+
+
+def view_name(callback):
+    # @api_view functions are wrapped in an APIView subclass named after the function
+    return getattr(getattr(callback, "cls", None), "__name__", None) or callback.__name__
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def _int_list(value):
+    try:
+        return [int(v) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise CommandError(f"Expected a comma separated list of integers, got {value!r}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every route in accounts/urls.py in-process with the Django test client. "
+        "Each scale runs against a freshly seeded test database that is dropped afterwards. "
+        "Reports p50/p95/p99 latency, queries per request and bytes per response. Write cases "
+        "add rows, so a later --threads run at the same scale starts from slightly more data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scales", default="1000", help="Comma separated appointment counts to seed, e.g. 100,10000")
+        parser.add_argument("--threads", default="1", help="Comma separated client thread counts, e.g. 1,8")
+        parser.add_argument("--requests", type=int, default=30, help="Measured requests per route")
+        parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests per route first")
+        parser.add_argument("--routes", default="", help="Only views whose name contains one of these (comma separated)")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--json", action="store_true", help="Print JSON instead of the table")
+        parser.add_argument("--output", help="Also write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        scales, thread_counts = _int_list(options["scales"]), _int_list(options["threads"])
+        selected = [name.strip() for name in options["routes"].split(",") if name.strip()]
+
+        cases, skipped, seen = [], [], set()
+        for pattern in urls.urlpatterns:
+            name = view_name(pattern.callback)
+            # A view behind several URL patterns lists all its cases once
+            if name in seen or (selected and not any(s in name for s in selected)):
+                continue
+            seen.add(name)
+            spec = ROUTES.get(name, "no benchmark case defined")
+            if isinstance(spec, str):
+                skipped.append({"view": name, "route": str(pattern.pattern), "reason": spec})
+            else:
+                cases.extend((name, route) for route in spec)
+
+        report = {
+            "meta": {
+                "commit": self._commit(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "requests": options["requests"],
+                "warmup": options["warmup"],
+                "seed": options["seed"],
+                "started": timezone.now().isoformat(),
+            },
+            "results": [],
+            "skipped": skipped,
+        }
+        # The test client sends Host: testserver
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            for scale in scales:
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                try:
+                    ctx = self._seed(scale, options["seed"])
+                    for threads in thread_counts:
+                        cache.clear()
+                        rows = [self._run(ctx, name, route, threads, options) for name, route in cases]
+                        report["results"].append({"scale": scale, "threads": threads, "routes": rows})
+                        if not options["json"]:
+                            self._print_table(scale, threads, rows)
+                finally:
+                    connections.close_all()
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for item in skipped:
+            if not options["json"]:
+                self.stdout.write(f"skipped {item['view']:<32} {item['reason']}")
+        text = json.dumps(report, indent=2)
+        if options["json"]:
+            self.stdout.write(text)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(text + "\n")
+
+        # Every case is written to succeed; timings of error responses measure nothing
+        failed = sorted({
+            f"{row['route']}: {row['status']}"
+            for result in report["results"] for row in result["routes"] if row["errors"]
+        })
+        if failed:
+            raise CommandError("Cases with failing responses:\n  " + "\n  ".join(failed))
+
+    # --- Data ---
+
+    def _seed(self, scale, seed):
+        seeder = Seeder(
+            doctors=max(5, scale // 200), patients=max(20, scale // 10), appointments=scale,
+            staff=1, admins=1, days=30, future_days=30, prefix="bench", password=PASSWORD, seed=seed,
+        )
+        seeder.run()
+        with open(os.devnull, "w") as devnull:
+            call_command("rebuild_analytics", stdout=devnull)
+
+        # Read cases run as the busiest patient; write cases as a separate one (see Route)
+        patient = (
+            Appointment.objects.values("patient_id").annotate(n=Count("id"))
+            .order_by("-n", "patient_id").values_list("patient_id", flat=True).first()
+        ) or seeder.patient_ids[0]
+        writer = User.objects.create(
+            username="bench_writer", email="bench_writer@bench.test", role="patient", password=seeder.password_hash,
+        )
+        Notification.objects.bulk_create(
+            Notification(recipient_id=patient, message=f"Reminder {k}", is_read=k % 3 == 0) for k in range(100)
+        )
+        lab_report = LabReport.objects.filter(patient_id=patient).values_list("id", flat=True).first()
+        if lab_report is None:
+            lab_report = LabReport.objects.create(patient_id=patient, test_name="CBC", result="Normal").id
+
+        principals = {
+            "admin": seeder.admin_ids[0], "staff": seeder.staff_ids[0], "doctor": seeder.doctors[0][0],
+            "patient": patient, "writer": writer.id,
+        }
+        users = User.objects.in_bulk(principals.values())
+        return {
+            **principals,
+            "batch": 0,
+            "password_hash": seeder.password_hash,
+            "future": timezone.make_aware(
+                datetime.combine(timezone.localdate() + timedelta(days=60), clock(9)), timezone.get_current_timezone()
+            ),
+            "other_doctor": seeder.doctors[1][0],
+            "login": users[patient].username,
+            "email": users[patient].email,
+            "lab_report": lab_report,
+            "notifications": list(Notification.objects.filter(recipient_id=patient).values_list("id", flat=True)),
+            "tokens": {
+                role: f"Bearer {RefreshToken.for_user(users[user_id]).access_token}"
+                for role, user_id in principals.items()
+            },
+        }
+
+    # --- Measuring ---
+
+    def _run(self, ctx, name, route, threads, options):
+        total = options["warmup"] + options["requests"]
+        # Usernames, emails and appointment times each case creates are unique per run
+        ctx["batch"] += 1
+        ctx["run"] = str(ctx["batch"])
+        ctx["targets"] = route.prepare(ctx, total) if route.prepare else None
+
+        def request(i):
+            client = Client()
+            path = route.path(ctx, i) if callable(route.path) else route.path
+            body = route.body(ctx, i) if route.body else None
+            extra = {"HTTP_AUTHORIZATION": ctx["tokens"][route.role]} if route.role else {}
+            with CaptureQueriesContext(connections["default"]) as queries:
+                start = time.perf_counter()
+                response = client.generic(
+                    route.method, API_PREFIX + path,
+                    json.dumps(body) if body is not None else "", content_type="application/json", **extra,
+                )
+                size = len(b"".join(response.streaming_content)) if response.streaming else len(response.content)
+                elapsed = time.perf_counter() - start
+            return elapsed, len(queries), size, response.status_code
+
+        def worker(indexes):
+            try:
+                return [request(i) for i in indexes]
+            finally:
+                connections.close_all()
+
+        # Views print debug output and the console email / SMS backends write to
+        # stdout; keep it out of the report
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            for i in range(options["warmup"]):
+                request(i)
+            indexes = list(range(options["warmup"], total))
+            started = time.perf_counter()
+            if threads == 1:
+                samples = [request(i) for i in indexes]
+            else:
+                with ThreadPoolExecutor(max_workers=threads) as pool:
+                    chunks = pool.map(worker, [indexes[t::threads] for t in range(threads)])
+                    samples = [sample for chunk in chunks for sample in chunk]
+            duration = time.perf_counter() - started
+
+        latencies = sorted(s[0] * 1000 for s in samples)
+        statuses = Counter(str(s[3]) for s in samples)
+        label = route.path if isinstance(route.path, str) else name
+        return {
+            "view": name,
+            "route": f"{route.method} {label} ({route.role or 'anonymous'})",
+            "requests": len(samples),
+            "status": dict(statuses),
+            "errors": sum(n for status, n in statuses.items() if int(status) >= 400),
+            "p50_ms": round(percentile(latencies, 0.50), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "queries_per_request": round(sum(s[1] for s in samples) / len(samples), 1),
+            "max_queries": max(s[1] for s in samples),
+            "bytes_per_response": round(sum(s[2] for s in samples) / len(samples)),
+            "requests_per_second": round(len(samples) / duration, 1),
+        }
+
+    def _print_table(self, scale, threads, rows):
+        self.stdout.write(f"\nscale={scale} threads={threads}")
+        self.stdout.write(f"{'route':<58} {'p50':>8} {'p95':>8} {'p99':>8} {'q/req':>6} {'bytes':>9}  status")
+        for row in rows:
+            self.stdout.write(
+                f"{row['route'][:58]:<58} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+                f"{row['queries_per_request']:>6} {row['bytes_per_response']:>9}  "
+                + " ".join(f"{status}x{n}" for status, n in sorted(row["status"].items()))
+            )
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,80 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.fast_serializers import APPOINTMENT_LIST, LAB_REPORT_LIST
+from accounts.models import Appointment, LabReport, User
+from accounts.serializers import AppointmentSerializer, LabReportSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF serializers with the values() list path on N appointments and lab reports. "
+        "Rows are created inside a transaction that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=3, help="Best of N runs per path")
+
+    def handle(self, *args, **options):
+        rows, repeat = options["rows"], options["repeat"]
+        with transaction.atomic():
+            self._seed(rows)
+            cases = [
+                ("appointments", AppointmentSerializer, APPOINTMENT_LIST,
+                 Appointment.objects.select_related("patient", "doctor").order_by("-date", "-id")),
+                ("lab reports", LabReportSerializer, LAB_REPORT_LIST,
+                 LabReport.objects.select_related("patient", "doctor").order_by("-date", "-id")),
+            ]
+            for label, serializer_class, fast, queryset in cases:
+                drf_seconds, drf_data = self._best(repeat, lambda: serializer_class(queryset.all(), many=True).data)
+                fast_seconds, fast_data = self._best(repeat, lambda: fast.data(queryset.all()))
+                same = [dict(row) for row in drf_data] == fast_data
+                self.stdout.write(
+                    f"{label:<13} {len(fast_data):>7} rows  DRF {drf_seconds * 1000:8.1f} ms  "
+                    f"values {fast_seconds * 1000:8.1f} ms  x{drf_seconds / fast_seconds:4.1f}  "
+                    f"identical={'yes' if same else 'NO'}"
+                )
+            transaction.set_rollback(True)
+
+    def _best(self, repeat, run):
+        best, result = None, None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
+
+    def _seed(self, rows):
+        doctors = User.objects.bulk_create([
+            User(username=f"bench_doctor_{i}", role="doctor", consultation_fee=50 + i) for i in range(20)
+        ])
+        patients = User.objects.bulk_create([
+            User(username=f"bench_patient_{i}", role="patient") for i in range(500)
+        ])
+        now = timezone.now()
+        Appointment.objects.bulk_create(
+            (
+                Appointment(
+                    patient=patients[i % len(patients)], doctor=doctors[i % len(doctors)],
+                    date=now - timedelta(minutes=i), reason="Fever and cough", token_number=i % 40 + 1,
+                )
+                for i in range(rows)
+            ),
+            batch_size=1000,
+        )
+        LabReport.objects.bulk_create(
+            (
+                LabReport(
+                    patient=patients[i % len(patients)], doctor=doctors[i % len(doctors)] if i % 3 else None,
+                    test_name="CBC", result="Within normal limits", observed_value="7.3", unit="mg/dL",
+                )
+                for i in range(rows)
+            ),
+            batch_size=1000,
+        )
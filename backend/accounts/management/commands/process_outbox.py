@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.outbox import process_batch
+
+
+class Command(BaseCommand):
+    help = "Deliver queued email/SMS/WhatsApp messages from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain what is due now and exit (for cron).")
+        parser.add_argument("--batch-size", type=int, default=200, help="Messages claimed per round.")
+        parser.add_argument("--workers", type=int, default=4, help="Sender threads.")
+        parser.add_argument("--chunk-size", type=int, default=50, help="Emails sent per SMTP connection.")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to sleep when the outbox is empty.")
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        try:
+            while True:
+                sent, failed = process_batch(
+                    batch_size=options["batch_size"],
+                    workers=options["workers"],
+                    chunk_size=options["chunk_size"],
+                )
+                total_sent += sent
+                total_failed += failed
+                if sent or failed:
+                    self.stdout.write(f"Delivered {sent}, failed {failed}")
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f"Outbox done: {total_sent} sent, {total_failed} failed"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from accounts import analytics, symptoms
+
+
+class Command(BaseCommand):
+    help = "Recompute the analytics rollup tables and the symptom index from scratch."
+
+    def handle(self, *args, **options):
+        analytics.rebuild_appointment_stats()
+        self.stdout.write("Appointment daily stats rebuilt")
+        analytics.rebuild_demographic_stats()
+        self.stdout.write("Patient demographic stats rebuilt")
+        symptoms.rebuild_index()
+        self.stdout.write("Appointment symptom index rebuilt")
+        self.stdout.write(self.style.SUCCESS("Analytics rollups are up to date"))
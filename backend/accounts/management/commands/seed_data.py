@@ -0,0 +1,73 @@
+import argparse
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from accounts.seeding import DEFAULT_PASSWORD, Seeder
+
+
+def day(value):
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a YYYY-MM-DD date")
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic doctors, patients, appointments, lab reports, "
+        "prescriptions, medical records, referrals and notifications. Deterministic for a given --seed and --today. "
+        "Example: seed_data --doctors 10000 --patients 50000 --appointments 1000000"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctors", type=int, default=50)
+        parser.add_argument("--patients", type=int, default=2000)
+        parser.add_argument("--appointments", type=int, default=20000)
+        parser.add_argument("--lab-reports", type=int, help="Default: half the appointments")
+        parser.add_argument("--staff", type=int, default=10)
+        parser.add_argument("--admins", type=int, default=1)
+        parser.add_argument("--days", type=int, default=365, help="Days of history before today")
+        parser.add_argument("--future-days", type=int, default=30, help="Days of bookings after today")
+        parser.add_argument("--prefix", default="seed", help="Usernames are <prefix>_<role>_<n>")
+        parser.add_argument("--password", default=DEFAULT_PASSWORD, help="Password for every seeded user")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--today", type=day, default=None,
+            help="YYYY-MM-DD day the layout is anchored to (default: the local date)",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--skip-rollups", action="store_true", help="Don't run rebuild_analytics afterwards")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            seeder = Seeder(
+                doctors=options["doctors"], patients=options["patients"], appointments=options["appointments"],
+                lab_reports=options["lab_reports"], staff=options["staff"], admins=options["admins"],
+                days=options["days"], future_days=options["future_days"], prefix=options["prefix"],
+                password=options["password"], seed=options["seed"], batch_size=options["batch_size"],
+                today=options["today"],
+                log=lambda message: self.stdout.write(f"  {message}") if options["verbosity"] > 1 else None,
+            )
+            counts = seeder.run()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for name, n in counts.items():
+            self.stdout.write(f"{name:<28} {n:>10}")
+        total = sum(counts.values())
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+
+        if not options["skip_rollups"]:
+            call_command("rebuild_analytics", stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded. Log in as {options['prefix']}_admin_0 / {options['prefix']}_doctor_0 / "
+            f"{options['prefix']}_patient_0 with the seed password."
+        ))
@@ -1,17 +1,37 @@
-import traceback
+import logging
+
+from . import profiling
+
+# Goes to the console like django.request; accounts.profiling is a JSON-lines file
+logger = logging.getLogger("accounts.errors")
+
+
+class QueryProfilingMiddleware:
+    """
+    Times each request's SQL and logs requests over the QUERY_BUDGET_* settings
+    (see accounts.profiling). Costs one flag check per request while switched off.
+    """
 
-class ExceptionLoggingMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        response = self.get_response(request)
+        if not profiling.is_enabled():
+            return self.get_response(request)
+
+        profile = profiling.QueryProfile()
+        with profile.installed():
+            response = self.get_response(request)
+        profile.finish()
+        profile.log(request, response)
+        response["Server-Timing"] = profile.server_timing()
         return response
 
     def process_exception(self, request, exception):
-        try:
-            with open("C:/Users/nabee/reactprojectssubmit/final_project/backend/server_errors.log", "a") as f:
-                f.write(f"\n--- Unhandled Exception in Middleware/View ---\nPath: {request.path}\nUser: {request.user}\n{str(exception)}\n{traceback.format_exc()}\n")
-        except Exception as log_error:
-            print(f"Failed to log exception: {log_error}")
+        # django.request logs the traceback; this adds who made the request
+        logger.error(
+            "Unhandled %s on %s %s (user %s)",
+            type(exception).__name__, request.method, request.path,
+            getattr(getattr(request, "user", None), "pk", None),
+        )
         return None
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_token_days(apps, schema_editor):
+    # Seed the per-day counters from the tokens already handed out, so new bookings
+    # continue the existing queue. Rows that hit the old duplicate-token race keep
+    # token_date NULL so the new unique constraint can be added.
+    Appointment = apps.get_model('accounts', 'Appointment')
+    DailyTokenCounter = apps.get_model('accounts', 'DailyTokenCounter')
+
+    last_tokens = {}
+    seen = set()
+    unique_ids = []
+    rows = Appointment.objects.exclude(token_number=None).values_list('id', 'doctor_id', 'date', 'token_number')
+    for pk, doctor_id, date, token in rows.iterator():
+        day = timezone.localtime(date).date() if timezone.is_aware(date) else date.date()
+        key = (doctor_id, day)
+        last_tokens[key] = max(last_tokens.get(key, 0), token)
+        if (doctor_id, day, token) in seen:
+            continue
+        seen.add((doctor_id, day, token))
+        unique_ids.append((pk, day))
+
+    for pk, day in unique_ids:
+        Appointment.objects.filter(pk=pk).update(token_date=day)
+    DailyTokenCounter.objects.bulk_create(
+        [DailyTokenCounter(doctor_id=doctor_id, day=day, last_token=token) for (doctor_id, day), token in last_tokens.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0029_appointment_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTokenCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('last_token', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='token_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dailytokencounter',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='token_counters', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='dailytokencounter',
+            constraint=models.UniqueConstraint(fields=('doctor', 'day'), name='unique_token_counter_per_doctor_day'),
+        ),
+        migrations.RunPython(backfill_token_days, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(fields=('doctor', 'token_date', 'token_number'), name='unique_token_per_doctor_day'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0033_appointment_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientDemographicStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('age_bucket', models.CharField(max_length=10)),
+                ('gender', models.CharField(blank=True, default='', max_length=10)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('age_bucket', 'gender'), name='unique_patient_demographic_stat')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AppointmentDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('payment_status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='appointment_daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='appt_stat_day_idx'), models.Index(fields=['doctor', 'day'], name='appt_stat_doctor_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'doctor', 'status', 'payment_status'), name='unique_appointment_daily_stat')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:35
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_fee_paid(apps, schema_editor):
+    # Best record we have for past payments is the doctor's fee as it stands today
+    Appointment = apps.get_model('accounts', 'Appointment')
+    User = apps.get_model('accounts', 'User')
+    Appointment.objects.filter(payment_status='paid', fee_paid__isnull=True).update(
+        fee_paid=Subquery(User.objects.filter(pk=OuterRef('doctor_id')).values('consultation_fee')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0034_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='fee_paid',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_fee_paid, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['payment_status', 'date', 'fee_paid'], name='appt_revenue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'payment_status', 'date', 'fee_paid'], name='appt_doctor_revenue_idx'),
+        ),
+    ]
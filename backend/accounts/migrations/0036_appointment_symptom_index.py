@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:38
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+# Frozen copy of accounts.symptoms.tokenize as of this migration, so later changes
+# to the live tokenizer can't change (or break) what this backfill produces
+MAX_TERM_LENGTH = 50
+MIN_TERM_LENGTH = 3
+STOPWORDS = frozenset("""
+    a an and are as at be been but by for from had has have having he her him his i in into is it its
+    me my no not of on or our she since so some than that the their them then there these they this
+    to too very was we were what when which while who will with would you your
+    about after again also any because before being both can could did does doing during each few
+    feel feeling feels got get getting just more most much other over same should still such up
+    days day week weeks month months since last past bit little lot times time
+""".split())
+WORD_RE = re.compile(r"[a-z]+")
+
+
+def normalize(word):
+    if len(word) > 4 and word.endswith("es") and word[-3] in "sxz":
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    terms = set()
+    for word in WORD_RE.findall((text or "").lower()):
+        if len(word) < MIN_TERM_LENGTH or word in STOPWORDS:
+            continue
+        terms.add(normalize(word)[:MAX_TERM_LENGTH])
+    return terms
+
+
+def backfill_symptoms(apps, schema_editor):
+    Appointment = apps.get_model('accounts', 'Appointment')
+    AppointmentSymptom = apps.get_model('accounts', 'AppointmentSymptom')
+    rows = []
+    for pk, reason, date in Appointment.objects.values_list('id', 'reason', 'date').iterator(chunk_size=BATCH_SIZE):
+        rows.extend(AppointmentSymptom(appointment_id=pk, term=term, date=date) for term in tokenize(reason))
+        if len(rows) >= BATCH_SIZE:
+            AppointmentSymptom.objects.bulk_create(rows)
+            rows = []
+    AppointmentSymptom.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0035_appointment_fee_paid'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AppointmentSymptom',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=50)),
+                ('date', models.DateTimeField()),
+                ('appointment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='symptom_terms', to='accounts.appointment')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'date'], name='symptom_term_date_idx'), models.Index(fields=['date', 'term'], name='symptom_date_term_idx')],
+                'constraints': [models.UniqueConstraint(fields=('appointment', 'term'), name='unique_appointment_symptom_term')],
+            },
+        ),
+        migrations.RunPython(backfill_symptoms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0036_appointment_symptom_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='labreport',
+            index=models.Index(fields=['patient', '-date', '-id'], name='lab_patient_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='labreport',
+            index=models.Index(fields=['-date', '-id'], name='lab_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:46
+
+from django.db import migrations, models
+
+
+def spread_existing_double_bookings(apps, schema_editor):
+    # Bookings made before the constraint may share a doctor and start time; give each
+    # extra one its own seat so they all stay valid.
+    Appointment = apps.get_model('accounts', 'Appointment')
+    seen = {}
+    for appt in Appointment.objects.exclude(status='cancelled').order_by('doctor_id', 'date', 'id').only('id', 'doctor_id', 'date'):
+        key = (appt.doctor_id, appt.date)
+        seat = seen.get(key, -1) + 1
+        seen[key] = seat
+        if seat:
+            Appointment.objects.filter(pk=appt.pk).update(slot_index=seat)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0038_doctor_schedules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='slot_index',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(spread_existing_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), fields=('doctor', 'date', 'slot_index'), name='unique_active_doctor_slot'),
+        ),
+    ]
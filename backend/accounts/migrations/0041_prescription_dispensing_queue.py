@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0040_token_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prescription',
+            name='dispensed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(condition=models.Q(('is_dispensed', False)), fields=['date', 'id'], name='script_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+from django.db import migrations
+from django.db.models import Case, CharField, Count, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+
+BATCH_SIZE = 1000
+
+# Frozen copy of accounts.analytics.AGE_BUCKETS as of this migration
+AGE_BUCKETS = (
+    ("0-18", None, 18),
+    ("19-35", 18, 35),
+    ("36-50", 35, 50),
+    ("51-65", 50, 65),
+    ("65+", 65, None),
+)
+UNKNOWN_AGE = "unknown"
+
+
+def _age_bucket_expression():
+    whens = []
+    for name, low, high in AGE_BUCKETS:
+        q = Q()
+        if low is not None:
+            q &= Q(age__gt=low)
+        if high is not None:
+            q &= Q(age__lte=high)
+        whens.append(When(q, then=Value(name)))
+    return Case(*whens, default=Value(UNKNOWN_AGE), output_field=CharField())
+
+
+def backfill_rollups(apps, schema_editor):
+    # Fills the rollup tables once (fee_paid, which revenue needs, exists from 0035);
+    # after this the appointment and user signals keep them current
+    Appointment = apps.get_model('accounts', 'Appointment')
+    AppointmentDailyStat = apps.get_model('accounts', 'AppointmentDailyStat')
+    PatientDemographicStat = apps.get_model('accounts', 'PatientDemographicStat')
+    User = apps.get_model('accounts', 'User')
+
+    AppointmentDailyStat.objects.all().delete()
+    groups = (
+        Appointment.objects.annotate(day=TruncDate('date'))
+        .values('day', 'doctor_id', 'status', 'payment_status')
+        .annotate(total=Count('id'), paid_revenue=Sum('fee_paid', filter=Q(payment_status='paid')))
+        .order_by()
+    )
+    AppointmentDailyStat.objects.bulk_create(
+        (
+            AppointmentDailyStat(
+                day=g['day'], doctor_id=g['doctor_id'], status=g['status'], payment_status=g['payment_status'],
+                count=g['total'], revenue=g['paid_revenue'] or 0,
+            )
+            for g in groups.iterator(chunk_size=BATCH_SIZE)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+    PatientDemographicStat.objects.all().delete()
+    demographics = (
+        User.objects.filter(role='patient')
+        .annotate(bucket=_age_bucket_expression(), gender_key=Coalesce('gender', Value('')))
+        .values('bucket', 'gender_key').annotate(total=Count('id')).order_by()
+    )
+    PatientDemographicStat.objects.bulk_create(
+        PatientDemographicStat(age_bucket=g['bucket'], gender=g['gender_key'], count=g['total']) for g in demographics
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0041_prescription_dispensing_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 
 class User(AbstractUser):
     # What kind of user is this? (Admin, Doctor, Staff, or Patient)
@@ -34,6 +35,30 @@ class User(AbstractUser):
     # Any past sicknesses or allergies we should know about?
     medical_history = models.TextField(blank=True, null=True, help_text="e.g. Allergies to peanuts, Asthma")
 
+class TokenUser(User):
+    """
+    request.user for JWT requests (see accounts.authentication). Built from a few
+    cached columns; the first access to any other field loads all the rest in one query.
+    """
+
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = list(deferred)
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+
+class StaleAppointmentError(Exception):
+    """Appointment.save() found the row changed since this instance was loaded."""
+
+    def __init__(self, appointment_id):
+        super().__init__(f"Appointment {appointment_id} was modified concurrently")
+        self.appointment_id = appointment_id
+
+
 class Appointment(models.Model):
     patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="appointments_as_patient")
     doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="appointments_as_doctor")
@@ -53,28 +78,90 @@ class Appointment(models.Model):
     diagnosis = models.TextField(blank=True, null=True)
     vitals = models.TextField(blank=True, null=True, help_text="JSON or text of vitals (BP, Temp, Weight)")
     token_number = models.PositiveIntegerField(null=True, blank=True)
+    # Clinic day the token belongs to (the doctor's queue is per day)
+    token_date = models.DateField(null=True, blank=True)
     decline_reason = models.TextField(blank=True, null=True)
     payment_status = models.CharField(
         max_length=20,
         choices=[("pending", "Pending"), ("paid", "Paid")],
         default="pending"
     )
+    # Amount actually charged, captured when payment is confirmed. Revenue is summed from
+    # this so it doesn't need a join to the doctor or change when their fee does.
+    fee_paid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     consultation_type = models.CharField(
         max_length=20,
         choices=[("normal", "Normal Consultation"), ("online", "Online Consultation")],
         default="normal"
     )
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
+    # Bumped on every save; list ETags use it. QuerySet.update() callers must set it themselves.
+    updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
+    # Seat within a slot whose capacity is above one (see ScheduleTemplate.capacity)
+    slot_index = models.PositiveSmallIntegerField(default=0)
+    # Optimistic lock: save() only succeeds against the version it loaded. QuerySet.update()
+    # callers must filter on and bump it themselves.
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Composite indexes backing the (date, id) keyset pagination in get_appointments
+        # and its server-side filters.
+        indexes = [
+            models.Index(fields=["-date", "-id"], name="appt_date_id_idx"),
+            models.Index(fields=["patient", "-date", "-id"], name="appt_patient_date_idx"),
+            models.Index(fields=["doctor", "-date", "-id"], name="appt_doctor_date_idx"),
+            models.Index(fields=["status", "-date", "-id"], name="appt_status_date_idx"),
+            models.Index(fields=["payment_status", "-date", "-id"], name="appt_payment_date_idx"),
+            models.Index(fields=["consultation_type", "-date", "-id"], name="appt_type_date_idx"),
+            # Revenue sums; fee_paid is in the index so the sum never touches the table
+            models.Index(fields=["payment_status", "date", "fee_paid"], name="appt_revenue_idx"),
+            models.Index(fields=["doctor", "payment_status", "date", "fee_paid"], name="appt_doctor_revenue_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["doctor", "token_date", "token_number"], name="unique_token_per_doctor_day"),
+            # One active booking per doctor, slot and seat (bookings store their slot's start,
+            # see schedule.booking_slot); cancelling frees the seat
+            models.UniqueConstraint(
+                fields=["doctor", "date", "slot_index"],
+                condition=~models.Q(status="cancelled"),
+                name="unique_active_doctor_slot",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.patient.username} with {self.doctor.username} on {self.date}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        # Claim the next version with a conditional UPDATE first: it fails if someone
+        # else saved in between, and holds the row lock until this save commits.
+        expected = self.version
+        with transaction.atomic(using=kwargs.get("using")):
+            claimed = type(self)._base_manager.filter(pk=self.pk, version=expected).update(version=expected + 1)
+            if not claimed:
+                raise StaleAppointmentError(self.pk)
+            self.version = expected + 1
+            try:
+                super().save(*args, **kwargs)
+            except Exception:
+                self.version = expected
+                raise
+
 class Notification(models.Model):
     recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications")
     message = models.CharField(max_length=255)
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # unread-count and mark-all-read
+            models.Index(fields=["recipient", "is_read", "created_at"], name="notif_recipient_unread_idx"),
+            # newest-first feed and ?since_id= deltas
+            models.Index(fields=["recipient", "-id"], name="notif_recipient_id_idx"),
+        ]
+
     def __str__(self):
         return f"To {self.recipient.username}: {self.message}"
 
@@ -93,6 +180,13 @@ class LabReport(models.Model):
     date = models.DateTimeField(auto_now_add=True)
     file_url = models.FileField(upload_to="lab_reports/", blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Newest-first lab lists: one patient's history, and the clinic-wide list
+            models.Index(fields=["patient", "-date", "-id"], name="lab_patient_date_idx"),
+            models.Index(fields=["-date", "-id"], name="lab_date_id_idx"),
+        ]
+
     def __str__(self):
         return f"{self.test_name} for {self.patient.username}"
 
@@ -113,8 +207,16 @@ class Prescription(models.Model):
     medicines = models.TextField(help_text="Simple text list or JSON of medicines")
     notes = models.TextField(blank=True, null=True)
     is_dispensed = models.BooleanField(default=False)
+    dispensed_at = models.DateTimeField(null=True, blank=True, db_index=True)
     date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # The pharmacy queue (accounts.dispensing) only ever reads undispensed scripts,
+            # so its index covers those and stays the size of the queue, not the history
+            models.Index(fields=["date", "id"], condition=models.Q(is_dispensed=False), name="script_pending_idx"),
+        ]
+
     def __str__(self):
         return f"Script for {self.patient.username} by {self.doctor.username}"
 
@@ -129,3 +231,152 @@ class MedicalRecord(models.Model):
 
     def __str__(self):
         return f"Medical Record for {self.patient.username} on {self.date}"
+
+class DailyTokenCounter(models.Model):
+    # One row per doctor per day; token_number for a booking is an atomic increment of last_token
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="token_counters")
+    day = models.DateField()
+    last_token = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["doctor", "day"], name="unique_token_counter_per_doctor_day"),
+        ]
+
+    def __str__(self):
+        return f"Dr. {self.doctor.username} on {self.day}: {self.last_token}"
+
+class OutboundMessage(models.Model):
+    # Email/SMS/WhatsApp waiting to be delivered by the process_outbox worker
+    CHANNEL_CHOICES = (
+        ("email", "Email"),
+        ("sms", "SMS"),
+        ("whatsapp", "WhatsApp"),
+    )
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("sending", "Sending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    )
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    recipient = models.CharField(max_length=254, help_text="Email address or phone number")
+    subject = models.CharField(max_length=255, blank=True, default="")
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} to {self.recipient} ({self.status})"
+
+class AppointmentDailyStat(models.Model):
+    # Rollup of appointments per day/doctor/status/payment_status, kept up to date by
+    # accounts.analytics on every Appointment save (a row can drop to count 0 and stay).
+    # Rebuild with `manage.py rebuild_analytics`.
+    day = models.DateField()
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="appointment_daily_stats")
+    status = models.CharField(max_length=20)
+    payment_status = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "doctor", "status", "payment_status"], name="unique_appointment_daily_stat"),
+        ]
+        indexes = [
+            models.Index(fields=["day"], name="appt_stat_day_idx"),
+            models.Index(fields=["doctor", "day"], name="appt_stat_doctor_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.day} Dr. {self.doctor_id} {self.status}/{self.payment_status}: {self.count}"
+
+class PatientDemographicStat(models.Model):
+    # Patient counts per age bucket and gender, maintained on User save/delete
+    age_bucket = models.CharField(max_length=10)
+    gender = models.CharField(max_length=10, blank=True, default="")
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["age_bucket", "gender"], name="unique_patient_demographic_stat"),
+        ]
+
+    def __str__(self):
+        return f"{self.age_bucket}/{self.gender or 'Unknown'}: {self.count}"
+
+class AppointmentSymptom(models.Model):
+    # Tokenized Appointment.reason (see accounts.symptoms). `date` is copied from the
+    # appointment so windowed symptom counts never need to join back to it.
+    appointment = models.ForeignKey(Appointment, on_delete=models.CASCADE, related_name="symptom_terms")
+    term = models.CharField(max_length=50)
+    date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["appointment", "term"], name="unique_appointment_symptom_term"),
+        ]
+        indexes = [
+            models.Index(fields=["term", "date"], name="symptom_term_date_idx"),
+            models.Index(fields=["date", "term"], name="symptom_date_term_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.term} (appointment {self.appointment_id})"
+
+
+WEEKDAY_CHOICES = [
+    (0, "Monday"), (1, "Tuesday"), (2, "Wednesday"), (3, "Thursday"),
+    (4, "Friday"), (5, "Saturday"), (6, "Sunday"),
+]
+
+
+class ScheduleTemplate(models.Model):
+    # Recurring weekly working hours (local time), cut into slots; see accounts.schedule
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="schedule_templates")
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=15)
+    capacity = models.PositiveSmallIntegerField(default=1, help_text="Patients per slot")
+
+    class Meta:
+        ordering = ["weekday", "start_time"]
+        indexes = [
+            models.Index(fields=["doctor", "weekday"], name="schedule_doctor_weekday_idx"),
+        ]
+
+    def __str__(self):
+        return f"Dr. {self.doctor.username} {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+
+class ScheduleException(models.Model):
+    # A day that differs from the template: time off (is_available=False, the whole
+    # day when no times are given) or extra hours (is_available=True)
+    doctor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="schedule_exceptions")
+    day = models.DateField()
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    is_available = models.BooleanField(default=False)
+    slot_minutes = models.PositiveSmallIntegerField(null=True, blank=True)
+    reason = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        ordering = ["day", "start_time"]
+        indexes = [
+            models.Index(fields=["doctor", "day"], name="schedule_exc_doctor_day_idx"),
+        ]
+
+    def __str__(self):
+        kind = "extra hours" if self.is_available else "off"
+        return f"Dr. {self.doctor.username} {kind} on {self.day}"
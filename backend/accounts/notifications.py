@@ -0,0 +1,86 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from . import events
+from .models import Notification, User
+
+ADMIN_IDS_CACHE_KEY = "notifications:admin_ids"
+ADMIN_IDS_TIMEOUT = 300  # seconds
+
+
+def get_admin_ids():
+    # Every booking notifies all admins; keep their ids around instead of querying each time
+    ids = cache.get(ADMIN_IDS_CACHE_KEY)
+    if ids is None:
+        ids = list(User.objects.filter(role="admin").values_list("id", flat=True))
+        cache.set(ADMIN_IDS_CACHE_KEY, ids, ADMIN_IDS_TIMEOUT)
+    return ids
+
+
+def invalidate_admin_ids():
+    cache.delete(ADMIN_IDS_CACHE_KEY)
+
+
+class NotificationBatch:
+    """
+    Collects in-app notifications and writes them with a single bulk INSERT.
+
+        batch = NotificationBatch()
+        batch.add(doctor, "New request ...")
+        batch.add_admins("A new appointment ...")
+        batch.send()
+
+    send() defers the write to transaction commit when called inside atomic(), so a
+    rolled-back request never leaves notifications behind. Outside a transaction it
+    writes immediately.
+    """
+
+    def __init__(self):
+        self._pending = []
+        self._seen = set()
+
+    def add(self, recipient, message):
+        recipient_id = getattr(recipient, "id", recipient)
+        key = (recipient_id, message)
+        if recipient_id is not None and key not in self._seen:
+            self._seen.add(key)
+            self._pending.append(key)
+        return self
+
+    def add_many(self, recipients, message):
+        for recipient in recipients:
+            self.add(recipient, message)
+        return self
+
+    def add_admins(self, message):
+        return self.add_many(get_admin_ids(), message)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def send(self, defer=True):
+        pending, self._pending, self._seen = self._pending, [], set()
+        if not pending:
+            return
+        if defer:
+            transaction.on_commit(lambda: _write(pending))
+        else:
+            _write(pending)
+
+
+def _write(pending):
+    created = Notification.objects.bulk_create(
+        [Notification(recipient_id=recipient_id, message=message[:255]) for recipient_id, message in pending]
+    )
+    # bulk_create skips post_save, so push to open event streams here
+    for notification in created:
+        events.publish([events.user_channel(notification.recipient_id)], "notification", {
+            "id": notification.id,
+            "message": notification.message,
+            "is_read": notification.is_read,
+            "created_at": notification.created_at,
+        })
+
+
+def notify(recipient, message, defer=True):
+    NotificationBatch().add(recipient, message).send(defer=defer)
@@ -0,0 +1,169 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboundMessage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FROM_EMAIL = "noreply@hospital.com"
+MAX_ATTEMPTS = getattr(settings, "OUTBOX_MAX_ATTEMPTS", 5)
+RETRY_BASE_SECONDS = getattr(settings, "OUTBOX_RETRY_BASE_SECONDS", 30)
+CLAIM_LEASE = timedelta(minutes=10)
+
+
+# --- Enqueueing (used by views) ---
+
+def email(recipient, subject, body):
+    return OutboundMessage(channel="email", recipient=recipient, subject=subject[:255], body=body)
+
+
+def sms(recipient, body):
+    return OutboundMessage(channel="sms", recipient=recipient, body=body)
+
+
+def whatsapp(recipient, body):
+    return OutboundMessage(channel="whatsapp", recipient=recipient, body=body)
+
+
+def enqueue(*messages):
+    """Persist messages for the process_outbox worker. Never talks to SMTP/SMS providers."""
+    messages = [m for m in messages if m is not None and m.recipient]
+    if messages:
+        OutboundMessage.objects.bulk_create(messages)
+    return messages
+
+
+# --- SMS / WhatsApp backends ---
+
+class ConsoleSMSBackend:
+    """Stand-in until a real provider is wired up: logs what would have been sent."""
+
+    def send(self, message):
+        label = "WHATSAPP" if message.channel == "whatsapp" else "SMS"
+        logger.info("--> %s SENT TO: %s\nMessage: %s", label, message.recipient, message.body)
+
+
+def get_sms_backend():
+    path = getattr(settings, "OUTBOX_SMS_BACKEND", "accounts.outbox.ConsoleSMSBackend")
+    return import_string(path)()
+
+
+# --- Worker ---
+
+def claim_due_messages(batch_size):
+    """
+    Mark up to `batch_size` due messages as "sending" and return them.
+
+    On databases with SKIP LOCKED several workers can run side by side without
+    picking up the same rows. A claim is a lease: if the worker dies mid-batch the
+    rows become due again once CLAIM_LEASE has passed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = OutboundMessage.objects.filter(
+            status__in=["pending", "sending"], next_attempt_at__lte=now,
+        ).order_by("next_attempt_at", "id")
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        messages = list(due[:batch_size])
+        OutboundMessage.objects.filter(id__in=[m.id for m in messages]).update(
+            status="sending", next_attempt_at=now + CLAIM_LEASE,
+        )
+    return messages
+
+
+def _send_email_chunk(messages):
+    # One SMTP connection per chunk instead of one per message
+    results = {}
+    mail_connection = get_connection()
+    try:
+        mail_connection.open()
+        for message in messages:
+            try:
+                EmailMessage(
+                    message.subject, message.body, DEFAULT_FROM_EMAIL, [message.recipient],
+                    connection=mail_connection,
+                ).send()
+                results[message.id] = None
+            except Exception as e:
+                results[message.id] = str(e)
+    except Exception as e:
+        for message in messages:
+            results.setdefault(message.id, str(e))
+    finally:
+        try:
+            mail_connection.close()
+        except Exception:
+            pass
+    return results
+
+
+def _send_sms_chunk(messages):
+    results = {}
+    backend = get_sms_backend()
+    for message in messages:
+        try:
+            backend.send(message)
+            results[message.id] = None
+        except Exception as e:
+            results[message.id] = str(e)
+    return results
+
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def deliver(messages, workers=4, chunk_size=50):
+    """Send claimed messages on a thread pool and record the outcome. Returns (sent, failed)."""
+    emails = [m for m in messages if m.channel == "email"]
+    others = [m for m in messages if m.channel != "email"]
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(_send_email_chunk, chunk) for chunk in _chunks(emails, chunk_size)]
+        futures += [pool.submit(_send_sms_chunk, chunk) for chunk in _chunks(others, chunk_size)]
+        for future in futures:
+            results.update(future.result())
+
+    now = timezone.now()
+    sent, failed = [], []
+    for message in messages:
+        error = results.get(message.id, "Not attempted")
+        message.attempts += 1
+        if error is None:
+            message.status = "sent"
+            message.sent_at = now
+            message.last_error = None
+            sent.append(message)
+        else:
+            message.last_error = error
+            if message.attempts >= MAX_ATTEMPTS:
+                message.status = "failed"
+            else:
+                # Exponential backoff: 30s, 60s, 120s, ...
+                message.status = "pending"
+                message.next_attempt_at = now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (message.attempts - 1))
+            failed.append(message)
+            logger.warning("Outbound %s to %s failed (attempt %s): %s", message.channel, message.recipient, message.attempts, error)
+
+    OutboundMessage.objects.bulk_update(
+        messages, ["status", "attempts", "sent_at", "last_error", "next_attempt_at"], batch_size=500,
+    )
+    return sent, failed
+
+
+def process_batch(batch_size=200, workers=4, chunk_size=50):
+    messages = claim_due_messages(batch_size)
+    if not messages:
+        return 0, 0
+    sent, failed = deliver(messages, workers=workers, chunk_size=chunk_size)
+    return len(sent), len(failed)
@@ -0,0 +1,77 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(date, pk):
+    # Cursor is just "<iso datetime>|<id>" of the last row, base64'd so it is opaque to clients
+    raw = f"{date.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_str, pk = raw.rsplit("|", 1)
+        date = parse_datetime(date_str)
+        pk = int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor("Invalid cursor")
+    if date is None:
+        raise InvalidCursor("Invalid cursor")
+    return date, pk
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE):
+    if value in (None, ""):
+        return default
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise InvalidCursor("limit must be an integer")
+    if size < 1:
+        raise InvalidCursor("limit must be positive")
+    return min(size, MAX_PAGE_SIZE)
+
+
+def is_paginated_request(params):
+    return "cursor" in params or "limit" in params
+
+
+def keyset_page(queryset, params, date_field="date"):
+    """
+    Newest-first keyset pagination on (date_field, id).
+
+    Returns (rows, next_cursor). Cost is one indexed range scan of `limit + 1` rows
+    no matter how deep into the history the client has paged.
+    """
+    limit = parse_page_size(params.get("limit"))
+    cursor = params.get("cursor")
+
+    queryset = queryset.order_by(f"-{date_field}", "-id")
+    if cursor:
+        date, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f"{date_field}__lt": date}) | Q(**{date_field: date, "id__lt": pk})
+        )
+
+    rows = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if isinstance(last, dict):
+            # values() querysets
+            next_cursor = encode_cursor(last[date_field], last["id"])
+        else:
+            next_cursor = encode_cursor(getattr(last, date_field), last.id)
+    return rows, next_cursor
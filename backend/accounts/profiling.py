@@ -0,0 +1,142 @@
+"""
+Per-request query profiling (see middleware.QueryProfilingMiddleware).
+
+While a request runs, every SQL statement is timed through a database execute
+wrapper and grouped by fingerprint: the SQL with literals and IN-lists
+collapsed, so the same query issued once per row (an N+1) shows up as one
+fingerprint with a high count. Requests over any budget in settings
+(QUERY_BUDGET_*) are written as one JSON line to the "accounts.profiling"
+logger, which settings sends to a rotating file.
+
+Profiling is off unless QUERY_PROFILING is set, and can be switched at runtime
+through the admin endpoint (views.admin_profiling). The switch lives in Django's
+cache, so it reaches every worker when REDIS_URL is set; each process re-reads it
+at most every SWITCH_POLL_SECONDS.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger("accounts.profiling")
+
+SWITCH_CACHE_KEY = "profiling:enabled"
+SWITCH_POLL_SECONDS = 5
+TOP_DUPLICATES = 5
+
+_IN_LIST = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+
+_switch = {"enabled": None, "checked": 0.0}
+
+
+def fingerprint(sql):
+    sql = _STRING.sub("?", sql)
+    sql = _IN_LIST.sub("(...)", sql)
+    return _NUMBER.sub("?", sql)
+
+
+def budgets():
+    return {
+        "queries": getattr(settings, "QUERY_BUDGET_COUNT", 50),
+        "db_ms": getattr(settings, "QUERY_BUDGET_DB_MS", 200),
+        "wall_ms": getattr(settings, "QUERY_BUDGET_WALL_MS", 1000),
+        "duplicates": getattr(settings, "QUERY_BUDGET_DUPLICATES", 5),
+    }
+
+
+def is_enabled():
+    now = time.monotonic()
+    if _switch["enabled"] is None or now - _switch["checked"] >= SWITCH_POLL_SECONDS:
+        enabled = cache.get(SWITCH_CACHE_KEY)
+        _switch["enabled"] = getattr(settings, "QUERY_PROFILING", False) if enabled is None else enabled
+        _switch["checked"] = now
+    return _switch["enabled"]
+
+
+def set_enabled(enabled):
+    cache.set(SWITCH_CACHE_KEY, bool(enabled), None)
+    _switch.update(enabled=bool(enabled), checked=time.monotonic())
+
+
+def reset_switch():
+    """Back to the QUERY_PROFILING setting (and re-read on the next request)."""
+    cache.delete(SWITCH_CACHE_KEY)
+    _switch.update(enabled=None, checked=0.0)
+
+
+class QueryProfile:
+    """Execute wrapper collecting timings for the connections it is installed on."""
+
+    def __init__(self):
+        self.count = 0
+        self.db_seconds = 0.0
+        self.fingerprints = Counter()
+        self.started = time.perf_counter()
+        self.wall_seconds = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def installed(self):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self.started
+
+    def duplicates(self, threshold):
+        return [(sql, n) for sql, n in self.fingerprints.most_common(TOP_DUPLICATES) if n >= threshold]
+
+    def over_budget(self, limits):
+        over = []
+        if self.count > limits["queries"]:
+            over.append("queries")
+        if self.db_seconds * 1000 > limits["db_ms"]:
+            over.append("db_ms")
+        if self.wall_seconds * 1000 > limits["wall_ms"]:
+            over.append("wall_ms")
+        if self.duplicates(limits["duplicates"]):
+            over.append("duplicates")
+        return over
+
+    def report(self, request, response, over, limits):
+        return {
+            "method": request.method,
+            "path": request.path,
+            "status": getattr(response, "status_code", None),
+            "user_id": getattr(getattr(request, "user", None), "pk", None),
+            "queries": self.count,
+            "db_ms": round(self.db_seconds * 1000, 1),
+            "wall_ms": round(self.wall_seconds * 1000, 1),
+            "over": over,
+            "duplicates": [{"sql": sql[:500], "count": n} for sql, n in self.duplicates(limits["duplicates"])],
+        }
+
+    def log(self, request, response):
+        limits = budgets()
+        over = self.over_budget(limits)
+        if over:
+            logger.warning(json.dumps(self.report(request, response, over, limits)))
+        return over
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.count} queries", '
+            f"total;dur={self.wall_seconds * 1000:.1f}"
+        )
@@ -0,0 +1,184 @@
+"""
+Free appointment slots from doctors' weekly templates and exceptions.
+
+For each day a doctor's working time is a set of intervals: the template blocks
+for that weekday, plus extra-hours exceptions, minus time-off exceptions. Each
+interval is cut into fixed-length slots, and a slot is free while it holds fewer
+active appointments than its capacity. Templates, exceptions and booked
+appointments are each read with one query per batch of doctors; everything
+else is done in memory.
+"""
+import heapq
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import Appointment, ScheduleException, ScheduleTemplate
+
+DEFAULT_SLOT_MINUTES = 15
+DOCTOR_BATCH_SIZE = 50
+MAX_RANGE_DAYS = 62
+
+# Statuses that no longer hold a slot
+RELEASED_STATUSES = ("cancelled",)
+
+
+def _at(day, clock, tz):
+    return timezone.make_aware(datetime.combine(day, clock), tz)
+
+
+def subtract_intervals(blocks, holes):
+    """
+    blocks: [(start, end, slot_minutes, capacity)]; holes: [(start, end)].
+    Returns the parts of each block not covered by any hole.
+    """
+    holes = sorted(holes)
+    result = []
+    for start, end, slot_minutes, capacity in blocks:
+        cursor = start
+        for hole_start, hole_end in holes:
+            if hole_end <= cursor or hole_start >= end:
+                continue
+            if hole_start > cursor:
+                result.append((cursor, hole_start, slot_minutes, capacity))
+            cursor = max(cursor, hole_end)
+            if cursor >= end:
+                break
+        if cursor < end:
+            result.append((cursor, end, slot_minutes, capacity))
+    return sorted(result)
+
+
+def day_intervals(day, templates, exceptions, tz):
+    """Working intervals for one doctor on one day, as (start, end, slot_minutes, capacity)."""
+    blocks = [
+        (_at(day, t.start_time, tz), _at(day, t.end_time, tz), t.slot_minutes, t.capacity)
+        for t in templates if t.weekday == day.weekday()
+    ]
+    default_slot = blocks[0][2] if blocks else (templates[0].slot_minutes if templates else DEFAULT_SLOT_MINUTES)
+
+    holes = []
+    for exc in exceptions:
+        if exc.day != day:
+            continue
+        if exc.is_available:
+            if exc.start_time and exc.end_time:
+                blocks.append((
+                    _at(day, exc.start_time, tz), _at(day, exc.end_time, tz),
+                    exc.slot_minutes or default_slot, 1,
+                ))
+        elif exc.start_time and exc.end_time:
+            holes.append((_at(day, exc.start_time, tz), _at(day, exc.end_time, tz)))
+        else:
+            holes.append((_at(day, time.min, tz), _at(day + timedelta(days=1), time.min, tz)))
+    return subtract_intervals(blocks, holes)
+
+
+def free_slots(intervals, booked, not_before):
+    """
+    Yield (start, end, remaining) for each slot in `intervals` that starts at or after
+    `not_before` and still has room. `booked` is the sorted list of appointment times.
+    """
+    seen = set()
+    for start, end, slot_minutes, capacity in intervals:
+        step = timedelta(minutes=slot_minutes)
+        slot = start
+        while slot + step <= end:
+            if slot >= not_before and slot not in seen:
+                seen.add(slot)
+                taken = bisect_left(booked, slot + step) - bisect_left(booked, slot)
+                if taken < capacity:
+                    yield slot, slot + step, capacity - taken
+            slot += step
+
+
+class OffGrid(ValueError):
+    pass
+
+
+def booking_slot(doctor_id, when):
+    """
+    The slot `when` falls in on the doctor's grid, as (start, capacity). Bookings are
+    stored at the slot start, so two times inside one slot compete for its seats.
+
+    A doctor with no schedule at all keeps an open calendar: DEFAULT_SLOT_MINUTES
+    slots from midnight, one patient each. Raises OffGrid when `when` is outside
+    the doctor's working intervals.
+    """
+    tz = timezone.get_current_timezone()
+    day = timezone.localtime(when, tz).date()
+    templates = list(ScheduleTemplate.objects.filter(doctor_id=doctor_id))
+    exceptions = list(ScheduleException.objects.filter(doctor_id=doctor_id, day=day))
+    if templates or any(e.is_available for e in exceptions):
+        intervals = day_intervals(day, templates, exceptions, tz)
+    else:
+        intervals = [(_at(day, time.min, tz), _at(day + timedelta(days=1), time.min, tz), DEFAULT_SLOT_MINUTES, 1)]
+
+    for start, end, slot_minutes, capacity in intervals:
+        step = timedelta(minutes=slot_minutes)
+        if start <= when < end:
+            slot = start + (when - start) // step * step
+            if slot + step <= end:
+                return slot, capacity
+    raise OffGrid("The doctor doesn't see patients at that time. Pick one of the free slots.")
+
+
+def _batches(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def find_free_slots(doctors, start_day, end_day, limit=10, now=None):
+    """
+    The earliest `limit` free slots across `doctors` (directory dicts with id,
+    username and specialization) between start_day and end_day inclusive.
+    """
+    tz = timezone.get_current_timezone()
+    now = now or timezone.now()
+    range_start = _at(start_day, time.min, tz)
+    range_end = _at(end_day + timedelta(days=1), time.min, tz)
+    days = [start_day + timedelta(days=i) for i in range((end_day - start_day).days + 1)]
+
+    candidates = []
+    for batch in _batches(list(doctors), DOCTOR_BATCH_SIZE):
+        ids = [d["id"] for d in batch]
+        templates, exceptions, booked = {}, {}, {}
+        for template in ScheduleTemplate.objects.filter(doctor_id__in=ids):
+            templates.setdefault(template.doctor_id, []).append(template)
+        for exc in ScheduleException.objects.filter(doctor_id__in=ids, day__range=(start_day, end_day)):
+            exceptions.setdefault(exc.doctor_id, []).append(exc)
+        appointments = (
+            Appointment.objects.filter(doctor_id__in=ids, date__gte=range_start, date__lt=range_end)
+            .exclude(status__in=RELEASED_STATUSES).values_list("doctor_id", "date").order_by("date")
+        )
+        for doctor_id, date in appointments:
+            booked.setdefault(doctor_id, []).append(date)
+
+        for doctor in batch:
+            doctor_templates = templates.get(doctor["id"], [])
+            doctor_exceptions = exceptions.get(doctor["id"], [])
+            if not doctor_templates and not any(e.is_available for e in doctor_exceptions):
+                continue
+            found = 0
+            for day in days:
+                intervals = day_intervals(day, doctor_templates, doctor_exceptions, tz)
+                for start, end, remaining in free_slots(intervals, booked.get(doctor["id"], []), now):
+                    candidates.append((start, doctor["id"], end, remaining, doctor))
+                    found += 1
+                    if found >= limit:
+                        break
+                if found >= limit:
+                    break
+
+    return [
+        {
+            "doctor_id": doctor["id"],
+            "doctor": doctor["username"],
+            "specialization": doctor["specialization"],
+            "start": start,
+            "end": end,
+            "remaining": remaining,
+        }
+        for start, _, end, remaining, doctor in heapq.nsmallest(limit, candidates, key=lambda c: (c[0], c[1]))
+    ]
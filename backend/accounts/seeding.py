@@ -0,0 +1,310 @@
+"""
+Synthetic data for local load testing (manage.py seed_data, bench_api).
+
+Rows are generated lazily and written with bulk_create in batches, so memory
+stays flat from thousands to millions of appointments. Every random choice comes
+from one random.Random(seed), and everything that depends on the current time
+(past vs future statuses, dispensing, read flags) is measured from midnight of
+`today` instead of the clock, so the same arguments and `today` produce the same
+data. All users share one precomputed password hash.
+
+Appointments respect the booking constraints: each doctor's k-th appointment
+lands on day k % days with token k // days + 1, so (doctor, day, token) and
+(doctor, start time) are unique, and DailyTokenCounter rows are written to match
+so new bookings continue the sequence. Prescriptions, medical records, referrals
+and notifications are derived from each batch of appointments as it is inserted.
+"""
+import math
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    Appointment, DailyTokenCounter, LabReport, MedicalRecord, Notification,
+    Prescription, Referral, ScheduleTemplate, User,
+)
+
+DEFAULT_PASSWORD = "password123"
+
+SPECIALIZATIONS = [
+    "General Practice", "Cardiology", "Dermatology", "Pediatrics", "Orthopedics",
+    "Neurology", "Gynecology", "ENT", "Psychiatry", "Ophthalmology",
+]
+REASONS = [
+    "Fever and cough", "Headache", "Back pain", "Skin rash", "Chest pain", "Sore throat",
+    "Stomach ache and nausea", "Follow-up visit", "Joint pain", "Fatigue and dizziness",
+    "Shortness of breath", "Annual checkup", "Ear pain", "Blurred vision", "Anxiety",
+]
+DIAGNOSES = [
+    ("Viral fever", "Rest, fluids, paracetamol"), ("Migraine", "Avoid triggers, analgesics"),
+    ("Lumbar strain", "Physiotherapy, NSAIDs"), ("Contact dermatitis", "Topical steroid"),
+    ("Upper respiratory infection", "Symptomatic care"), ("Gastritis", "PPI for 2 weeks"),
+    ("Hypertension", "Lifestyle changes, review in 4 weeks"), ("Allergic rhinitis", "Antihistamines"),
+]
+MEDICINES = [
+    "Paracetamol 500mg - 1 tab thrice daily", "Amoxicillin 500mg - 1 cap twice daily",
+    "Ibuprofen 400mg - 1 tab after meals", "Cetirizine 10mg - 1 tab at night",
+    "Omeprazole 20mg - 1 cap before breakfast", "Amlodipine 5mg - 1 tab daily",
+]
+# (test, unit, low, high)
+LAB_TESTS = [
+    ("Hemoglobin", "g/dL", 12.0, 17.5), ("Fasting Glucose", "mg/dL", 70, 100),
+    ("Total Cholesterol", "mg/dL", 125, 200), ("HbA1c", "%", 4.0, 5.6),
+    ("Creatinine", "mg/dL", 0.6, 1.2), ("TSH", "mIU/L", 0.4, 4.0), ("Vitamin D", "ng/mL", 30, 100),
+]
+BLOOD_GROUPS = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+
+# Appointment status mix before and after the start of `today`
+PAST_STATUSES = (["completed", "cancelled", "confirmed", "pending"], [75, 15, 5, 5])
+FUTURE_STATUSES = (["pending", "confirmed", "cancelled"], [55, 40, 5])
+
+FIRST_SLOT = time(8, 0)
+WORKING_MINUTES = 600  # 08:00 - 18:00
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """bulk_create stamps auto_now_add fields with now(); let seeded rows keep the dates they were given."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+class Seeder:
+    def __init__(self, doctors=50, patients=2000, appointments=20000, lab_reports=None, staff=10, admins=1,
+                 days=365, future_days=30, prefix="seed", password=DEFAULT_PASSWORD, seed=42,
+                 batch_size=5000, today=None, log=None):
+        if doctors < 1 or patients < 1:
+            raise ValueError("Need at least one doctor and one patient")
+        self.doctor_count, self.patient_count = doctors, patients
+        self.appointment_count = appointments
+        self.lab_report_count = appointments // 2 if lab_reports is None else lab_reports
+        self.staff_count, self.admin_count = staff, admins
+        self.prefix, self.batch_size = prefix, batch_size
+        self.rng = random.Random(seed)
+        self.password_hash = make_password(password)
+        self.log = log or (lambda message: None)
+
+        self.tz = timezone.get_current_timezone()
+        today = today or timezone.localdate()
+        self.now = timezone.make_aware(datetime.combine(today, time.min), self.tz)
+        self.first_day = today - timedelta(days=days)
+        self.total_days = days + future_days
+        per_doctor = math.ceil(appointments / doctors)
+        self.max_tokens = math.ceil(per_doctor / self.total_days)
+        if self.max_tokens > WORKING_MINUTES:
+            raise ValueError(
+                f"{self.max_tokens} appointments per doctor per day won't fit in a working day; "
+                "add doctors or days"
+            )
+        self.slot_minutes = 15 if self.max_tokens <= WORKING_MINUTES // 15 else WORKING_MINUTES // self.max_tokens
+
+        self.counts = {}
+        self.doctors = []   # (id, username, fee)
+        self.patient_ids = []
+        self.staff_ids = []
+        self.admin_ids = []
+
+    def run(self):
+        if User.objects.filter(username__startswith=f"{self.prefix}_").exists():
+            raise ValueError(f"Users named {self.prefix}_* already exist; use another prefix or flush the database")
+        self.create_users()
+        self.create_schedules()
+        with explicit_dates(
+            Appointment._meta.get_field("created_at"), Prescription._meta.get_field("date"),
+            MedicalRecord._meta.get_field("date"), Referral._meta.get_field("created_at"),
+            Notification._meta.get_field("created_at"), LabReport._meta.get_field("date"),
+        ):
+            self.create_appointments()
+            self.create_lab_reports()
+        self.create_token_counters()
+        return self.counts
+
+    def _insert(self, model, rows):
+        inserted = 0
+        for batch in _batches(rows, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            inserted += len(batch)
+        self._count(model, inserted)
+
+    def _count(self, model, n):
+        name = model._meta.verbose_name_plural
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    # --- Users ---
+
+    def _user(self, role, number, **fields):
+        username = f"{self.prefix}_{role}_{number}"
+        return User(username=username, email=f"{username}@example.com", role=role, password=self.password_hash, **fields)
+
+    def create_users(self):
+        rng = self.rng
+        admins = [self._user("admin", i, is_staff=True) for i in range(self.admin_count)]
+        staff = [self._user("staff", i) for i in range(self.staff_count)]
+        doctors = [
+            self._user(
+                "doctor", i, specialization=rng.choice(SPECIALIZATIONS), is_available=rng.random() < 0.9,
+                consultation_fee=rng.choice([30, 40, 50, 60, 75, 100, 150, 200]),
+            )
+            for i in range(self.doctor_count)
+        ]
+        with transaction.atomic():
+            self.admin_ids = [u.id for u in User.objects.bulk_create(admins)]
+            self.staff_ids = [u.id for u in User.objects.bulk_create(staff)]
+            self.doctors = [(u.id, u.username, u.consultation_fee) for u in User.objects.bulk_create(doctors)]
+
+        def patients():
+            for i in range(self.patient_count):
+                yield self._user(
+                    "patient", i,
+                    age=min(95, max(1, int(rng.gauss(42, 18)))),
+                    gender=rng.choices(["Female", "Male", "Other"], [49, 49, 2])[0],
+                    blood_group=rng.choice(BLOOD_GROUPS),
+                    phone_number=f"555{rng.randrange(10 ** 7):07d}",
+                    address=f"{rng.randint(1, 999)} Main Street",
+                    medical_history=rng.choice(["None", "Asthma", "Type 2 diabetes", "Penicillin allergy", "Hypertension"]),
+                )
+
+        for batch in _batches(patients(), self.batch_size):
+            with transaction.atomic():
+                self.patient_ids.extend(u.id for u in User.objects.bulk_create(batch))
+        self._count(User, len(admins) + len(staff) + len(doctors) + self.patient_count)
+        self.log(f"users: {self.admin_count} admins, {self.staff_count} staff, "
+                 f"{self.doctor_count} doctors, {self.patient_count} patients")
+
+    def create_schedules(self):
+        self._insert(ScheduleTemplate, (
+            ScheduleTemplate(doctor_id=doctor_id, weekday=weekday, start_time=time(8), end_time=time(18))
+            for doctor_id, _, _ in self.doctors for weekday in range(5)
+        ))
+
+    # --- Appointments and what follows from them ---
+
+    def _appointment(self, k):
+        rng = self.rng
+        doctor_id, doctor_name, fee = self.doctors[k % self.doctor_count]
+        j = k // self.doctor_count
+        day = self.first_day + timedelta(days=j % self.total_days)
+        token = j // self.total_days + 1
+        date = timezone.make_aware(datetime.combine(day, FIRST_SLOT), self.tz) + timedelta(
+            minutes=(token - 1) * self.slot_minutes
+        )
+        statuses, weights = PAST_STATUSES if date < self.now else FUTURE_STATUSES
+        status = rng.choices(statuses, weights)[0]
+        online = rng.random() < 0.2
+        paid = status == "completed" and rng.random() < 0.95 or status == "confirmed" and online and rng.random() < 0.5
+        appointment = Appointment(
+            patient_id=rng.choice(self.patient_ids), doctor_id=doctor_id, date=date, status=status,
+            reason=rng.choice(REASONS), token_number=token, token_date=day,
+            consultation_type="online" if online else "normal",
+            payment_status="paid" if paid else "pending", fee_paid=fee if paid else None,
+            created_at=date - timedelta(days=rng.randint(0, 14), minutes=rng.randint(0, 600)),
+        )
+        if status == "completed":
+            appointment.diagnosis = rng.choice(DIAGNOSES)[0]
+            appointment.vitals = f"BP {rng.randint(100, 150)}/{rng.randint(60, 95)}, Temp {rng.uniform(36.2, 38.9):.1f}C"
+        elif status == "cancelled" and rng.random() < 0.5:
+            appointment.decline_reason = rng.choice(["Doctor unavailable", "Patient request", "Rescheduled"])
+        appointment.doctor_name = doctor_name
+        return appointment
+
+    def _follow_ups(self, appointments):
+        rng = self.rng
+        prescriptions, records, referrals, notifications = [], [], [], []
+        for a in appointments:
+            if a.status != "pending":
+                notifications.append(Notification(
+                    recipient_id=a.patient_id,
+                    message=f"Your appointment with Dr. {a.doctor_name} has been {a.status}.",
+                    is_read=a.date < self.now - timedelta(days=7) and rng.random() < 0.85,
+                    created_at=min(a.date, self.now),
+                ))
+            if a.status != "completed":
+                continue
+            visit_end = a.date + timedelta(minutes=30)
+            if rng.random() < 0.6:
+                prescriptions.append(Prescription(
+                    doctor_id=a.doctor_id, patient_id=a.patient_id, appointment_id=a.id,
+                    medicines="\n".join(rng.sample(MEDICINES, rng.randint(1, 3))), notes="",
+                    is_dispensed=rng.random() < (0.95 if visit_end < self.now - timedelta(days=1) else 0.3),
+                    date=visit_end,
+                ))
+            if rng.random() < 0.8:
+                diagnosis, plan = rng.choice(DIAGNOSES)
+                records.append(MedicalRecord(
+                    doctor_id=a.doctor_id, patient_id=a.patient_id, appointment_id=a.id,
+                    diagnosis=diagnosis, treatment_plan=plan, notes=a.vitals, date=visit_end,
+                ))
+            if rng.random() < 0.02 and self.doctor_count > 1:
+                to_doctor = rng.choice(self.doctors)[0]
+                if to_doctor != a.doctor_id:
+                    referrals.append(Referral(
+                        patient_id=a.patient_id, from_doctor_id=a.doctor_id, to_doctor_id=to_doctor,
+                        reason="Specialist opinion", created_at=visit_end,
+                    ))
+        for model, rows in (
+            (Prescription, prescriptions), (MedicalRecord, records),
+            (Referral, referrals), (Notification, notifications),
+        ):
+            model.objects.bulk_create(rows)
+            self._count(model, len(rows))
+
+    def create_appointments(self):
+        inserted = 0
+        for batch in _batches((self._appointment(k) for k in range(self.appointment_count)), self.batch_size):
+            with transaction.atomic():
+                Appointment.objects.bulk_create(batch)
+                self._follow_ups(batch)
+            inserted += len(batch)
+            self.log(f"appointments: {inserted}/{self.appointment_count}")
+        self._count(Appointment, inserted)
+
+    def create_token_counters(self):
+        # Each doctor's n appointments cycle over the days, so day t got n // days (+1 for the first n % days)
+        def counters():
+            for d, (doctor_id, _, _) in enumerate(self.doctors):
+                n = self.appointment_count // self.doctor_count + (d < self.appointment_count % self.doctor_count)
+                for t in range(min(n, self.total_days)):
+                    yield DailyTokenCounter(
+                        doctor_id=doctor_id, day=self.first_day + timedelta(days=t),
+                        last_token=n // self.total_days + (t < n % self.total_days),
+                    )
+        self._insert(DailyTokenCounter, counters())
+
+    def create_lab_reports(self):
+        rng = self.rng
+        span = (self.now - timezone.make_aware(datetime.combine(self.first_day, FIRST_SLOT), self.tz)).total_seconds()
+
+        def reports():
+            for _ in range(self.lab_report_count):
+                test, unit, low, high = rng.choice(LAB_TESTS)
+                value = rng.uniform(low * 0.7, high * 1.3)
+                flag = "Within normal limits" if low <= value <= high else ("Below" if value < low else "Above") + " reference range"
+                pending = rng.random() < 0.1
+                yield LabReport(
+                    patient_id=rng.choice(self.patient_ids),
+                    doctor_id=rng.choice(self.doctors)[0] if rng.random() < 0.8 else None,
+                    test_name=test, unit=unit, reference_range=f"{low}-{high}",
+                    observed_value="" if pending else f"{value:.1f}", result="" if pending else flag,
+                    status="pending" if pending else "completed",
+                    date=self.now - timedelta(seconds=rng.uniform(0, span)),
+                )
+        self._insert(LabReport, reports())
+        self.log(f"lab reports: {self.lab_report_count}")
@@ -82,6 +82,15 @@ class LabReportSerializer(serializers.ModelSerializer):
     def get_doctor(self, obj):
         return obj.doctor.username if obj.doctor else "Unknown"
 
+
+# Lab list rows without the long free-text columns; the full report comes from the detail endpoint
+LAB_REPORT_HEAVY_FIELDS = ("result", "clinical_interpretation", "testing_method")
+
+
+class LabReportSummarySerializer(LabReportSerializer):
+    class Meta(LabReportSerializer.Meta):
+        fields = [f for f in LabReportSerializer.Meta.fields if f not in LAB_REPORT_HEAVY_FIELDS]
+
 from .models import Prescription
 class PrescriptionSerializer(serializers.ModelSerializer):
     patient_name = serializers.CharField(source="patient.username", read_only=True)
@@ -101,7 +110,7 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Appointment
-        fields = ["id", "patient", "patient_id", "doctor", "doctor_id", "doctor_fee", "date", "status", "reason", "diagnosis", "token_number", "payment_status", "vitals", "decline_reason", "consultation_type"]
+        fields = ["id", "patient", "patient_id", "doctor", "doctor_id", "doctor_fee", "date", "status", "reason", "diagnosis", "token_number", "payment_status", "vitals", "decline_reason", "consultation_type", "version"]
 
 from .models import MedicalRecord
 class MedicalRecordSerializer(serializers.ModelSerializer):
@@ -111,3 +120,36 @@ class MedicalRecordSerializer(serializers.ModelSerializer):
     class Meta:
         model = MedicalRecord
         fields = ["id", "patient", "patient_name", "doctor", "doctor_name", "appointment", "notes", "diagnosis", "treatment_plan", "date"]
+
+from .models import ScheduleTemplate, ScheduleException
+class ScheduleTemplateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ScheduleTemplate
+        fields = ["id", "weekday", "start_time", "end_time", "slot_minutes", "capacity"]
+
+    def validate(self, data):
+        if data["end_time"] <= data["start_time"]:
+            raise serializers.ValidationError("end_time must be after start_time")
+        if not 5 <= data.get("slot_minutes", 15) <= 240:
+            raise serializers.ValidationError("slot_minutes must be between 5 and 240")
+        if data.get("capacity", 1) < 1:
+            raise serializers.ValidationError("capacity must be at least 1")
+        return data
+
+class ScheduleExceptionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ScheduleException
+        fields = ["id", "day", "start_time", "end_time", "is_available", "slot_minutes", "reason"]
+
+    def validate(self, data):
+        start, end = data.get("start_time"), data.get("end_time")
+        if (start is None) != (end is None):
+            raise serializers.ValidationError("Give both start_time and end_time, or neither for the whole day")
+        if start is not None and end <= start:
+            raise serializers.ValidationError("end_time must be after start_time")
+        if data.get("is_available") and start is None:
+            raise serializers.ValidationError("Extra hours need start_time and end_time")
+        slot_minutes = data.get("slot_minutes")
+        if slot_minutes is not None and not 5 <= slot_minutes <= 240:
+            raise serializers.ValidationError("slot_minutes must be between 5 and 240")
+        return data
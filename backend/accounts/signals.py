@@ -0,0 +1,196 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import analytics, authentication, directory, events, symptoms, token_queue
+from .models import Appointment, Prescription, TokenUser, User
+from .notifications import invalidate_admin_ids
+
+
+DEMOGRAPHIC_FIELDS = {"role", "age", "gender"}
+
+# request.user is a TokenUser proxy on JWT requests, and proxy instances send
+# their own class as the signal sender, so the User receivers listen for both.
+
+
+@receiver(post_init, sender=User)
+@receiver(post_init, sender=TokenUser)
+def user_loaded(sender, instance, **kwargs):
+    # Remember which demographic bucket the row was in, to move it on save
+    instance._demographic_key = analytics.demographic_key(instance) if instance.pk else None
+    # ...and whether it was a doctor, so a doctor demoted to another role leaves the directory
+    instance._loaded_role = instance.__dict__.get("role") if instance.pk else None
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=TokenUser)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # login() saves last_login on every sign-in; only role changes affect the admin list
+    if created or update_fields is None or "role" in update_fields:
+        invalidate_admin_ids()
+
+    was_doctor = "doctor" in (instance.__dict__.get("role"), instance._loaded_role)
+    if was_doctor and (created or update_fields is None or directory.DIRECTORY_FIELDS & set(update_fields)):
+        transaction.on_commit(directory.invalidate_directory)
+    instance._loaded_role = instance.__dict__.get("role")
+    # Drop the cached token user so the next request sees the new role / active flag
+    user_id = instance.pk
+    transaction.on_commit(lambda: authentication.forget_user(user_id))
+
+    if created or update_fields is None or DEMOGRAPHIC_FIELDS & set(update_fields):
+        old_key = None if created else instance._demographic_key
+        new_key = analytics.demographic_key(instance)
+        instance._demographic_key = new_key
+        if old_key != new_key:
+            transaction.on_commit(lambda: analytics.apply_demographic_change(old_key, new_key))
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=TokenUser)
+def user_deleted(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: authentication.forget_user(user_id))
+    if instance.role == "admin":
+        invalidate_admin_ids()
+    elif instance.role == "doctor":
+        transaction.on_commit(directory.invalidate_directory)
+    old_key = instance._demographic_key
+    if old_key is not None:
+        transaction.on_commit(lambda: analytics.apply_demographic_change(old_key, None))
+
+
+def _appointment_channels(instance):
+    return [
+        events.user_channel(instance.patient_id),
+        events.user_channel(instance.doctor_id),
+        events.role_channel("staff"),
+        events.role_channel("admin"),
+    ]
+
+
+def _appointment_event(instance, created):
+    return {
+        "id": instance.id,
+        "status": instance.status,
+        "payment_status": instance.payment_status,
+        "token_number": instance.token_number,
+        "doctor_id": instance.doctor_id,
+        "patient_id": instance.patient_id,
+        "created": created,
+    }
+
+
+@receiver(post_init, sender=Appointment)
+def appointment_loaded(sender, instance, **kwargs):
+    # What the row looked like in the database: the rollup row and queue it counts
+    # towards and what the symptom index holds, so a save only moves what changed
+    loaded = instance.__dict__
+    if instance.pk:
+        instance._loaded_stats = analytics.appointment_stat(instance)
+        instance._loaded_queue = (loaded.get("doctor_id"), loaded.get("token_date"))
+        instance._loaded_symptoms = (loaded.get("reason"), loaded.get("date"))
+    else:
+        instance._loaded_stats = instance._loaded_queue = instance._loaded_symptoms = None
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, created, **kwargs):
+    channels = _appointment_channels(instance)
+    data = _appointment_event(instance, created)
+    transaction.on_commit(lambda: events.publish(channels, "appointment", data))
+
+    _apply_stats([instance], created)
+
+    queue = (instance.doctor_id, instance.token_date)
+    for doctor_id, day in {queue, instance._loaded_queue or queue}:
+        _forget_queue(doctor_id, day)
+    instance._loaded_queue = queue
+
+    reason, date = instance._loaded_symptoms or (None, None)
+    instance._loaded_symptoms = (instance.reason, instance.date)
+    if created or reason != instance.reason:
+        transaction.on_commit(lambda: symptoms.index_appointment(instance, created=created))
+    elif date != instance.date:
+        transaction.on_commit(lambda: symptoms.move_appointment(instance))
+
+
+def appointments_updated(instances):
+    """
+    What post_save would do, for appointments changed with QuerySet.update():
+    push the events, move their rollup counts and drop the affected queues.
+    """
+    published = [(_appointment_channels(a), _appointment_event(a, False)) for a in instances]
+    queues = {(a.doctor_id, a.token_date) for a in instances if a.token_date}
+
+    def after_commit():
+        for channels, data in published:
+            events.publish(channels, "appointment", data)
+        for doctor_id, day in queues:
+            token_queue.forget_queue(doctor_id, day)
+    if instances:
+        _apply_stats(instances)
+        transaction.on_commit(after_commit)
+
+
+@receiver(post_delete, sender=Appointment)
+def appointment_deleted(sender, instance, **kwargs):
+    old = instance._loaded_stats
+    if old is None:
+        _refresh_stats_day(instance.doctor_id, analytics.appointment_day(instance.date))
+    else:
+        transaction.on_commit(lambda: analytics.apply_appointment_changes([(old, None)]))
+    _forget_queue(instance.doctor_id, instance.token_date)
+
+
+def _apply_stats(instances, created=False):
+    # Move each appointment's rollup count from the row it was loaded in to its row now
+    changes = []
+    for instance in instances:
+        new = analytics.appointment_stat(instance)
+        if created:
+            changes.append((None, new))
+        elif instance._loaded_stats is None or new is None:
+            # Loaded without the fields the rollup needs; recount its day instead
+            _refresh_stats_day(instance.doctor_id, analytics.appointment_day(instance.date))
+        else:
+            changes.append((instance._loaded_stats, new))
+        instance._loaded_stats = new
+    if changes:
+        transaction.on_commit(lambda: analytics.apply_appointment_changes(changes))
+
+
+def _refresh_stats_day(doctor_id, day):
+    transaction.on_commit(lambda: analytics.refresh_appointment_day(doctor_id, day))
+
+
+def _forget_queue(doctor_id, day):
+    # Appointments booked before tokens were per day have no token_date and no queue
+    if day is not None:
+        transaction.on_commit(lambda: token_queue.forget_queue(doctor_id, day))
+
+
+@receiver(post_save, sender=Prescription)
+def prescription_saved(sender, instance, created, **kwargs):
+    data = {"id": instance.id, "is_dispensed": instance.is_dispensed, "created": created}
+    channels = [events.role_channel("staff"), events.user_channel(instance.patient_id)]
+    transaction.on_commit(lambda: events.publish(channels, "prescription", data))
+
+
+def prescriptions_dispensed(rows):
+    """
+    What post_save would publish, for scripts dispensed with QuerySet.update()
+    (`rows` are {"id", "patient_id"} dicts): one event to staff listing every id,
+    and one per script to its patient.
+    """
+    ids = [row["id"] for row in rows]
+    published = [
+        ([events.user_channel(row["patient_id"])], {"id": row["id"], "is_dispensed": True, "created": False})
+        for row in rows
+    ]
+
+    def after_commit():
+        events.publish([events.role_channel("staff")], "prescription", {"ids": ids, "is_dispensed": True, "created": False})
+        for channels, data in published:
+            events.publish(channels, "prescription", data)
+    if rows:
+        transaction.on_commit(after_commit)
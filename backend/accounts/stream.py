@@ -0,0 +1,100 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .authentication import token_user
+from .events import format_sse, get_broker, role_channel, user_channel
+
+HEARTBEAT_SECONDS = getattr(settings, "EVENTS_HEARTBEAT_SECONDS", 15)
+TICKET_SECONDS = getattr(settings, "EVENTS_TICKET_SECONDS", 30)
+TICKET_SALT = "accounts.events.ticket"
+
+# Roles that also receive the shared staff queues (appointments, prescriptions)
+QUEUE_ROLES = ("admin", "staff", "doctor")
+
+
+def _needs_asgi(request):
+    # A WSGI worker would be pinned to a stream forever, so there is none to open
+    if "wsgi.input" in request.META:
+        return {"error": "Event stream requires the ASGI server"}
+    return None
+
+
+def issue_ticket(user):
+    return signing.dumps(user.id, salt=TICKET_SALT)
+
+
+@sync_to_async
+def _authenticate(ticket):
+    """The active user a ticket was issued to, or None if it is bad or expired."""
+    try:
+        user_id = signing.loads(ticket, salt=TICKET_SALT, max_age=TICKET_SECONDS)
+    except signing.BadSignature:
+        return None
+    user = token_user(user_id)
+    return user if user is not None and user.is_active else None
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def events_ticket(request):
+    """
+    A signed ticket for opening the event stream, valid for TICKET_SECONDS. It goes
+    in the stream URL instead of the access token, which would otherwise end up in
+    access logs for the token's whole lifetime. Under WSGI it answers 501, which
+    tells clients to stop trying and poll instead.
+    """
+    error = _needs_asgi(request)
+    if error:
+        return Response(error, status=501)
+    return Response({"ticket": issue_ticket(request.user), "expires_in": TICKET_SECONDS})
+
+
+async def events_stream(request):
+    """
+    Server-Sent Events feed for the logged in user.
+
+    EventSource can't send an Authorization header, so the client first gets a
+    short-lived ticket from events_ticket and passes it as ?ticket=. Pushes
+    `notification`, `appointment` and `prescription` events; clients fetch a new
+    ticket and resync when the connection drops.
+    """
+    error = _needs_asgi(request)
+    if error:
+        return JsonResponse(error, status=501)
+
+    ticket = request.GET.get("ticket")
+    if not ticket:
+        return JsonResponse({"error": "Authentication credentials were not provided."}, status=401)
+    user = await _authenticate(ticket)
+    if user is None:
+        return JsonResponse({"error": "Invalid or expired ticket"}, status=401)
+
+    channels = [user_channel(user.id)]
+    if user.role in QUEUE_ROLES:
+        channels.append(role_channel(user.role))
+
+    async def stream():
+        subscription = get_broker().subscribe(channels)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await subscription.get(timeout=HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,114 @@
+"""
+Symptom index over Appointment.reason.
+
+Each appointment's reason is split into normalized terms stored in AppointmentSymptom,
+so symptom statistics are indexed lookups on (term, date) instead of one
+LIKE '%term%' scan of every reason per keyword. A plain table keeps it the same on
+SQLite and PostgreSQL.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Appointment, AppointmentSymptom
+
+DEFAULT_SYMPTOMS = ["fever", "cough", "pain", "headache", "fatigue", "nausea"]
+
+MAX_TERM_LENGTH = 50
+MIN_TERM_LENGTH = 3
+
+STOPWORDS = frozenset("""
+    a an and are as at be been but by for from had has have having he her him his i in into is it its
+    me my no not of on or our she since so some than that the their them then there these they this
+    to too very was we were what when which while who will with would you your
+    about after again also any because before being both can could did does doing during each few
+    feel feeling feels got get getting just more most much other over same should still such up
+    days day week weeks month months since last past bit little lot times time
+""".split())
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def normalize(word):
+    # Fold simple plurals so "headaches" and "headache" count together
+    if len(word) > 4 and word.endswith("es") and word[-3] in "sxz":
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    terms = set()
+    for word in _WORD_RE.findall((text or "").lower()):
+        if len(word) < MIN_TERM_LENGTH or word in STOPWORDS:
+            continue
+        terms.add(normalize(word)[:MAX_TERM_LENGTH])
+    return terms
+
+
+def index_appointment(appointment, created=False):
+    """Bring the appointment's symptom rows in line with its reason and date."""
+    terms = tokenize(appointment.reason)
+    if created:
+        # A new appointment has no rows yet
+        AppointmentSymptom.objects.bulk_create(
+            AppointmentSymptom(appointment_id=appointment.id, term=term, date=appointment.date) for term in terms
+        )
+        return
+    existing = dict(
+        AppointmentSymptom.objects.filter(appointment=appointment).values_list("term", "date")
+    )
+    if set(existing) == terms and all(date == appointment.date for date in existing.values()):
+        return
+    with transaction.atomic():
+        AppointmentSymptom.objects.filter(appointment=appointment).delete()
+        AppointmentSymptom.objects.bulk_create(
+            AppointmentSymptom(appointment_id=appointment.id, term=term, date=appointment.date) for term in terms
+        )
+
+
+def move_appointment(appointment):
+    """Carry a rescheduled appointment's date over to its symptom rows."""
+    AppointmentSymptom.objects.filter(appointment_id=appointment.id).update(date=appointment.date)
+
+
+def rebuild_index(batch_size=2000):
+    with transaction.atomic():
+        AppointmentSymptom.objects.all().delete()
+        rows = []
+        for pk, reason, date in Appointment.objects.values_list("id", "reason", "date").iterator(chunk_size=batch_size):
+            rows.extend(AppointmentSymptom(appointment_id=pk, term=term, date=date) for term in tokenize(reason))
+            if len(rows) >= batch_size:
+                AppointmentSymptom.objects.bulk_create(rows)
+                rows = []
+        AppointmentSymptom.objects.bulk_create(rows)
+
+
+def symptom_counts(start=None, end=None, vocabulary=None, top=None, doctor=None):
+    """
+    Number of appointments mentioning each term with start <= date < end.
+
+    `vocabulary` restricts to the given symptoms (normalized the same way as reasons);
+    `top` returns the N most frequent terms. Results are ordered by count.
+    """
+    symptoms = AppointmentSymptom.objects.all()
+    if start is not None:
+        symptoms = symptoms.filter(date__gte=start)
+    if end is not None:
+        symptoms = symptoms.filter(date__lt=end)
+    if doctor is not None:
+        symptoms = symptoms.filter(appointment__doctor=doctor)
+    if vocabulary is not None:
+        wanted = {normalize(v.strip().lower()): v.strip().lower() for v in vocabulary if v.strip()}
+        symptoms = symptoms.filter(term__in=list(wanted))
+    else:
+        wanted = None
+
+    rows = symptoms.values("term").annotate(count=Count("id")).order_by("-count", "term")
+    if top is not None:
+        rows = rows[:top]
+    if wanted is None:
+        return {r["term"]: r["count"] for r in rows}
+    return {wanted[r["term"]]: r["count"] for r in rows}
@@ -1,3 +1,1077 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.db import connection, reset_queries
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import (
+    analytics, authentication, checks, directory, dispensing, events, fast_serializers, outbox, profiling, schedule,
+    seeding, stream, symptoms, token_queue, transitions,
+)
+from .middleware import QueryProfilingMiddleware
+from .models import (
+    Appointment, AppointmentDailyStat, AppointmentSymptom, DailyTokenCounter, LabReport, MedicalRecord, Notification,
+    OutboundMessage, PatientDemographicStat, Prescription, ScheduleTemplate, StaleAppointmentError, User,
+)
+from .serializers import AppointmentSerializer, LabReportSerializer
+
+
+class TokenAllocationConcurrencyTests(TransactionTestCase):
+    BOOKINGS = 200
+    THREADS = 16
+
+    def setUp(self):
+        self.doctor = User.objects.create(username="dr_queue", role="doctor")
+        self.patients = User.objects.bulk_create(
+            User(username=f"queue_patient_{i}", role="patient") for i in range(self.BOOKINGS)
+        )
+
+    def _book(self, patient):
+        client = APIClient()
+        client.force_authenticate(patient)
+        # Same doctor and day (one token sequence), each in its own time slot
+        minutes = self.patients.index(patient)
+        try:
+            return client.post("/api/accounts/appointments/create/", {
+                "doctor_id": self.doctor.id,
+                "date": f"2026-05-04T{9 + minutes // 60:02d}:{minutes % 60:02d}:00Z",
+                "reason": "Checkup",
+            }, format="json")
+        finally:
+            connection.close()
+
+    def test_parallel_bookings_get_distinct_sequential_tokens(self):
+        # One-minute slots, so every booking gets a slot of its own
+        ScheduleTemplate.objects.create(doctor=self.doctor, weekday=0, start_time=time(9), end_time=time(13), slot_minutes=1)
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            responses = list(pool.map(self._book, self.patients))
+
+        self.assertEqual([r.status_code for r in responses], [201] * self.BOOKINGS)
+        tokens = sorted(Appointment.objects.filter(doctor=self.doctor).values_list("token_number", flat=True))
+        self.assertEqual(tokens, list(range(1, self.BOOKINGS + 1)))
+        counter = DailyTokenCounter.objects.get(doctor=self.doctor)
+        self.assertEqual(counter.last_token, self.BOOKINGS)
+
+    def test_tokens_restart_per_day_and_per_doctor(self):
+        other = User.objects.create(username="dr_other", role="doctor")
+        client = APIClient()
+        client.force_authenticate(self.patients[0])
+        url = "/api/accounts/appointments/create/"
+
+        first = client.post(url, {"doctor_id": self.doctor.id, "date": "2026-05-04T09:00:00Z"}, format="json")
+        second = client.post(url, {"doctor_id": self.doctor.id, "date": "2026-05-04T17:00:00Z"}, format="json")
+        next_day = client.post(url, {"doctor_id": self.doctor.id, "date": "2026-05-05T09:00:00Z"}, format="json")
+        other_doctor = client.post(url, {"doctor_id": other.id, "date": "2026-05-04T09:00:00Z"}, format="json")
+
+        self.assertEqual(
+            [r.data["token_number"] for r in (first, second, next_day, other_doctor)],
+            [1, 2, 1, 1],
+        )
+
+
+class DoubleBookingTests(TransactionTestCase):
+    def test_parallel_bookings_of_one_slot_admit_one_patient(self):
+        doctor = User.objects.create(username="dr_single_slot", role="doctor")
+        patients = User.objects.bulk_create(User(username=f"slot_racer_{i}", role="patient") for i in range(12))
+
+        def book(patient):
+            client = APIClient()
+            client.force_authenticate(patient)
+            try:
+                return client.post("/api/accounts/appointments/create/", {
+                    "doctor_id": doctor.id, "date": "2026-05-04T09:30:00Z",
+                }, format="json").status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            codes = sorted(pool.map(book, patients))
+        self.assertEqual(codes, [201] + [409] * 11)
+        self.assertEqual(Appointment.objects.filter(doctor=doctor).count(), 1)
+
+    def test_times_inside_one_slot_share_it(self):
+        doctor = User.objects.create(username="dr_grid", role="doctor")
+        ScheduleTemplate.objects.create(doctor=doctor, weekday=0, start_time=time(9), end_time=time(12), slot_minutes=30)
+        patients = User.objects.bulk_create(User(username=f"grid_patient_{i}", role="patient") for i in range(3))
+        client = APIClient()
+
+        def book(patient, date):
+            client.force_authenticate(patient)
+            return client.post("/api/accounts/appointments/create/", {"doctor_id": doctor.id, "date": date}, format="json")
+
+        first = book(patients[0], "2026-05-04T09:05:00Z")
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(first.data["date"], "2026-05-04T09:00:00Z")
+        self.assertEqual(book(patients[1], "2026-05-04T09:29:59Z").status_code, 409)
+        self.assertEqual(book(patients[1], "2026-05-04T09:00:01Z").status_code, 409)
+        # Outside working hours, or on a day without hours
+        self.assertEqual(book(patients[2], "2026-05-04T12:00:00Z").status_code, 400)
+        self.assertEqual(book(patients[2], "2026-05-05T09:00:00Z").status_code, 400)
+        self.assertEqual(Appointment.objects.filter(doctor=doctor).count(), 1)
+
+
+class AppointmentVersionTests(TestCase):
+    def test_stale_writes_get_409(self):
+        doctor = User.objects.create(username="dr_version", role="doctor")
+        patient = User.objects.create(username="version_patient", role="patient")
+        appointment = Appointment.objects.create(patient=patient, doctor=doctor, date="2026-05-04T09:00:00Z")
+
+        stale = Appointment.objects.get(pk=appointment.pk)
+        appointment.status = "confirmed"
+        appointment.save()
+        stale.diagnosis = "Overwrites the confirmation"
+        with self.assertRaises(StaleAppointmentError):
+            stale.save()
+
+        client = APIClient()
+        client.force_authenticate(doctor)
+        url = f"/api/accounts/appointments/{appointment.pk}/status/"
+        response = client.patch(url, {"status": "in_progress", "version": 0}, format="json")
+        self.assertEqual((response.status_code, response.json()["version"]), (409, 1))
+        response = client.patch(url, {"status": "in_progress", "version": 1}, format="json")
+        self.assertEqual((response.status_code, response.json()["version"]), (200, 2))
+
+        # Cancelling frees the slot for another booking
+        response = client.patch(url, {"status": "cancelled", "version": 2}, format="json")
+        self.assertEqual(response.status_code, 200)
+        client.force_authenticate(patient)
+        rebooked = client.post("/api/accounts/appointments/create/", {
+            "doctor_id": doctor.id, "date": "2026-05-04T09:00:00Z",
+        }, format="json")
+        self.assertEqual(rebooked.status_code, 201)
+
+
+class BookingNotificationFanOutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.doctor = User.objects.create(username="dr_fanout", role="doctor")
+        self.patient = User.objects.create(username="fanout_patient", role="patient")
+        self.client = APIClient()
+        self.client.force_authenticate(self.patient)
+
+    def _book_and_count_queries(self, date):
+        with CaptureQueriesContext(connection) as ctx:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post("/api/accounts/appointments/create/", {
+                    "doctor_id": self.doctor.id,
+                    "date": date,
+                }, format="json")
+        self.assertEqual(response.status_code, 201)
+        return len(ctx.captured_queries)
+
+    def test_booking_query_count_does_not_depend_on_admin_count(self):
+        User.objects.create(username="admin_0", role="admin")
+        self._book_and_count_queries("2026-05-04T09:00:00Z")  # warm the admin id cache
+        with_one_admin = self._book_and_count_queries("2026-05-04T10:00:00Z")
+
+        User.objects.bulk_create(User(username=f"admin_{i}", role="admin") for i in range(1, 25))
+        cache.clear()
+        self._book_and_count_queries("2026-05-04T11:00:00Z")
+        with_many_admins = self._book_and_count_queries("2026-05-04T12:00:00Z")
+
+        self.assertEqual(with_one_admin, with_many_admins)
+        self.assertEqual(Notification.objects.filter(recipient__role="admin").count(), 1 * 2 + 25 * 2)
+        self.assertEqual(Notification.objects.filter(recipient=self.doctor).count(), 4)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create(username="outbox_staff", role="staff")
+        self.doctor = User.objects.create(username="dr_outbox", role="doctor")
+        self.patient = User.objects.create(
+            username="outbox_patient", role="patient", email="patient@example.com", phone_number="5550100",
+        )
+        self.appointment = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date="2026-05-04T09:00:00Z")
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_status_update_only_enqueues(self):
+        # Transition side effects run once the status change commits
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f"/api/accounts/appointments/{self.appointment.id}/status/", {"status": "confirmed"}, format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            sorted(OutboundMessage.objects.values_list("channel", flat=True)), ["email", "sms", "whatsapp"],
+        )
+
+        self.assertEqual(outbox.process_batch(), (3, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["patient@example.com"])
+        self.assertFalse(OutboundMessage.objects.exclude(status="sent").exists())
+
+    def test_password_reset_code_is_queued_for_the_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = APIClient().post("/api/accounts/request-reset/", {"email": "patient@example.com"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        # The request only writes the row; nothing goes over SMTP in the response path
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundMessage.objects.get().status, "pending")
+
+        self.assertEqual(outbox.process_batch(), (1, 0))
+        self.assertIn("reset code", mail.outbox[0].body)
+
+    def test_failed_sends_back_off_then_give_up(self):
+        outbox.enqueue(outbox.email("patient@example.com", "Subject", "Body"))
+        with mock.patch("accounts.outbox.EmailMessage.send", side_effect=OSError("SMTP down")):
+            self.assertEqual(outbox.process_batch(), (0, 1))
+            message = OutboundMessage.objects.get()
+            self.assertEqual((message.status, message.attempts), ("pending", 1))
+            self.assertGreater(message.next_attempt_at, message.created_at)
+
+            # Not due yet, so the next round is a no-op
+            self.assertEqual(outbox.process_batch(), (0, 0))
+
+            for attempt in range(2, outbox.MAX_ATTEMPTS + 1):
+                OutboundMessage.objects.update(next_attempt_at=message.created_at)
+                outbox.process_batch()
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ("failed", outbox.MAX_ATTEMPTS))
+        self.assertIn("SMTP down", message.last_error)
+
+
+class AnalyticsRollupTests(TestCase):
+    def _snapshot(self):
+        return (
+            sorted(
+                AppointmentDailyStat.objects.filter(count__gt=0)
+                .values_list("day", "doctor_id", "status", "payment_status", "count", "revenue")
+            ),
+            sorted(PatientDemographicStat.objects.filter(count__gt=0).values_list("age_bucket", "gender", "count")),
+        )
+
+    def test_incremental_rollups_match_full_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor = User.objects.create(username="dr_stats", role="doctor", consultation_fee=80)
+            other_doctor = User.objects.create(username="dr_stats_other", role="doctor")
+            patients = [
+                User.objects.create(username=f"stats_patient_{i}", role="patient", age=age, gender=gender)
+                for i, (age, gender) in enumerate([(10, "Male"), (30, "Female"), (70, None), (None, "Other")])
+            ]
+            appointments = [
+                Appointment.objects.create(patient=p, doctor=doctor, date=f"2026-05-0{i + 1}T10:00:00Z")
+                for i, p in enumerate(patients)
+            ]
+        with self.captureOnCommitCallbacks(execute=True):
+            appointments[0].status = "completed"
+            appointments[0].payment_status = "paid"
+            appointments[0].save()
+            appointments[1].delete()
+            # Rescheduled and reassigned: the old doctor/day must lose it
+            appointments[2].date = "2026-05-20T10:00:00Z"
+            appointments[2].doctor = other_doctor
+            appointments[2].save()
+            patients[2].age = 40
+            patients[2].save()
+            patients[3].role = "staff"
+            patients[3].save(update_fields=["role"])
+            patients[0].delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            # QuerySet.update() path
+            staff = User.objects.create(username="stats_staff", role="staff")
+            changed, _ = transitions.bulk_transition([appointments[2].id, appointments[3].id], "confirmed", staff)
+            self.assertEqual(len(changed), 2)
+
+        incremental = self._snapshot()
+        analytics.rebuild_all()
+        self.assertEqual(incremental, self._snapshot())
+        self.assertEqual(analytics.total_patients(), 2)
+
+
+class PaymentRevenueTests(TestCase):
+    def test_revenue_uses_fee_captured_at_payment(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor = User.objects.create(username="dr_fee", role="doctor", consultation_fee=50)
+            patient = User.objects.create(username="fee_patient", role="patient")
+            appointment = Appointment.objects.create(patient=patient, doctor=doctor, date="2026-05-04T10:00:00Z")
+
+        intent = mock.Mock(status="succeeded", amount=5000, metadata={"appointment_id": str(appointment.id)})
+        client = APIClient()
+        client.force_authenticate(patient)
+        with mock.patch("stripe.PaymentIntent.retrieve", return_value=intent), self.captureOnCommitCallbacks(execute=True):
+            response = client.post(f"/api/accounts/appointments/{appointment.id}/pay/", {"payment_intent_id": "pi_1"}, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.fee_paid, 50)
+
+        # A later fee change must not rewrite past revenue
+        doctor.consultation_fee = 120
+        doctor.save()
+        analytics.rebuild_appointment_stats()
+        self.assertEqual(analytics.revenue_total(appointment.date.date(), doctor=doctor), 50)
+
+
+class SymptomIndexTests(TestCase):
+    def test_counts_follow_reason_edits_and_window(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor = User.objects.create(username="dr_sym", role="doctor")
+            patient = User.objects.create(username="sym_patient", role="patient")
+            reasons = ["Fever and dry cough", "Headaches since Monday, mild fever", "Rash on arm"]
+            appointments = [
+                Appointment.objects.create(patient=patient, doctor=doctor, date=f"2026-06-0{i + 1}T10:00:00Z", reason=r)
+                for i, r in enumerate(reasons)
+            ]
+        with self.captureOnCommitCallbacks(execute=True):
+            appointments[2].reason = "Rash and fever"
+            appointments[2].save()
+
+        counts = symptoms.symptom_counts(vocabulary=["fever", "headache", "Rash", "nausea"])
+        self.assertEqual(counts, {"fever": 3, "headache": 1, "rash": 1})
+        self.assertEqual(list(symptoms.symptom_counts(top=1)), ["fever"])
+
+        since_june_2 = analytics.day_start(analytics.appointment_day("2026-06-02T10:00:00Z"))
+        self.assertEqual(symptoms.symptom_counts(since_june_2, vocabulary=["fever", "cough"]), {"fever": 2})
+
+        indexed = sorted(AppointmentSymptom.objects.values_list("appointment_id", "term"))
+        symptoms.rebuild_index()
+        self.assertEqual(indexed, sorted(AppointmentSymptom.objects.values_list("appointment_id", "term")))
+
+
+class NotificationFeedTests(TestCase):
+    def test_since_id_pages_forward_and_read_counts(self):
+        user, other = User.objects.bulk_create(User(username=f"feed_{i}", role="patient") for i in range(2))
+        ids = [n.id for n in Notification.objects.bulk_create(Notification(recipient=user, message=f"n{i}") for i in range(120))]
+        Notification.objects.create(recipient=other, message="not yours")
+        client = APIClient()
+        client.force_authenticate(user)
+        url = "/api/accounts/notifications/"
+
+        self.assertEqual([n["id"] for n in client.get(url).json()], ids[::-1])
+        self.assertEqual([n["id"] for n in client.get(url, {"limit": 10}).json()], ids[:-11:-1])
+
+        # More arrived than one page holds: paging from the last id seen misses none
+        seen, since_id = [], ids[9]
+        while True:
+            page = client.get(url, {"since_id": since_id, "limit": 50}).json()
+            seen += [n["id"] for n in page]
+            if len(page) < 50:
+                break
+            since_id = page[-1]["id"]
+        self.assertEqual(seen, ids[10:])
+        self.assertEqual(client.get(url, {"since_id": "x"}).status_code, 400)
+
+        unread_url = "/api/accounts/notifications/unread-count/"
+        self.assertEqual(client.get(unread_url).json(), {"unread": 120})
+        client.put(f"{url}{ids[0]}/read/")
+        self.assertEqual(client.get(unread_url).json(), {"unread": 119})
+        self.assertEqual(client.put(f"{url}read-all/").json()["updated"], 119)
+        self.assertEqual(client.get(unread_url).json(), {"unread": 0})
+        self.assertFalse(Notification.objects.get(recipient=other).is_read)
+
+
+class AppointmentListTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username="list_admin", role="admin")
+        self.patient = User.objects.create(username="list_patient", role="patient")
+        self.doctors = User.objects.bulk_create(User(username=f"list_dr_{i}", role="doctor") for i in range(3))
+        self.start = timezone.make_aware(datetime(2026, 3, 2, 9, 0))
+        rows = []
+        for day in range(4):
+            for doctor in self.doctors:
+                # Three appointments share each start time, so the id breaks the tie
+                rows.append(Appointment(
+                    patient=self.patient, doctor=doctor, date=self.start + timedelta(days=day),
+                    status="completed" if day < 2 else "pending",
+                    consultation_type="online" if doctor == self.doctors[0] else "normal",
+                ))
+        Appointment.objects.bulk_create(rows)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _ids(self, params):
+        response = self.client.get("/api/accounts/appointments/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [a["id"] for a in response.json()]
+
+    def _pages(self, params, limit):
+        ids, cursor = [], None
+        while True:
+            page = self.client.get("/api/accounts/appointments/", {**params, "limit": limit, **({"cursor": cursor} if cursor else {})})
+            self.assertEqual(page.status_code, 200, page.content)
+            body = page.json()
+            self.assertLessEqual(len(body["results"]), limit)
+            ids += [a["id"] for a in body["results"]]
+            cursor = body["next"]
+            if not cursor:
+                return ids
+
+    def test_cursor_pages_cover_every_row_once_newest_first(self):
+        expected = list(Appointment.objects.order_by("-date", "-id").values_list("id", flat=True))
+        self.assertEqual(self._ids({}), expected)
+        for limit in (1, 2, 5, 12, 50):
+            with self.subTest(limit=limit):
+                self.assertEqual(self._pages({}, limit), expected)
+
+    def test_filters_apply_before_paging(self):
+        doctor = self.doctors[1]
+        cases = {
+            "status": ({"status": "pending"}, Appointment.objects.filter(status="pending")),
+            "type": ({"consultation_type": "online"}, Appointment.objects.filter(consultation_type="online")),
+            "doctor": ({"doctor": doctor.id}, Appointment.objects.filter(doctor=doctor)),
+            "date range": (
+                {"date_from": "2026-03-03", "date_to": "2026-03-04"},
+                Appointment.objects.filter(date__range=(self.start + timedelta(days=1), self.start + timedelta(days=2))),
+            ),
+        }
+        for name, (params, queryset) in cases.items():
+            with self.subTest(name):
+                expected = list(queryset.order_by("-date", "-id").values_list("id", flat=True))
+                self.assertTrue(expected)
+                self.assertEqual(self._ids(params), expected)
+                self.assertEqual(self._pages(params, 2), expected)
+
+    def test_bad_cursor_and_filters_are_rejected(self):
+        for params in (
+            {"cursor": "not-a-cursor"},
+            {"cursor": "bm90LWEtZGF0ZXwx"},  # "not-a-date|1"
+            {"limit": "ten"},
+            {"limit": 0},
+            {"doctor": "abc"},
+            {"date_from": "yesterday"},
+        ):
+            with self.subTest(**params):
+                response = self.client.get("/api/accounts/appointments/", params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", response.json())
+
+
+class ConditionalListTests(TestCase):
+    def setUp(self):
+        self.doctor = User.objects.create(username="etag_dr", role="doctor")
+        self.staff = User.objects.create(username="etag_staff", role="staff")
+        self.patient = User.objects.create(username="etag_patient", role="patient")
+        self.appointments = [
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=f"2026-09-01T09:{i * 10:02d}:00Z")
+            for i in range(2)
+        ]
+        self.client = APIClient()
+
+    def _get(self, path, user, etag=None, **params):
+        self.client.force_authenticate(user)
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(f"/api/accounts/{path}", params, **headers)
+
+    def assertChanged(self, path, user, etag):
+        response = self._get(path, user, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        return response["ETag"]
+
+    def test_unchanged_list_is_answered_with_304(self):
+        first = self._get("appointments/", self.patient)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first["Cache-Control"], "private, no-cache")
+        etag = first["ETag"]
+
+        with self.assertNumQueries(1):
+            again = self._get("appointments/", self.patient, etag)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again["ETag"], etag)
+        self.assertEqual(again.content, b"")
+        # The ETag covers the user and the query string
+        self.assertEqual(self._get("appointments/", self.patient, etag, status="pending").status_code, 200)
+        self.assertEqual(self._get("appointments/", self.doctor, etag).status_code, 200)
+
+    def test_etag_moves_with_saves_and_queryset_updates(self):
+        etag = self._get("appointments/", self.patient)["ETag"]
+        appointment = self.appointments[0]
+        appointment.status = "confirmed"
+        appointment.save()
+        etag = self.assertChanged("appointments/", self.patient, etag)
+
+        # bulk_transition writes with QuerySet.update()
+        self.client.force_authenticate(self.staff)
+        response = self.client.post(
+            "/api/accounts/appointments/bulk-status/", {"ids": [self.appointments[1].id], "status": "confirmed"}, format="json",
+        )
+        self.assertEqual(len(response.json()["updated"]), 1)
+        self.assertChanged("appointments/", self.patient, etag)
+
+        Notification.objects.create(recipient=self.patient, message="hello")
+        etag = self._get("notifications/", self.patient)["ETag"]
+        self.client.put("/api/accounts/notifications/read-all/")
+        self.assertChanged("notifications/", self.patient, etag)
+
+        script = Prescription.objects.create(doctor=self.doctor, patient=self.patient, medicines="Paracetamol")
+        etag = self._get("prescriptions/", self.staff)["ETag"]
+        dispensing.dispense([script.id])
+        self.assertChanged("prescriptions/", self.staff, etag)
+
+
+class LabReportListTests(TestCase):
+    def test_paginated_summary_and_detail(self):
+        staff = User.objects.create(username="lab_staff", role="staff")
+        patient, other = User.objects.bulk_create([
+            User(username="lab_patient", role="patient"), User(username="lab_other", role="patient"),
+        ])
+        for i in range(3):
+            LabReport.objects.create(patient=patient, test_name=f"CBC {i}", result="long text " * 50)
+        other_report = LabReport.objects.create(patient=other, test_name="Lipid panel", result="...")
+
+        client = APIClient()
+        client.force_authenticate(staff)
+        first = client.get("/api/accounts/lab-reports/", {"patient": patient.id, "limit": 2}).json()
+        self.assertEqual(len(first["results"]), 2)
+        self.assertNotIn("result", first["results"][0])
+        rest = client.get("/api/accounts/lab-reports/", {"patient": patient.id, "limit": 2, "cursor": first["next"]}).json()
+        self.assertEqual([r["test_name"] for r in first["results"] + rest["results"]], ["CBC 2", "CBC 1", "CBC 0"])
+        self.assertIsNone(rest["next"])
+
+        detail = client.get(f"/api/accounts/lab-reports/{first['results'][0]['id']}/").json()
+        self.assertEqual(detail["result"], "long text " * 50)
+
+        client.force_authenticate(patient)
+        self.assertEqual(client.get(f"/api/accounts/lab-reports/{other_report.id}/").status_code, 404)
+
+
+class LabImportTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create(username="import_staff", role="staff")
+        self.patients = User.objects.bulk_create([
+            User(username=f"import_patient_{i}", role="patient", email=f"p{i}@example.com") for i in range(2)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def _csv(self, rows):
+        lines = ["patient_id,test_name,observed_value,unit"]
+        lines += [f"{patient_id},{test},{i},mg/dL" for i, (patient_id, test) in enumerate(rows)]
+        return "\n".join(lines)
+
+    def test_csv_import_is_bulk_and_notifies_once_per_patient(self):
+        rows = [(self.patients[i % 2].id, f"Test {i % 5}") for i in range(1000)]
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/accounts/lab-reports/import/", self._csv(rows), content_type="text/csv")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json(), {"created": 1000, "patients": 2})
+        self.assertEqual(LabReport.objects.count(), 1000)
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(OutboundMessage.objects.count(), 2)
+        # SQLite caps rows per INSERT by its variable limit; everything else is a fixed handful of queries
+        inserts = [q for q in queries.captured_queries if q["sql"].startswith('INSERT INTO "accounts_labreport"')]
+        self.assertLess(len(inserts), 20)
+        self.assertLess(len(queries) - len(inserts), 10)
+
+    def test_one_bad_row_rejects_the_whole_batch(self):
+        body = "\n".join([
+            f'{{"patient_id": {self.patients[0].id}, "test_name": "CBC"}}',
+            '{"patient_id": 999999, "test_name": "CBC"}',
+        ])
+        response = self.client.post("/api/accounts/lab-reports/import/", body, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["rows"], [{"row": 2, "error": "Unknown patient"}])
+        self.assertFalse(LabReport.objects.exists())
+
+
+class ExportTests(TestCase):
+    def test_streams_csv_and_ndjson(self):
+        admin = User.objects.create(username="export_admin", role="admin")
+        doctor = User.objects.create(username="dr_export", role="doctor")
+        patient = User.objects.create(username="export_patient", role="patient")
+        for day in (1, 2, 3):
+            Appointment.objects.create(patient=patient, doctor=doctor, date=f"2026-07-0{day}T09:00:00Z", reason="a, \"quoted\" reason")
+
+        client = APIClient()
+        client.force_authenticate(admin)
+        response = client.get("/api/accounts/exports/appointments.csv", {"date_from": "2026-07-02"})
+        self.assertTrue(response.streaming)
+        lines = list(csv.reader(b"".join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(lines[0][:3], ["id", "date", "status"])
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(lines[1][lines[0].index("reason")], 'a, "quoted" reason')
+
+        response = client.get("/api/accounts/exports/appointments.ndjson")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([r["patient"] for r in rows], ["export_patient"] * 3)
+
+        client.force_authenticate(doctor)
+        self.assertEqual(client.get("/api/accounts/exports/appointments.csv").status_code, 403)
+
+        Appointment.objects.create(
+            patient=patient, doctor=doctor, date="2026-07-04T09:00:00Z", reason='=HYPERLINK("http://x","y")',
+            diagnosis="-2+3", vitals="@SUM(A1)",
+        )
+        client.force_authenticate(admin)
+        response = client.get("/api/accounts/exports/appointments.csv", {"date_from": "2026-07-04"})
+        header, row = csv.reader(b"".join(response.streaming_content).decode().splitlines())
+        cells = dict(zip(header, row))
+        self.assertEqual(cells["reason"], "'=HYPERLINK(\"http://x\",\"y\")")
+        self.assertEqual((cells["diagnosis"], cells["vitals"]), ("'-2+3", "'@SUM(A1)"))
+        # NDJSON isn't opened by spreadsheets and keeps the value as written
+        response = client.get("/api/accounts/exports/appointments.ndjson", {"date_from": "2026-07-04"})
+        self.assertEqual(json.loads(b"".join(response.streaming_content))["diagnosis"], "-2+3")
+
+
+class ValuesSerializerTests(TestCase):
+    def test_matches_drf_serializers(self):
+        doctor = User.objects.create(username="dr_values", role="doctor", consultation_fee="75.5")
+        patient = User.objects.create(username="values_patient", role="patient")
+        Appointment.objects.create(patient=patient, doctor=doctor, date="2026-08-01T09:30:00Z", token_number=3, vitals="BP 120/80")
+        Appointment.objects.create(patient=patient, doctor=doctor, date="2026-08-02T09:30:00Z", reason=None)
+        LabReport.objects.create(patient=patient, doctor=doctor, test_name="CBC", result="ok", file_url="lab_reports/cbc.pdf")
+        LabReport.objects.create(patient=patient, test_name="Lipids", result="high", observed_value=None)
+
+        appointments = Appointment.objects.select_related("patient", "doctor").order_by("-date", "-id")
+        self.assertEqual(fast_serializers.APPOINTMENT_LIST.data(appointments), AppointmentSerializer(appointments, many=True).data)
+        reports = LabReport.objects.select_related("patient", "doctor").order_by("-date", "-id")
+        self.assertEqual(fast_serializers.LAB_REPORT_LIST.data(reports), LabReportSerializer(reports, many=True).data)
+
+
+class DoctorDirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_and_invalidated_by_doctor_changes(self):
+        cardio = User.objects.create(username="dr_heart", role="doctor", specialization="Cardiology")
+        User.objects.create(username="dr_gp", role="doctor")
+        patient = User.objects.create(username="dir_patient", role="patient")
+        client = APIClient()
+        client.force_authenticate(patient)
+
+        self.assertEqual(len(client.get("/api/accounts/doctors/").json()), 2)
+        with self.assertNumQueries(0):
+            doctors = directory.find_doctors(specialization="cardiology")
+        self.assertEqual([d["username"] for d in doctors], ["dr_heart"])
+
+        client.force_authenticate(cardio)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post("/api/accounts/doctor/toggle-availability/")
+        client.force_authenticate(patient)
+        available = client.get("/api/accounts/doctors/", {"available": "true"}).json()
+        self.assertEqual([d["username"] for d in available], ["dr_gp"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cardio.role = "staff"
+            cardio.save()
+        self.assertEqual([d["username"] for d in directory.find_doctors()], ["dr_gp"])
+
+
+class ScheduleSlotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_free_slots_skip_bookings_and_time_off(self):
+        doctor = User.objects.create(username="dr_slots", role="doctor", specialization="Dermatology")
+        User.objects.create(username="dr_other", role="doctor", specialization="Cardiology")
+        patient = User.objects.create(username="slot_patient", role="patient")
+        monday = timezone.localdate() + timedelta(days=7 - timezone.localdate().weekday())
+
+        client = APIClient()
+        client.force_authenticate(doctor)
+        response = client.put("/api/accounts/doctor/schedule/", {"templates": [
+            {"weekday": 0, "start_time": "09:00", "end_time": "10:00", "slot_minutes": 15},
+        ]}, format="json")
+        self.assertEqual(response.status_code, 200, response.content)
+        client.post("/api/accounts/doctor/schedule/exceptions/", {
+            "day": monday.isoformat(), "start_time": "09:30", "end_time": "09:45",
+        }, format="json")
+        Appointment.objects.create(patient=patient, doctor=doctor, date=datetime.combine(monday, time(9, 15), tzinfo=dt_timezone.utc))
+
+        doctors = directory.find_doctors()
+        with self.assertNumQueries(3):
+            slots = schedule.find_free_slots(doctors, monday, monday, limit=10)
+        self.assertEqual([s["start"].time() for s in slots], [time(9, 0), time(9, 45)])
+
+        client.force_authenticate(patient)
+        response = client.get("/api/accounts/schedule/slots/", {
+            "specialization": "dermatology", "date_from": monday.isoformat(), "limit": 1,
+        })
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(response.json()[0]["doctor"], "dr_slots")
+        for bad in ({"date_from": "2026-02-30"}, {"date_to": "2026-02-30"}, {"date_from": "soon"}):
+            self.assertEqual(client.get("/api/accounts/schedule/slots/", bad).status_code, 400, bad)
+
+
+class AppointmentTransitionTests(TestCase):
+    def setUp(self):
+        self.doctor = User.objects.create(username="dr_session", role="doctor")
+        self.staff = User.objects.create(username="session_staff", role="staff")
+        self.patients = User.objects.bulk_create(
+            User(username=f"session_patient_{i}", role="patient", email=f"s{i}@example.com") for i in range(5)
+        )
+        self.appointments = [
+            Appointment.objects.create(patient=p, doctor=self.doctor, date=f"2026-09-01T09:{i * 10:02d}:00Z")
+            for i, p in enumerate(self.patients)
+        ]
+        self.client = APIClient()
+
+    def test_guards(self):
+        self.client.force_authenticate(self.patients[0])
+        url = f"/api/accounts/appointments/{self.appointments[1].id}/cancel/"
+        self.assertEqual(self.client.post(url).status_code, 403)
+
+        self.client.force_authenticate(self.staff)
+        url = f"/api/accounts/appointments/{self.appointments[0].id}/status/"
+        self.assertEqual(self.client.patch(url, {"status": "completed"}, format="json").status_code, 409)
+        self.assertEqual(self.client.patch(url, {"status": "bogus"}, format="json").status_code, 400)
+
+    def test_bulk_transition_batches_side_effects(self):
+        self.appointments[4].status = "completed"
+        self.appointments[4].save()
+        ids = [a.id for a in self.appointments] + [999999]
+
+        self.client.force_authenticate(self.staff)
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/accounts/appointments/bulk-status/", {"ids": ids, "status": "confirmed"}, format="json")
+        body = response.json()
+        self.assertEqual(sorted(row["id"] for row in body["updated"]), ids[:4])
+        self.assertEqual({row["id"] for row in body["rejected"]}, {ids[4], 999999})
+        self.assertEqual(Appointment.objects.filter(status="confirmed").count(), 4)
+        # Patient + doctor check-in notification per appointment, one email each
+        self.assertEqual(Notification.objects.count(), 8)
+        self.assertEqual(OutboundMessage.objects.count(), 4)
+        notification_inserts = [q for q in queries.captured_queries if q["sql"].startswith('INSERT INTO "accounts_notification"')]
+        self.assertEqual(len(notification_inserts), 1)
+
+
+class DoctorQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_queue_follows_bookings_and_status_changes(self):
+        doctor = User.objects.create(username="dr_queue", role="doctor")
+        staff = User.objects.create(username="queue_staff", role="staff")
+        patients = User.objects.bulk_create(User(username=f"queue_patient_{i}", role="patient") for i in range(2))
+        day = timezone.localdate()
+        start = timezone.make_aware(datetime.combine(day, time(23, 0)))
+        client = APIClient()
+
+        for i, patient in enumerate(patients):
+            client.force_authenticate(patient)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.post("/api/accounts/appointments/create/", {
+                    "doctor_id": doctor.id, "date": (start + timedelta(minutes=15 * i)).isoformat(),
+                }, format="json")
+            self.assertEqual(response.status_code, 201, response.content)
+        first = Appointment.objects.get(patient=patients[0])
+
+        client.force_authenticate(doctor)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.patch(f"/api/accounts/appointments/{first.id}/status/", {
+                "status": "in_progress", "vitals": "BP 120/80",
+            }, format="json")
+
+        client.force_authenticate(staff)
+        # The write dropped the cached queue; one read rebuilds it, later ones are free
+        with self.assertNumQueries(1):
+            token_queue.get_queue(doctor.id, day)
+        with self.assertNumQueries(0):
+            entries = token_queue.get_queue(doctor.id, day)
+        self.assertEqual([e["token_number"] for e in entries], [1, 2])
+        self.assertEqual([(e["status"], e["has_vitals"]) for e in entries], [("in_progress", True), ("pending", False)])
+
+        response = client.get("/api/accounts/doctor/queue/", {"doctor_id": doctor.id})
+        self.assertEqual([e["patient"] for e in response.json()["queue"]], ["queue_patient_0", "queue_patient_1"])
+        self.assertEqual(client.get("/api/accounts/doctor/queue/").status_code, 400)
+        self.assertEqual(client.get("/api/accounts/doctor/queue/", {"doctor_id": doctor.id, "date": "2026-02-30"}).status_code, 400)
+
+    def test_reassigned_appointment_leaves_the_old_queue(self):
+        doctors = User.objects.bulk_create(User(username=f"dr_move_{i}", role="doctor") for i in range(2))
+        patient = User.objects.create(username="move_patient", role="patient")
+        day = timezone.localdate()
+        appointment = Appointment.objects.create(
+            patient=patient, doctor=doctors[0], date=timezone.now(), token_date=day, token_number=1,
+        )
+        self.assertEqual(len(token_queue.get_queue(doctors[0].id, day)), 1)
+
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        appointment.doctor = doctors[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+        self.assertEqual(token_queue.get_queue(doctors[0].id, day), [])
+        self.assertEqual(len(token_queue.get_queue(doctors[1].id, day)), 1)
+        # Other workers can't see that drop in a per-process cache, so their copies expire quickly
+        self.assertEqual(token_queue.queue_timeout(), token_queue.LOCAL_QUEUE_TIMEOUT)
+
+
+class TokenClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_token_user_is_cached_until_the_user_changes(self):
+        doctor = User.objects.create_user(username="dr_claims", password="pw-12345", role="doctor", medical_history="none")
+        admin = User.objects.create(username="claims_admin", role="admin")
+        client = APIClient()
+        tokens = client.post("/api/accounts/login/", {"username": "dr_claims", "password": "pw-12345"}, format="json").json()
+        # Authorization reads the user row, so the token carries nothing to go stale
+        self.assertNotIn("role", AccessToken(tokens["access"]))
+
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(client.get("/api/accounts/doctor/queue/").status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get("/api/accounts/doctor/queue/").status_code, 200)
+        # Views that need more of the user load the rest of the row on demand
+        self.assertEqual(client.get("/api/accounts/profile/").json()["medical_history"], "none")
+
+        admin_client = APIClient()
+        admin_client.force_authenticate(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            admin_client.put(f"/api/accounts/users/{doctor.id}/update/", {"role": "patient"}, format="json")
+        self.assertEqual(client.get("/api/accounts/doctor/queue/").status_code, 403)
+
+        doctor.refresh_from_db()
+        doctor.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor.save()
+        self.assertEqual(client.get("/api/accounts/profile/").status_code, 401)
+
+
+class QueryProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        profiling.reset_switch()
+        self.addCleanup(profiling.reset_switch)
+        self.admin = User.objects.create(username="profiling_admin", role="admin")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_fingerprint_collapses_literals_and_in_lists(self):
+        self.assertEqual(
+            profiling.fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND k = 'a' LIMIT 21"),
+            profiling.fingerprint("SELECT * FROM t WHERE id IN (%s, %s) AND k = 'b' LIMIT 5"),
+        )
+
+    def test_unhandled_exceptions_stay_out_of_the_profiling_log(self):
+        request = RequestFactory().get("/api/accounts/boom/")
+        with self.assertNoLogs("accounts.profiling"), self.assertLogs("accounts.errors", "ERROR") as logs:
+            QueryProfilingMiddleware(lambda r: None).process_exception(request, ZeroDivisionError())
+        self.assertIn("ZeroDivisionError on GET /api/accounts/boom/", logs.output[0])
+
+    @override_settings(QUERY_BUDGET_COUNT=0)
+    def test_over_budget_requests_are_logged_while_switched_on(self):
+        with self.assertNoLogs("accounts.profiling"):
+            self.client.get("/api/accounts/notifications/")
+
+        response = self.client.post("/api/accounts/admin/profiling/", {"enabled": True}, format="json")
+        self.assertTrue(response.json()["enabled"])
+        with self.assertLogs("accounts.profiling", "WARNING") as logs:
+            response = self.client.get("/api/accounts/notifications/")
+        self.assertIn("Server-Timing", response)
+        report = json.loads(logs.records[0].getMessage())
+        self.assertEqual(report["path"], "/api/accounts/notifications/")
+        self.assertIn("queries", report["over"])
+        self.assertGreater(report["queries"], 0)
+
+
+class EventStreamTests(TestCase):
+    def test_broker_delivers_to_subscribed_channels_only(self):
+        async def scenario():
+            broker = events.InProcessBroker()
+            subscription = broker.subscribe([events.user_channel(1), events.role_channel("staff")])
+            self.assertEqual(broker.publish([events.user_channel(2)], "notification", {"id": 1}), 0)
+            self.assertEqual(broker.publish([events.user_channel(1), events.role_channel("staff")], "notification", {"id": 2}), 1)
+            event = await subscription.get(timeout=1)
+            subscription.close()
+            self.assertEqual(broker.publish([events.user_channel(1)], "notification", {"id": 3}), 0)
+            return event
+        event = asyncio.run(scenario())
+        self.assertEqual((event["type"], event["data"]), ("notification", {"id": 2}))
+
+    async def test_stream_needs_a_valid_ticket_and_pushes_events(self):
+        user = await User.objects.acreate(username="stream_user", role="patient")
+        client = AsyncClient()
+        self.assertEqual((await client.get("/api/accounts/events/", {"token": "x"})).status_code, 401)
+        self.assertEqual((await client.get("/api/accounts/events/", {"ticket": "forged"})).status_code, 401)
+
+        response = await client.get("/api/accounts/events/", {"ticket": stream.issue_ticket(user)})
+        self.assertEqual(response.status_code, 200)
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b"retry: 5000\n\n")
+        events.publish([events.user_channel(user.id)], "notification", {"id": 7})
+        self.assertIn(b'data: {"id": 7}', await asyncio.wait_for(anext(chunks), 1))
+        await chunks.aclose()
+
+    def test_in_process_broker_with_several_workers_is_flagged(self):
+        with override_settings(WEB_CONCURRENCY=1):
+            self.assertEqual(checks.events_broker(None), [])
+        with override_settings(WEB_CONCURRENCY=4):
+            self.assertEqual([m.id for m in checks.events_broker(None)], ["accounts.W002"])
+
+    async def test_ticket_endpoint_and_expiry(self):
+        user = await User.objects.acreate(username="ticket_user", role="staff")
+        client = AsyncClient()
+        self.assertEqual((await client.post("/api/accounts/events/ticket/")).status_code, 401)
+        response = await client.post("/api/accounts/events/ticket/", headers={"Authorization": f"Bearer {AccessToken.for_user(user)}"})
+        ticket = response.json()["ticket"]
+        self.assertEqual(await stream._authenticate(ticket), user)
+        with mock.patch.object(stream, "TICKET_SECONDS", -1):
+            self.assertIsNone(await stream._authenticate(ticket))
+
+    def test_wsgi_server_hands_out_no_tickets(self):
+        # Clients take the 501 as "poll instead" rather than retrying the stream forever
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username="wsgi_user", role="staff"))
+        self.assertEqual(client.post("/api/accounts/events/ticket/").status_code, 501)
+        self.assertEqual(client.get("/api/accounts/events/", {"ticket": "x"}).status_code, 501)
+
+
+class DispensingQueueTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create(username="pharmacist", role="staff")
+        self.doctor = User.objects.create(username="dr_scripts", role="doctor")
+        self.patient = User.objects.create(username="script_patient", role="patient")
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def _script(self):
+        return Prescription.objects.create(doctor=self.doctor, patient=self.patient, medicines="Paracetamol")
+
+    def test_delta_since_cursor_and_batch_dispense(self):
+        scripts = [self._script() for _ in range(3)]
+        first = self.client.get("/api/accounts/prescriptions/queue/").json()
+        self.assertEqual([s["id"] for s in first["results"]], [s.id for s in scripts])
+
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                "/api/accounts/prescriptions/dispense/", {"ids": [scripts[0].id, scripts[1].id, 999999]}, format="json",
+            )
+        self.assertEqual(response.json(), {"dispensed": [scripts[0].id, scripts[1].id], "skipped": [999999]})
+        self.assertEqual(sum(q["sql"].startswith("UPDATE") for q in queries.captured_queries), 1)
+        self.assertEqual(len(callbacks), 1)
+
+        added = self._script()
+        # Dated long before the cursor, as when its transaction commits late or on a slow clock
+        Prescription.objects.filter(pk=added.pk).update(date=timezone.now() - timedelta(hours=1))
+        delta = self.client.get("/api/accounts/prescriptions/queue/", {"cursor": first["cursor"]}).json()
+        self.assertEqual([s["id"] for s in delta["results"]], [added.id])
+        again = self.client.get("/api/accounts/prescriptions/queue/", {"cursor": delta["cursor"]}).json()
+        self.assertEqual(again["results"], [])
+        self.assertEqual(delta["dispensed"], [scripts[0].id, scripts[1].id])
+
+        self.client.post(f"/api/accounts/prescriptions/{scripts[2].id}/dispense/")
+        self.assertIsNotNone(Prescription.objects.get(pk=scripts[2].id).dispensed_at)
+        self.assertEqual(self.client.get("/api/accounts/prescriptions/queue/", {"cursor": "nope"}).status_code, 400)
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Query counts per endpoint, pinned at 1, 10 and 1000 rows per table. A count that
+    moves with the row count is an N+1 (usually a serializer field reading a relation
+    the view didn't select_related); a count over its budget is a new query per request.
+    """
+    SCALES = (1, 10, 1000)
+    # (method, path, role): max queries. Paths are formatted with the ids from _ids().
+    BUDGETS = {
+        ("GET", "profile/", "patient"): 1,
+        ("GET", "appointments/", "patient"): 3,
+        ("GET", "appointments/", "doctor"): 3,
+        ("GET", "appointments/", "admin"): 3,
+        ("GET", "appointments/?limit=50", "admin"): 3,
+        ("GET", "doctors/", "patient"): 2,
+        ("GET", "users/", "admin"): 2,
+        ("GET", "users/{patient}/", "admin"): 2,
+        ("GET", "notifications/", "patient"): 3,
+        ("GET", "notifications/unread-count/", "patient"): 2,
+        ("PUT", "notifications/read-all/", "patient"): 2,
+        ("GET", "lab-reports/", "patient"): 3,
+        ("GET", "lab-reports/?limit=50", "admin"): 3,
+        ("GET", "lab-reports/{lab_report}/", "patient"): 2,
+        ("GET", "doctor/schedule/", "doctor"): 3,
+        ("GET", "schedule/slots/?doctor_id={doctor}", "patient"): 5,
+        ("GET", "doctor/queue/", "doctor"): 2,
+        ("GET", "prescriptions/", "patient"): 3,
+        ("GET", "prescriptions/", "doctor"): 3,
+        ("GET", "prescriptions/", "staff"): 3,
+        ("GET", "prescriptions/queue/", "staff"): 2,
+        ("GET", "medical-records/{patient}/", "patient"): 3,
+        ("GET", "medical-records/{patient}/", "doctor"): 3,
+        ("GET", "analytics/admin/", "admin"): 5,
+        ("GET", "analytics/doctor/", "doctor"): 4,
+        ("GET", "ai-insights/", "doctor"): 7,
+        ("GET", "exports/appointments.csv", "admin"): 2,
+        ("GET", "stripe-config/", "patient"): 1,
+        ("GET", "admin/profiling/", "admin"): 1,
+    }
+
+    def setUp(self):
+        self.users = {
+            role: User.objects.create(username=f"budget_{role}", role=role, email=f"{role}@budget.test")
+            for role in ("admin", "staff", "doctor", "patient")
+        }
+        self.rows = 0
+
+    def _grow(self, total):
+        """Top every listed table up to `total` rows for the patient and doctor."""
+        doctor, patient = self.users["doctor"], self.users["patient"]
+        start = timezone.now() - timedelta(days=30)
+        new = range(self.rows, total)
+        appointments = Appointment.objects.bulk_create(
+            Appointment(
+                patient=patient, doctor=doctor, date=start + timedelta(minutes=15 * k), reason=f"fever {k}",
+                status="completed" if k % 2 else "pending",
+            ) for k in new
+        )
+        User.objects.bulk_create(User(username=f"budget_patient_{k}", role="patient") for k in new)
+        Notification.objects.bulk_create(Notification(recipient=patient, message=f"Note {k}") for k in new)
+        LabReport.objects.bulk_create(LabReport(patient=patient, doctor=doctor, test_name=f"Test {k}") for k in new)
+        Prescription.objects.bulk_create(
+            Prescription(doctor=doctor, patient=patient, appointment=a, medicines="Paracetamol") for a in appointments
+        )
+        MedicalRecord.objects.bulk_create(
+            MedicalRecord(doctor=doctor, patient=patient, appointment=a, diagnosis="Flu") for a in appointments
+        )
+        self.rows = total
+
+    def _ids(self):
+        return {
+            "patient": self.users["patient"].id,
+            "doctor": self.users["doctor"].id,
+            "lab_report": LabReport.objects.values_list("id", flat=True).first(),
+        }
+
+    def _count(self, method, path, role):
+        client = APIClient()
+        client.force_authenticate(self.users[role])
+        cache.clear()
+        reset_queries()  # connection.queries is capped; an N+1 at 1000 rows can overflow it
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method.lower())(f"/api/accounts/{path.format(**self._ids())}")
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, f"{method} {path} as {role}")
+        return len(queries)
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        counts = {endpoint: [] for endpoint in self.BUDGETS}
+        for rows in self.SCALES:
+            self._grow(rows)
+            for endpoint in self.BUDGETS:
+                counts[endpoint].append(self._count(*endpoint))
+        for endpoint, budget in self.BUDGETS.items():
+            with self.subTest(endpoint=" ".join(endpoint), queries=dict(zip(self.SCALES, counts[endpoint]))):
+                self.assertEqual(len(set(counts[endpoint])), 1)
+                self.assertLessEqual(max(counts[endpoint]), budget)
+
+
+class SeederTests(TestCase):
+    def _seed(self, prefix, now):
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            seeding.Seeder(
+                doctors=2, patients=5, appointments=40, staff=0, admins=0, days=10, future_days=10,
+                prefix=prefix, password="x", today=datetime(2026, 3, 10).date(),
+            ).run()
+        return [
+            (a.date, a.status, a.reason, a.token_number, a.patient.username.split("_")[-1])
+            for a in Appointment.objects.filter(doctor__username__startswith=f"{prefix}_")
+            .select_related("patient").order_by("date", "doctor__username")
+        ]
+
+    def test_same_seed_and_day_give_the_same_data_at_any_time(self):
+        # The second run's clock lands between slots of the seeded days
+        first = self._seed("a", datetime(2026, 3, 10, 7, tzinfo=dt_timezone.utc))
+        second = self._seed("b", datetime(2026, 3, 14, 13, tzinfo=dt_timezone.utc))
+        self.assertEqual(len(first), 40)
+        self.assertEqual(first, second)
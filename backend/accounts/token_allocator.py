@@ -0,0 +1,35 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import DailyTokenCounter
+
+
+def token_day(appt_date):
+    # The queue is per clinic day in the server's timezone, same as the old date__day lookup
+    if timezone.is_naive(appt_date):
+        return appt_date.date()
+    return timezone.localtime(appt_date).date()
+
+
+def allocate_token(doctor, day):
+    """
+    Return the next queue token for `doctor` on `day`.
+
+    Must be called inside the booking transaction: the UPDATE takes the counter row's
+    write lock, so concurrent bookings for the same doctor/day queue up on that one
+    row and each sees a distinct value. Bookings for other doctors are not blocked.
+    """
+    counters = DailyTokenCounter.objects.filter(doctor=doctor, day=day)
+    for _ in range(2):
+        if counters.update(last_token=F("last_token") + 1):
+            return counters.values_list("last_token", flat=True).get()
+        # First booking of the day: create the row. If another booking beat us to it
+        # the unique constraint fires and we go back to the increment.
+        try:
+            with transaction.atomic():
+                DailyTokenCounter.objects.create(doctor=doctor, day=day, last_token=1)
+            return 1
+        except IntegrityError:
+            continue
+    raise IntegrityError("Could not allocate a token number")
@@ -0,0 +1,73 @@
+"""
+Per-doctor daily token queue for the check-in desk.
+
+Each doctor's queue for a clinic day is one small list, ordered by token, kept in
+Django's cache (see CACHES in settings) under queue:<doctor_id>:<day>. Appointment
+signals drop the entry after every booking, status change or delete commits, which
+costs the write no queries; the next read rebuilds it with one indexed query on
+(doctor, token_date), and reads after that never touch the appointments table.
+
+Dropping the entry only reaches the cache of the process that committed the write.
+With the per-process local memory cache other workers keep their own copies, so
+there entries live LOCAL_QUEUE_TIMEOUT seconds instead; set REDIS_URL to share one.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Appointment
+
+QUEUE_TIMEOUT = 60 * 60 * 24  # seconds; a queue is only interesting for its own day
+LOCAL_QUEUE_TIMEOUT = 10
+
+
+def queue_timeout():
+    if settings.CACHES["default"]["BACKEND"] == "django.core.cache.backends.locmem.LocMemCache":
+        return LOCAL_QUEUE_TIMEOUT
+    return QUEUE_TIMEOUT
+
+
+def queue_key(doctor_id, day):
+    return f"queue:{doctor_id}:{day.isoformat()}"
+
+
+def build_queue(doctor_id, day):
+    rows = (
+        Appointment.objects.filter(doctor_id=doctor_id, token_date=day)
+        .order_by("token_number", "id")
+        .values(
+            "id", "token_number", "status", "payment_status", "consultation_type",
+            "date", "patient_id", "patient__username", "vitals",
+        )
+    )
+    return [
+        {
+            "id": row["id"],
+            "token_number": row["token_number"],
+            "status": row["status"],
+            "payment_status": row["payment_status"],
+            "consultation_type": row["consultation_type"],
+            "date": row["date"],
+            "patient_id": row["patient_id"],
+            "patient": row["patient__username"],
+            "has_vitals": bool(row["vitals"] and row["vitals"].strip()),
+        }
+        for row in rows
+    ]
+
+
+def refresh_queue(doctor_id, day):
+    """Rebuild one doctor's queue for `day` from the appointments table and cache it."""
+    entries = build_queue(doctor_id, day)
+    cache.set(queue_key(doctor_id, day), entries, queue_timeout())
+    return entries
+
+
+def forget_queue(doctor_id, day):
+    cache.delete(queue_key(doctor_id, day))
+
+
+def get_queue(doctor_id, day):
+    entries = cache.get(queue_key(doctor_id, day))
+    if entries is None:
+        entries = refresh_queue(doctor_id, day)
+    return entries
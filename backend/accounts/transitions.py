@@ -0,0 +1,237 @@
+"""
+Appointment status state machine.
+
+TRANSITIONS declares every allowed (from, to) status change and the roles that
+may make it; doctors and patients may only move their own appointments.
+Side effects (in-app notifications, outbox email/SMS/WhatsApp) are hooks
+registered with @on_transition. They are collected in an Effects object while
+the request runs and executed together after the transaction commits, so a
+rolled-back change never notifies anyone and a bulk change writes all its
+notifications and messages with one INSERT each.
+
+    effects = Effects()
+    with transaction.atomic():
+        transition(appointment, "confirmed", request.user, effects)
+        appointment.save()
+        effects.flush()
+"""
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import outbox
+from .models import Appointment
+from .notifications import NotificationBatch
+
+STATUSES = [choice for choice, _ in Appointment._meta.get_field("status").choices]
+
+CLINIC = ("admin", "doctor", "staff")
+
+# (from, to) -> roles allowed to make the change. "payment" is the patient
+# paying through Stripe, which confirms a pending booking.
+TRANSITIONS = {
+    ("pending", "confirmed"): CLINIC + ("payment",),
+    ("pending", "in_progress"): CLINIC,
+    ("pending", "cancelled"): CLINIC + ("patient",),
+    ("confirmed", "pending"): ("admin", "staff"),
+    ("confirmed", "in_progress"): CLINIC,
+    ("confirmed", "completed"): CLINIC,
+    ("confirmed", "cancelled"): CLINIC + ("patient",),
+    ("in_progress", "completed"): CLINIC,
+    ("in_progress", "cancelled"): ("admin", "doctor"),
+    ("completed", "in_progress"): ("admin", "doctor"),
+    ("cancelled", "pending"): CLINIC,
+}
+
+MAX_BULK = 200
+
+Change = namedtuple("Change", "appointment old new actor via")
+
+
+class TransitionError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _owns(appointment, user):
+    if user.role == "doctor":
+        return appointment.doctor_id == user.id
+    if user.role == "patient":
+        return appointment.patient_id == user.id
+    return user.role in ("admin", "staff")
+
+
+def check(appointment, new_status, user, as_role=None):
+    if new_status not in STATUSES:
+        raise TransitionError("Invalid status")
+    if not _owns(appointment, user):
+        raise TransitionError("Unauthorized", status=403)
+    roles = TRANSITIONS.get((appointment.status, new_status))
+    if roles is None:
+        raise TransitionError(f"Cannot move an appointment from {appointment.status} to {new_status}", status=409)
+    role = as_role or user.role
+    if role not in roles:
+        raise TransitionError(f"A {role} cannot move an appointment from {appointment.status} to {new_status}", status=403)
+
+
+def can(appointment, new_status, user, as_role=None):
+    try:
+        check(appointment, new_status, user, as_role)
+    except TransitionError:
+        return False
+    return True
+
+
+def transition(appointment, new_status, user, effects, as_role=None, via=None):
+    """Validate and apply the status change in memory; the caller saves."""
+    check(appointment, new_status, user, as_role)
+    old = appointment.status
+    appointment.status = new_status
+    effects.add(Change(appointment, old, new_status, user, via))
+    return old
+
+
+# --- Side effects ---
+
+_HOOKS = []
+
+
+def on_transition(*statuses):
+    """Register fn(change, notifications, messages) for changes into `statuses` (all if none given)."""
+    def register(fn):
+        _HOOKS.append((set(statuses) or None, fn))
+        return fn
+    return register
+
+
+class Effects:
+    def __init__(self):
+        self._changes = []
+
+    def add(self, change):
+        self._changes.append(change)
+
+    def __len__(self):
+        return len(self._changes)
+
+    def flush(self):
+        changes, self._changes = self._changes, []
+        if changes:
+            transaction.on_commit(lambda: run_hooks(changes))
+
+
+def run_hooks(changes):
+    notifications = NotificationBatch()
+    messages = []
+    for change in changes:
+        for statuses, hook in _HOOKS:
+            if statuses is None or change.new in statuses:
+                hook(change, notifications, messages)
+    notifications.send(defer=False)
+    outbox.enqueue(*messages)
+
+
+@on_transition()
+def tell_patient(change, notifications, messages):
+    # The clinic changed the booking: in-app note plus queued email / SMS / WhatsApp
+    if change.actor.role == "patient" or change.via == "payment":
+        return
+    appointment, status = change.appointment, change.new
+    patient, doctor = appointment.patient, appointment.doctor
+
+    msg = f"Your appointment with Dr. {doctor.username} has been {status}."
+    if status == 'cancelled' and appointment.decline_reason:
+        msg += f" Reason: {appointment.decline_reason}"
+    notifications.add(patient, msg)
+
+    subject = f"Appointment Update: {status.title()}"
+    email_body = f"Dear {patient.username},\n\n"
+    email_body += f"Your appointment with Dr. {doctor.username} on {appointment.date} has been {status}.\n"
+    if status == 'cancelled' and appointment.decline_reason:
+        email_body += f"\nReason for cancellation: {appointment.decline_reason}\n"
+    if status == 'confirmed' and appointment.consultation_type == 'online':
+        email_body += "\nThis is a confirmed ONLINE consultation. Please log in to join the video call at the scheduled time.\n"
+    email_body += "\nPlease check your dashboard for more details.\n\nBest regards,\nHospital Team"
+    if patient.email:
+        messages.append(outbox.email(patient.email, subject, email_body))
+
+    if status in ['confirmed', 'cancelled'] and patient.phone_number:
+        action = "CONFIRMED" if status == "confirmed" else "DECLINED"
+        msg_wa = f"Hello {patient.username}, your appointment ({appointment.consultation_type}) with Dr. {doctor.username} on {appointment.date} is {action}."
+        if status == "cancelled" and appointment.decline_reason:
+            msg_wa += f" Reason: {appointment.decline_reason}"
+        messages.append(outbox.sms(patient.phone_number, f"{subject} - Your appointment with Dr. {doctor.username} is {action.lower()}."))
+        messages.append(outbox.whatsapp(patient.phone_number, msg_wa))
+
+
+@on_transition("confirmed")
+def tell_doctor_patient_checked_in(change, notifications, messages):
+    if change.via != "payment":
+        notifications.add(change.appointment.doctor_id, f"Patient {change.appointment.patient.username} has checked in and is ready.")
+
+
+@on_transition("cancelled")
+def tell_doctor_patient_cancelled(change, notifications, messages):
+    if change.actor.role == "patient":
+        appointment = change.appointment
+        notifications.add(appointment.doctor_id, f"Appointment with {appointment.patient.username} (Token #{appointment.token_number}) was cancelled by the patient.")
+
+
+# --- Bulk ---
+
+def bulk_transition(ids, new_status, user):
+    """
+    Move many appointments to `new_status` with one conditional UPDATE.
+
+    Each row only changes if it still has the version it was read with, so a row
+    edited concurrently is reported back instead of overwritten. Returns
+    (changed appointments, [{"id", "error"}] for the rest).
+    """
+    from .signals import appointments_updated
+
+    appointments = list(Appointment.objects.select_related("patient", "doctor").filter(pk__in=ids))
+    found = {a.id for a in appointments}
+    rejected = [{"id": pk, "error": "Appointment not found"} for pk in ids if pk not in found]
+
+    movable = []
+    for appointment in appointments:
+        try:
+            check(appointment, new_status, user)
+        except TransitionError as e:
+            rejected.append({"id": appointment.id, "error": str(e)})
+        else:
+            movable.append(appointment)
+    if not movable:
+        return [], rejected
+
+    expected = Q()
+    moved = Q()
+    for appointment in movable:
+        expected |= Q(pk=appointment.pk, version=appointment.version)
+        moved |= Q(pk=appointment.pk, version=appointment.version + 1, status=new_status)
+
+    now = timezone.now()
+    effects = Effects()
+    changed = []
+    try:
+        with transaction.atomic():
+            # QuerySet.update skips save(), so bump version and updated_at here
+            Appointment.objects.filter(expected).update(status=new_status, version=F("version") + 1, updated_at=now)
+            updated_ids = set(Appointment.objects.filter(moved).values_list("id", flat=True))
+            for appointment in movable:
+                if appointment.id not in updated_ids:
+                    rejected.append({"id": appointment.id, "error": "Changed by someone else; reload and retry"})
+                    continue
+                effects.add(Change(appointment, appointment.status, new_status, user, None))
+                appointment.status = new_status
+                appointment.version += 1
+                appointment.updated_at = now
+                changed.append(appointment)
+            appointments_updated(changed)
+            effects.flush()
+    except IntegrityError:
+        raise TransitionError("One of these time slots has been booked by another patient", status=409)
+    return changed, rejected
@@ -1,16 +1,20 @@
 from django.urls import path
+from .stream import events_stream, events_ticket
 from .views import (
     register, login, profile, 
     get_appointments, create_appointment, get_doctors, 
     get_users, request_password_reset, reset_password_confirm, 
     admin_create_user, delete_user, admin_update_user, get_user_detail,
     get_notifications, mark_notification_read,
-    update_appointment_status,
+    get_unread_notification_count, mark_all_notifications_read,
+    update_appointment_status, bulk_update_appointment_status,
     pay_appointment, cancel_my_appointment,
     create_payment_intent, get_stripe_config,
-    get_lab_reports, create_lab_report, create_referral, toggle_availability,
-    create_prescription, get_prescriptions, dispense_prescription,
-    ai_insights, get_medical_records, create_medical_record, admin_analytics, doctor_analytics
+    get_lab_reports, get_lab_report, create_lab_report, import_lab_reports, create_referral, toggle_availability,
+    create_prescription, get_prescriptions, dispensing_queue, dispense_prescription,
+    ai_insights, get_medical_records, create_medical_record, admin_analytics, doctor_analytics,
+    admin_export, doctor_schedule, create_schedule_exception, delete_schedule_exception, find_slots,
+    doctor_queue, admin_profiling,
 )
 
 urlpatterns = [
@@ -20,6 +24,7 @@ urlpatterns = [
     path("appointments/", get_appointments),
     path("appointments/create/", create_appointment),
     path("appointments/<int:pk>/status/", update_appointment_status),
+    path("appointments/bulk-status/", bulk_update_appointment_status),
     path("appointments/<int:pk>/pay/", pay_appointment),
     path("appointments/create-payment-intent/<int:pk>/", create_payment_intent),
     path("stripe-config/", get_stripe_config),
@@ -33,16 +38,32 @@ urlpatterns = [
     path("request-reset/", request_password_reset),
     path("confirm-reset/", reset_password_confirm),
     path("notifications/", get_notifications),
+    path("notifications/unread-count/", get_unread_notification_count),
+    path("notifications/read-all/", mark_all_notifications_read),
     path("notifications/<int:notif_id>/read/", mark_notification_read),
     path("lab-reports/", get_lab_reports),
+    path("lab-reports/<int:pk>/", get_lab_report),
     path("lab-reports/create/", create_lab_report),
+    path("lab-reports/import/", import_lab_reports),
     path("referrals/create/", create_referral),
     path("doctor/toggle-availability/", toggle_availability),
+    path("doctor/schedule/", doctor_schedule),
+    path("doctor/schedule/exceptions/", create_schedule_exception),
+    path("doctor/schedule/exceptions/<int:pk>/", delete_schedule_exception),
+    path("schedule/slots/", find_slots),
+    path("doctor/queue/", doctor_queue),
     path("prescriptions/", get_prescriptions),
     path("prescriptions/create/", create_prescription),
+    path("prescriptions/queue/", dispensing_queue),
+    path("prescriptions/dispense/", dispense_prescription),
     path("prescriptions/<int:pk>/dispense/", dispense_prescription),
     path("medical-records/<int:patient_id>/", get_medical_records),
     path("medical-records/create/", create_medical_record),
     path("analytics/admin/", admin_analytics),
     path("analytics/doctor/", doctor_analytics),
+    path("exports/<slug:resource>.<slug:fmt>", admin_export),
+    path("admin/profiling/", admin_profiling),
+    path("ai-insights/", ai_insights),
+    path("events/", events_stream),
+    path("events/ticket/", events_ticket),
 ]
@@ -3,15 +3,27 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from django.contrib.auth import authenticate, get_user_model
 from rest_framework_simplejwt.tokens import RefreshToken
-from .models import Appointment, Notification, LabReport, Referral
-from .serializers import LabReportSerializer, UserSerializer, AppointmentSerializer
-from django.core.mail import send_mail
+from .models import (
+    Appointment, Notification, LabReport, Referral, ScheduleException, ScheduleTemplate, StaleAppointmentError,
+)
+from .serializers import (
+    LabReportSerializer, UserSerializer, AppointmentSerializer, ScheduleExceptionSerializer, ScheduleTemplateSerializer,
+)
+from .fast_serializers import APPOINTMENT_LIST, LAB_REPORT_LIST, LAB_REPORT_SUMMARY_LIST
+from .pagination import InvalidCursor, is_paginated_request, keyset_page, parse_page_size
+from .token_allocator import allocate_token, token_day
+from .notifications import NotificationBatch, notify
+from . import analytics, directory, dispensing, exports, lab_import, outbox, profiling, schedule, symptoms, token_queue, transitions
+from .conditional import conditional_list, list_version
 import random
 import stripe
 from django.conf import settings
-from django.db.models import Count, Q
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Q
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timedelta
+from decimal import Decimal
 import logging
 
 # ✅ IMPROVED: Use proper logging instead of print()
@@ -104,15 +116,13 @@ def admin_update_user(request, user_id):
     password = request.data.get("password")
     specialization = request.data.get("specialization")
     consultation_fee = request.data.get("consultation_fee")
+    notifications = NotificationBatch()
     
     if email and email != user.email:
         if User.objects.filter(email=email).exclude(id=user_id).exists():
             return Response({"error": "Email already in use"}, status=400)
         user.email = email
-        Notification.objects.create(
-            recipient=user,
-            message=f"Your account email has been updated by an administrator."
-        )
+        notifications.add(user, "Your account email has been updated by an administrator.")
 
     if role and role != user.role:
         if user.id == request.user.id:
@@ -120,10 +130,7 @@ def admin_update_user(request, user_id):
         if role in ["doctor", "admin", "patient", "staff"]:
             old_role = user.role
             user.role = role
-            Notification.objects.create(
-                recipient=user,
-                message=f"Your account role has been changed from {old_role} to {role}."
-            )
+            notifications.add(user, f"Your account role has been changed from {old_role} to {role}.")
             
     if specialization is not None and user.role == "doctor":
         user.specialization = specialization
@@ -133,15 +140,13 @@ def admin_update_user(request, user_id):
 
     if password:
         user.set_password(password)
-        Notification.objects.create(
-            recipient=user,
-            message=f"Your password has been reset by an administrator."
-        )
+        notifications.add(user, "Your password has been reset by an administrator.")
         
     user.save()
+    notifications.send()
     return Response({"message": "User updated successfully"})
 
-from rest_framework.parsers import JSONParser
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.decorators import parser_classes
 
 @api_view(["POST"])
@@ -216,45 +221,108 @@ def profile(request):
         print(f"DEBUG: Profile update errors: {serializer.errors}")
         return Response(serializer.errors, status=400)
 
+APPOINTMENT_FILTERS = ("status", "payment_status", "consultation_type")
+
+
+def _filter_appointments(appointments, params):
+    # Server-side filters so dashboards don't download the whole table to filter on the client
+    for field in APPOINTMENT_FILTERS:
+        value = params.get(field)
+        if value:
+            appointments = appointments.filter(**{field: value})
+
+    doctor_id = params.get("doctor") or params.get("doctor_id")
+    if doctor_id:
+        if not str(doctor_id).isdigit():
+            raise ValueError("doctor must be an id")
+        appointments = appointments.filter(doctor_id=doctor_id)
+
+    return _filter_date_range(appointments, params)
+
+
+def _filter_date_range(queryset, params):
+    for param, lookup in (("date_from", "date__gte"), ("date_to", "date__lte")):
+        value = params.get(param)
+        if not value:
+            continue
+        # Dates first: parse_datetime also accepts a bare date (as midnight)
+        day = parse_date(value)
+        if day is not None:
+            # A bare date_to means "up to the end of that day"
+            parsed = datetime.combine(day, time.max if param == "date_to" else time.min)
+        else:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError(f"{param} must be an ISO date or datetime")
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        queryset = queryset.filter(**{lookup: parsed})
+    return queryset
+
+
+def _appointments_for(user):
+    if user.role == "patient":
+        return Appointment.objects.select_related('patient', 'doctor').filter(patient=user)
+    elif user.role == "doctor":
+        return Appointment.objects.select_related('patient', 'doctor').filter(doctor=user)
+    elif user.role in ["admin", "staff"]:
+        return Appointment.objects.select_related('patient', 'doctor').all()
+    return None
+
+
+def _appointments_version(request):
+    appointments = _appointments_for(request.user)
+    if appointments is None:
+        return None
+    try:
+        appointments = _filter_appointments(appointments, request.query_params)
+    except ValueError:
+        return None
+    return list_version(appointments, Max("updated_at"))
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_list("appointments", _appointments_version)
 def get_appointments(request):
     try:
-        user = request.user
-        print(f"DEBUG: get_appointments for user {user.username} (role: {user.role})")
-        
-        if user.role == "patient":
-            appointments = Appointment.objects.select_related('patient', 'doctor').filter(patient=user).order_by('-date')
-        elif user.role == "doctor":
-            appointments = Appointment.objects.select_related('patient', 'doctor').filter(doctor=user).order_by('-date')
-        elif user.role in ["admin", "staff"]:
-             appointments = Appointment.objects.select_related('patient', 'doctor').all().order_by('-date')
-        else:
+        appointments = _appointments_for(request.user)
+        if appointments is None:
             return Response([])
-    
-        # Check if we can iterate
-        count = appointments.count()
-        print(f"DEBUG: Found {count} appointments")
-        
-        serializer = AppointmentSerializer(appointments, many=True)
-        data = serializer.data
-        return Response(data)
+
+        try:
+            appointments = _filter_appointments(appointments, request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        # Cursor mode: ?limit=N and/or ?cursor=... returns {"results": [...], "next": cursor}
+        if is_paginated_request(request.query_params):
+            try:
+                rows, next_cursor = keyset_page(APPOINTMENT_LIST.values(appointments), request.query_params)
+            except InvalidCursor as e:
+                return Response({"error": str(e)}, status=400)
+            return Response({
+                "results": APPOINTMENT_LIST.serialize(rows),
+                "next": next_cursor,
+            })
+
+        # Same output as AppointmentSerializer, built from values() rows (accounts.fast_serializers)
+        return Response(APPOINTMENT_LIST.data(appointments.order_by('-date', '-id')))
     except Exception as e:
-        import traceback
-        error_msg = f"{str(e)}\n{traceback.format_exc()}"
-        print(f"CRITICAL ERROR in get_appointments: {error_msg}")
-        
-        with open("C:/Users/nabee/reactprojectssubmit/final_project/backend/server_errors.log", "a") as f:
-            f.write(f"\n--- Error in get_appointments ---\n{error_msg}\n")
-            
+        logger.exception("Error in get_appointments")
         return Response({"error": f"Internal Server Error: {str(e)}"}, status=500)
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_doctors(request):
-    doctors = User.objects.filter(role="doctor")
-    doctors = User.objects.filter(role="doctor")
-    return Response([{"id": d.id, "username": d.username, "specialization": d.specialization or "General Practice", "is_available": d.is_available, "consultation_fee": d.consultation_fee} for d in doctors])
+    # Served from the cached directory (accounts.directory); ?specialization= and ?available=true|false filter it
+    available = request.query_params.get("available")
+    if available not in (None, "", "true", "false"):
+        return Response({"error": "available must be true or false"}, status=400)
+    return Response(directory.find_doctors(
+        specialization=request.query_params.get("specialization"),
+        available=None if not available else available == "true",
+    ))
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
@@ -269,6 +337,140 @@ def toggle_availability(request):
     status_str = "Available" if user.is_available else "Uncleared/Unavailable"
     return Response({"message": f"Status updated to {status_str}", "is_available": user.is_available})
 
+def _schedule_owner(request):
+    # Doctors manage their own schedule; admins pass ?doctor_id= (or doctor_id in the body)
+    if request.user.role == "doctor":
+        return request.user, None
+    if request.user.role != "admin":
+        return None, Response({"error": "Unauthorized"}, status=403)
+    doctor_id = request.query_params.get("doctor_id") or request.data.get("doctor_id")
+    try:
+        return User.objects.get(id=doctor_id, role="doctor"), None
+    except (User.DoesNotExist, ValueError, TypeError):
+        return None, Response({"error": "Doctor not found"}, status=404)
+
+
+@api_view(["GET", "PUT"])
+@permission_classes([IsAuthenticated])
+def doctor_schedule(request):
+    """GET the weekly template and upcoming exceptions; PUT {"templates": [...]} replaces the template."""
+    doctor, error = _schedule_owner(request)
+    if error:
+        return error
+
+    if request.method == "PUT":
+        serializer = ScheduleTemplateSerializer(data=request.data.get("templates", []), many=True)
+        if not serializer.is_valid():
+            return Response({"error": "Invalid schedule", "details": serializer.errors}, status=400)
+        with transaction.atomic():
+            ScheduleTemplate.objects.filter(doctor=doctor).delete()
+            ScheduleTemplate.objects.bulk_create(
+                ScheduleTemplate(doctor=doctor, **item) for item in serializer.validated_data
+            )
+
+    today = timezone.localdate()
+    return Response({
+        "templates": ScheduleTemplateSerializer(ScheduleTemplate.objects.filter(doctor=doctor), many=True).data,
+        "exceptions": ScheduleExceptionSerializer(
+            ScheduleException.objects.filter(doctor=doctor, day__gte=today), many=True
+        ).data,
+    })
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def create_schedule_exception(request):
+    doctor, error = _schedule_owner(request)
+    if error:
+        return error
+    serializer = ScheduleExceptionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({"error": "Invalid exception", "details": serializer.errors}, status=400)
+    serializer.save(doctor=doctor)
+    return Response(serializer.data, status=201)
+
+
+@api_view(["DELETE"])
+@permission_classes([IsAuthenticated])
+def delete_schedule_exception(request, pk):
+    doctor, error = _schedule_owner(request)
+    if error:
+        return error
+    deleted, _ = ScheduleException.objects.filter(id=pk, doctor=doctor).delete()
+    if not deleted:
+        return Response({"error": "Exception not found"}, status=404)
+    return Response({"message": "Exception removed"})
+
+
+SLOT_SEARCH_DAYS = 14
+MAX_SLOT_RESULTS = 100
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def find_slots(request):
+    """
+    Next free slots: ?specialization=, ?doctor_id=, ?date_from= / ?date_to= (dates,
+    default the next two weeks) and ?limit= (default 10).
+    """
+    params = request.query_params
+    try:
+        limit = min(max(int(params.get("limit", 10)), 1), MAX_SLOT_RESULTS)
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=400)
+
+    today = timezone.localdate()
+    try:
+        # None for a malformed date, ValueError for an impossible one (2026-02-30)
+        start_day = parse_date(params["date_from"]) if params.get("date_from") else today
+        end_day = parse_date(params["date_to"]) if params.get("date_to") else None
+    except ValueError:
+        start_day = end_day = None
+    if start_day is None or (end_day is None and params.get("date_to")):
+        return Response({"error": "date_from and date_to must be YYYY-MM-DD"}, status=400)
+    end_day = end_day or start_day + timedelta(days=SLOT_SEARCH_DAYS - 1)
+    start_day = max(start_day, today)
+    if end_day < start_day:
+        return Response([])
+    if (end_day - start_day).days >= schedule.MAX_RANGE_DAYS:
+        return Response({"error": f"Search at most {schedule.MAX_RANGE_DAYS} days at a time"}, status=400)
+
+    doctors = directory.find_doctors(specialization=params.get("specialization"), available=True)
+    doctor_id = params.get("doctor_id") or params.get("doctor")
+    if doctor_id:
+        doctors = [d for d in doctors if str(d["id"]) == str(doctor_id)]
+    return Response(schedule.find_free_slots(doctors, start_day, end_day, limit=limit))
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def doctor_queue(request):
+    """
+    Today's token queue for one doctor (?date=YYYY-MM-DD for another day). Doctors
+    see their own; staff and admins pass ?doctor_id=. Served from the cached index.
+    """
+    params = request.query_params
+    if request.user.role == "doctor":
+        doctor_id = request.user.id
+    elif request.user.role in ("staff", "admin"):
+        try:
+            doctor_id = int(params.get("doctor_id", ""))
+        except ValueError:
+            return Response({"error": "doctor_id is required"}, status=400)
+        if not any(d["id"] == doctor_id for d in directory.get_directory()):
+            return Response({"error": "Doctor not found"}, status=404)
+    else:
+        return Response({"error": "Unauthorized"}, status=403)
+
+    try:
+        # None for a malformed date, ValueError for an impossible one (2026-02-30)
+        day = parse_date(params["date"]) if params.get("date") else timezone.localdate()
+    except ValueError:
+        day = None
+    if day is None:
+        return Response({"error": "date must be YYYY-MM-DD"}, status=400)
+    return Response({"doctor_id": doctor_id, "date": day, "queue": token_queue.get_queue(doctor_id, day)})
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_users(request):
@@ -321,6 +523,54 @@ def get_user_detail(request, user_id):
     except User.DoesNotExist:
         return Response({"error": "User not found"}, status=404)
 
+class SlotTaken(Exception):
+    pass
+
+
+def _book_slot(capacity, **fields):
+    """
+    Insert the appointment in the first free seat of its slot. The
+    unique_active_doctor_slot constraint settles races: a losing insert retries
+    the next seat, and SlotTaken is raised once every seat is gone.
+    """
+    for _ in range(capacity):
+        taken = set(
+            Appointment.objects.filter(doctor=fields["doctor"], date=fields["date"])
+            .exclude(status="cancelled").values_list("slot_index", flat=True)
+        )
+        free = [seat for seat in range(capacity) if seat not in taken]
+        if not free:
+            break
+        try:
+            with transaction.atomic():
+                return Appointment.objects.create(slot_index=free[0], **fields)
+        except IntegrityError:
+            continue
+    raise SlotTaken()
+
+
+def _version_conflict(appointment_id):
+    current = Appointment.objects.filter(pk=appointment_id).values_list("version", flat=True).first()
+    return Response({
+        "error": "This appointment was changed by someone else. Reload it and try again.",
+        "version": current,
+    }, status=409)
+
+
+def _check_version(appointment, data):
+    # Clients may send the version they last saw; a mismatch means they edited stale data
+    version = data.get("version") if hasattr(data, "get") else None
+    if version in (None, ""):
+        return None
+    try:
+        version = int(version)
+    except (TypeError, ValueError):
+        return Response({"error": "version must be an integer"}, status=400)
+    if version != appointment.version:
+        return _version_conflict(appointment.id)
+    return None
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def create_appointment(request):
@@ -335,44 +585,44 @@ def create_appointment(request):
     except User.DoesNotExist:
         return Response({"error": "Doctor not found"}, status=404)
         
-    # Calculate Token Number (Queue Position)
-    # We find how many appointments this doctor has today and add 1
-    from django.utils.dateparse import parse_datetime
-    appt_date = parse_datetime(data.get("date"))
-    
-    existing_count = Appointment.objects.filter(
-        doctor=doctor, 
-        date__year=appt_date.year,
-        date__month=appt_date.month,
-        date__day=appt_date.day
-    ).count()
-    
-    token = existing_count + 1
-
-    appointment = Appointment.objects.create(
-        patient=request.user,
-        doctor=doctor,
-        date=data.get("date"),
-        reason=data.get("reason"),
-        status="pending",
-        token_number=token,
-        consultation_type=data.get("consultation_type", "normal")
-    )
-
-    # Notify Doctor
-    cons_type_str = "Online" if appointment.consultation_type == "online" else "Normal"
-    Notification.objects.create(
-        recipient=doctor,
-        message=f"New {cons_type_str.lower()} request from {request.user.username} for {data.get('date')}."
-    )
-
-    # Notify Admins
-    admins = User.objects.filter(role="admin")
-    for admin in admins:
-        Notification.objects.create(
-            recipient=admin,
-            message=f"A new appointment has been booked between {request.user.username} and Dr. {doctor.username}."
-        )
+    appt_date = parse_datetime(data.get("date") or "")
+    if appt_date is None:
+        return Response({"error": "A valid date is required"}, status=400)
+    if timezone.is_naive(appt_date):
+        appt_date = timezone.make_aware(appt_date)
+
+    # Book the slot the time falls in, so 09:00 and 09:05 compete for the same seats
+    try:
+        appt_date, capacity = schedule.booking_slot(doctor.id, appt_date)
+    except schedule.OffGrid as e:
+        return Response({"error": str(e)}, status=400)
+
+    # Token Number (Queue Position) comes from the doctor's per-day counter row,
+    # incremented in the same transaction as the insert so two bookings can't share one.
+    day = token_day(appt_date)
+    try:
+        with transaction.atomic():
+            token = allocate_token(doctor, day)
+            appointment = _book_slot(
+                capacity,
+                patient=request.user,
+                doctor=doctor,
+                date=appt_date,
+                reason=data.get("reason"),
+                status="pending",
+                token_number=token,
+                token_date=day,
+                consultation_type=data.get("consultation_type", "normal")
+            )
+
+            # Notify Doctor and Admins in one INSERT once the booking commits
+            cons_type_str = "Online" if appointment.consultation_type == "online" else "Normal"
+            notifications = NotificationBatch()
+            notifications.add(doctor, f"New {cons_type_str.lower()} request from {request.user.username} for {appt_date.isoformat()}.")
+            notifications.add_admins(f"A new appointment has been booked between {request.user.username} and Dr. {doctor.username}.")
+            notifications.send()
+    except SlotTaken:
+        return Response({"error": "This time slot is already booked. Please pick another slot."}, status=409)
 
     return Response(AppointmentSerializer(appointment).data, status=201)
 
@@ -394,14 +644,8 @@ def request_password_reset(request):
     user.reset_code = code
     user.save()
     
-    # Send email
-    send_mail(
-        subject="Password Reset Code",
-        message=f"Your password reset code is: {code}",
-        from_email="noreply@hospital.com",
-        recipient_list=[email],
-        fail_silently=False,
-    )
+    # Queue the email; the process_outbox worker delivers and retries it
+    outbox.enqueue(outbox.email(email, "Password Reset Code", f"Your password reset code is: {code}"))
     
     return Response({"message": "Reset code sent to your email"}, status=200)
 
@@ -427,35 +671,69 @@ def reset_password_confirm(request):
     except User.DoesNotExist:
         return Response({"error": "User not found"}, status=404)
 
+NOTIFICATION_PAGE_SIZE = 50
+
+
+def _notifications_version(request):
+    try:
+        since_id = int(request.query_params.get("since_id") or 0)
+    except ValueError:
+        return None
+    notifications = Notification.objects.filter(recipient=request.user, id__gt=since_id)
+    # Reading a notification doesn't change count or max id, so track the unread count too
+    return list_version(notifications, Count("id", filter=Q(is_read=False)))
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_list("notifications", _notifications_version)
 def get_notifications(request):
+    # Without parameters: every notification, newest first. ?limit= caps that to the
+    # newest N. ?since_id=<id> returns the next notifications after the last one the
+    # client has, oldest first and at most ?limit= (default NOTIFICATION_PAGE_SIZE);
+    # the client asks again from the last id until a page comes back short, so nothing
+    # between polls is skipped and a poll with nothing new is an empty list.
     try:
-        notifications = Notification.objects.filter(recipient=request.user).order_by('-created_at')
-        data = [{
-            "id": n.id,
-            "message": n.message,
-            "is_read": n.is_read,
-            "created_at": n.created_at
-        } for n in notifications]
-        return Response(data)
+        params = request.query_params
+        try:
+            since_id = int(params.get("since_id") or 0)
+            limit = parse_page_size(params.get("limit"), default=NOTIFICATION_PAGE_SIZE) if (
+                since_id or params.get("limit")
+            ) else None
+        except (ValueError, InvalidCursor):
+            return Response({"error": "since_id and limit must be integers"}, status=400)
+
+        notifications = Notification.objects.filter(recipient=request.user)
+        if since_id:
+            notifications = notifications.filter(id__gt=since_id).order_by('id')
+        else:
+            notifications = notifications.order_by('-id')
+        notifications = notifications.values("id", "message", "is_read", "created_at")
+        return Response(list(notifications[:limit] if limit else notifications))
     except Exception as e:
-        import traceback
-        error_msg = f"{str(e)}\n{traceback.format_exc()}"
-        with open("C:/Users/nabee/reactprojectssubmit/final_project/backend/server_errors.log", "a") as f:
-            f.write(f"\n--- Error in get_notifications ---\n{error_msg}\n")
+        logger.exception("Error in get_notifications")
         return Response({"error": str(e)}, status=500)
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_unread_notification_count(request):
+    unread = Notification.objects.filter(recipient=request.user, is_read=False).count()
+    return Response({"unread": unread})
+
 @api_view(["PUT"])
 @permission_classes([IsAuthenticated])
 def mark_notification_read(request, notif_id):
-    try:
-        notif = Notification.objects.get(id=notif_id, recipient=request.user)
-        notif.is_read = True
-        notif.save()
-        return Response({"message": "Marked as read"})
-    except Notification.DoesNotExist:
+    updated = Notification.objects.filter(id=notif_id, recipient=request.user).update(is_read=True)
+    if not updated:
         return Response({"error": "Notification not found"}, status=404)
+    return Response({"message": "Marked as read"})
+
+@api_view(["PUT"])
+@permission_classes([IsAuthenticated])
+def mark_all_notifications_read(request):
+    updated = Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+    return Response({"message": "All notifications marked as read", "updated": updated})
+
 @api_view(["PATCH"])
 @permission_classes([IsAuthenticated])
 def update_appointment_status(request, pk):
@@ -481,15 +759,14 @@ def update_appointment_status(request, pk):
          # Attempt to fallback to query params if body failed? Or just return error
          return Response({"error": "Invalid JSON format in body"}, status=400)
 
+    conflict = _check_version(appointment, data)
+    if conflict:
+        return conflict
+
     status = data.get("status")
     vitals = data.get("vitals")
     diagnosis = data.get("diagnosis")
     decline_reason = data.get("decline_reason")
-    
-    if status:
-        if status not in ["pending", "confirmed", "in_progress", "completed", "cancelled"]:
-            return Response({"error": "Invalid status"}, status=400)
-        appointment.status = status
         
     if vitals:
         appointment.vitals = vitals
@@ -500,90 +777,136 @@ def update_appointment_status(request, pk):
     if decline_reason:
         appointment.decline_reason = decline_reason
         
-    appointment.save()
+    # Status changes go through the state machine (accounts.transitions); notifying the
+    # patient and doctor happens in its hooks once this commits. Re-sending the current
+    # status (e.g. alongside vitals) is not a change.
+    effects = transitions.Effects()
+    try:
+        with transaction.atomic():
+            if status and status != appointment.status:
+                transitions.transition(appointment, status, request.user, effects)
+            appointment.save()
+            effects.flush()
+    except transitions.TransitionError as e:
+        return Response({"error": str(e)}, status=e.status)
+    except StaleAppointmentError:
+        return _version_conflict(appointment.id)
+    except IntegrityError:
+        # Re-opening a cancelled booking whose slot has since been taken
+        return Response({"error": "This time slot has been booked by another patient"}, status=409)
     
-    # Notify patient via Notification system
+    return Response(AppointmentSerializer(appointment).data)
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def bulk_update_appointment_status(request):
+    """
+    Move a batch of appointments (e.g. a whole clinic session) to one status:
+    {"ids": [...], "status": "completed"}. Rows the caller may not move, or that
+    changed since they were read, come back under "rejected"; the rest change
+    together in one UPDATE.
+    """
+    if request.user.role not in ["admin", "doctor", "staff"]:
+        return Response({"error": "Unauthorized"}, status=403)
+
+    ids = request.data.get("ids")
+    status = request.data.get("status")
+    if not isinstance(ids, list) or not ids or not status:
+        return Response({"error": "ids (a list) and status are required"}, status=400)
+    if len(ids) > transitions.MAX_BULK:
+        return Response({"error": f"At most {transitions.MAX_BULK} appointments per request"}, status=400)
+    try:
+        ids = list(dict.fromkeys(int(pk) for pk in ids))
+    except (TypeError, ValueError):
+        return Response({"error": "ids must be integers"}, status=400)
+
+    try:
+        changed, rejected = transitions.bulk_transition(ids, status, request.user)
+    except transitions.TransitionError as e:
+        return Response({"error": str(e)}, status=e.status)
+    return Response({
+        "updated": [{"id": a.id, "status": a.status, "version": a.version} for a in changed],
+        "rejected": rejected,
+    })
+
+def _lab_reports_for(user):
+    if user.role == "patient":
+        return LabReport.objects.select_related('patient', 'doctor').filter(patient=user)
+    elif user.role in ["admin", "staff", "doctor"]:
+        # Allow doctors and staff to view all reports for better clinical oversight
+        return LabReport.objects.select_related('patient', 'doctor').all()
+    return None
+
+
+def _filter_lab_reports(reports, params):
+    patient_id = params.get("patient") or params.get("patient_id")
+    if patient_id:
+        if not str(patient_id).isdigit():
+            raise ValueError("patient must be an id")
+        reports = reports.filter(patient_id=patient_id)
+
+    status = params.get("status")
     if status:
-        msg = f"Your appointment with Dr. {appointment.doctor.username} has been {status}."
-        if status == 'cancelled' and appointment.decline_reason:
-            msg += f" Reason: {appointment.decline_reason}"
-            
-        Notification.objects.create(
-            recipient=appointment.patient,
-            message=msg
-        )
+        reports = reports.filter(status=status)
+
+    test_name = params.get("test_name")
+    if test_name:
+        reports = reports.filter(test_name__icontains=test_name)
+    return _filter_date_range(reports, params)
+
+
+def _lab_reports_version(request):
+    reports = _lab_reports_for(request.user)
+    if reports is None:
+        return None
+    try:
+        return list_version(_filter_lab_reports(reports, request.query_params))
+    except ValueError:
+        return None
 
-        # Notify Patient via Email, SMS, and WhatsApp
-        if appointment.patient:
-            try:
-                subject = f"Appointment Update: {status.title()}"
-                
-                email_body = f"Dear {appointment.patient.username},\n\n"
-                email_body += f"Your appointment with Dr. {appointment.doctor.username} on {appointment.date} has been {status}.\n"
-                
-                if status == 'cancelled' and appointment.decline_reason:
-                    email_body += f"\nReason for cancellation: {appointment.decline_reason}\n"
-                
-                if status == 'confirmed' and appointment.consultation_type == 'online':
-                    email_body += "\nThis is a confirmed ONLINE consultation. Please log in to join the video call at the scheduled time.\n"
-                
-                email_body += "\nPlease check your dashboard for more details.\n\nBest regards,\nHospital Team"
-                
-                if appointment.patient.email:
-                    send_mail(
-                        subject,
-                        email_body,
-                        'noreply@hospital.com',
-                        [appointment.patient.email],
-                        fail_silently=True,
-                    )
-                
-                if status in ['confirmed', 'cancelled'] and appointment.patient.phone_number:
-                    # Simulate sending SMS & WhatsApp messages
-                    print('='*50)
-                    action = "CONFIRMED" if status == "confirmed" else "DECLINED"
-                    print(f"--> SMS SENT TO: {appointment.patient.phone_number}")
-                    print(f"Message: {subject} - Your appointment with Dr. {appointment.doctor.username} is {action.lower()}.")
-                    print(f"--> WHATSAPP SENT TO: {appointment.patient.phone_number}")
-                    msg_wa = f"Hello {appointment.patient.username}, your appointment ({appointment.consultation_type}) with Dr. {appointment.doctor.username} on {appointment.date} is {action}."
-                    if status == "cancelled" and appointment.decline_reason:
-                        msg_wa += f" Reason: {appointment.decline_reason}"
-                    print(f"Message: {msg_wa}")
-                    print('='*50)
-            except Exception as e:
-                print(f"Failed to send notifications: {e}")
 
-        # Notify Doctor on Check In
-        if status == 'confirmed':
-            Notification.objects.create(
-                recipient=appointment.doctor,
-                message=f"Patient {appointment.patient.username} has checked in and is ready."
-            )
-    
-    return Response(AppointmentSerializer(appointment).data)
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_list("lab-reports", _lab_reports_version)
 def get_lab_reports(request):
-    from django.db.models import Q
     try:
-        if request.user.role == "patient":
-            reports = LabReport.objects.select_related('patient', 'doctor').filter(patient=request.user).order_by('-date')
-        elif request.user.role in ["admin", "staff", "doctor"]:
-            # Allow doctors and staff to view all reports for better clinical oversight
-            reports = LabReport.objects.select_related('patient', 'doctor').all().order_by('-date')
-        else:
+        reports = _lab_reports_for(request.user)
+        if reports is None:
             return Response([])
 
-        serializer = LabReportSerializer(reports, many=True)
-        return Response(serializer.data)
+        try:
+            reports = _filter_lab_reports(reports, request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        # Cursor mode returns summary rows (no long text columns); open one with lab-reports/<id>/
+        if is_paginated_request(request.query_params):
+            try:
+                rows, next_cursor = keyset_page(LAB_REPORT_SUMMARY_LIST.values(reports), request.query_params)
+            except InvalidCursor as e:
+                return Response({"error": str(e)}, status=400)
+            return Response({
+                "results": LAB_REPORT_SUMMARY_LIST.serialize(rows),
+                "next": next_cursor,
+            })
+
+        return Response(LAB_REPORT_LIST.data(reports.order_by('-date', '-id')))
     except Exception as e:
-        import traceback
-        error_msg = f"{str(e)}\n{traceback.format_exc()}"
-        print(f"ERROR in get_lab_reports: {error_msg}")
-        with open("C:/Users/nabee/reactprojectssubmit/final_project/backend/server_errors.log", "a") as f:
-            f.write(f"\n--- Error in get_lab_reports ---\n{error_msg}\n")
+        logger.exception("Error in get_lab_reports")
         return Response({"error": str(e)}, status=500)
 
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_lab_report(request, pk):
+    reports = _lab_reports_for(request.user)
+    if reports is None:
+        return Response({"error": "Unauthorized"}, status=403)
+    try:
+        report = reports.get(pk=pk)
+    except LabReport.DoesNotExist:
+        return Response({"error": "Lab report not found"}, status=404)
+    return Response(LabReportSerializer(report).data)
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def create_referral(request):
@@ -617,10 +940,7 @@ def create_referral(request):
         )
         
         # Notify the target doctor
-        Notification.objects.create(
-            recipient=to_doctor,
-            message=f"Dr. {request.user.username} has referred patient {patient.username} to you."
-        )
+        notify(to_doctor, f"Dr. {request.user.username} has referred patient {patient.username} to you.")
         
         return Response({"message": f"Successfully referred {patient.username} to Dr. {to_doctor.username}."}, status=201)
         
@@ -638,13 +958,12 @@ def create_lab_report(request):
     # Determine if it's a single report or multiple
     items = data.get("reports") if isinstance(data, dict) and "reports" in data else [data]
     
-    created_reports = []
     try:
         patient_id = data.get("patient_id") if isinstance(data, dict) else items[0].get("patient_id")
         patient = User.objects.get(id=patient_id, role="patient")
         
-        for item in items:
-            report = LabReport.objects.create(
+        created_reports = [
+            LabReport(
                 patient=patient,
                 test_name=item.get("test_name"),
                 result=item.get("result", ""),
@@ -656,22 +975,16 @@ def create_lab_report(request):
                 clinical_interpretation=item.get("clinical_interpretation", ""),
                 status="completed"
             )
-            created_reports.append(report)
-            
-        # Helper to send email for lab reports
-        if patient.email:
-             try:
-                 subject = "New Lab Report Available"
-                 message = f"Dear {patient.username},\n\nA new lab report ({items[0].get('test_name', 'Test')}) has been added to your record.\nPlease log in to your dashboard to view the full details.\n\nBest regards,\nHospital Team"
-                 send_mail(
-                     subject,
-                     message,
-                     'noreply@hospital.com',
-                     [patient.email],
-                     fail_silently=True
-                 )
-             except Exception as e:
-                 print(f"Failed to send email: {e}")
+            for item in items
+        ]
+        with transaction.atomic():
+            created_reports = LabReport.objects.bulk_create(created_reports)
+
+            # Queue the email for lab reports
+            if patient.email:
+                subject = "New Lab Report Available"
+                message = f"Dear {patient.username},\n\nA new lab report ({items[0].get('test_name', 'Test')}) has been added to your record.\nPlease log in to your dashboard to view the full details.\n\nBest regards,\nHospital Team"
+                outbox.enqueue(outbox.email(patient.email, subject, message))
 
         return Response(LabReportSerializer(created_reports, many=True).data, status=201)
     except User.DoesNotExist:
@@ -679,6 +992,30 @@ def create_lab_report(request):
     except Exception as e:
         return Response({"error": str(e)}, status=400)
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@parser_classes([JSONParser, MultiPartParser, lab_import.RawTextParser])
+def import_lab_reports(request):
+    """
+    Bulk load analyzer results: a CSV or JSON lines upload (`file`), a raw CSV /
+    JSON lines body, or JSON {"reports": [...]}. Each row carries its own
+    patient_id. Nothing is written unless every row is valid.
+    """
+    if request.user.role not in ["admin", "staff"]:
+        return Response({"error": "Unauthorized"}, status=403)
+
+    try:
+        reports = lab_import.ingest(lab_import.read_rows(request))
+    except lab_import.LabImportError as e:
+        return Response({"error": str(e), "rows": e.errors}, status=400)
+    except UnicodeDecodeError:
+        return Response({"error": "Upload must be UTF-8 text"}, status=400)
+
+    return Response({
+        "created": len(reports),
+        "patients": len({report.patient_id for report in reports}),
+    }, status=201)
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def create_payment_intent(request, pk):
@@ -766,16 +1103,33 @@ def pay_appointment(request, pk):
                     "payment_status": "paid"
                 }, status=200)
 
-            # ✅ All checks passed - mark as paid
-            appointment.payment_status = 'paid'
-            appointment.status = 'confirmed'  # Auto-confirm after payment
-            appointment.save()
+            # ✅ All checks passed - mark as paid and record what was actually charged.
+            # The money has moved, so a concurrent edit is re-read and the payment reapplied.
+            for attempt in range(3):
+                appointment.payment_status = 'paid'
+                appointment.fee_paid = Decimal(intent.amount) / 100
+                effects = transitions.Effects()
+                if transitions.can(appointment, 'confirmed', request.user, as_role='payment'):
+                    # Auto-confirm after payment
+                    transitions.transition(appointment, 'confirmed', request.user, effects, as_role='payment', via='payment')
+                try:
+                    with transaction.atomic():
+                        appointment.save()
+                        effects.flush()
+                    break
+                except StaleAppointmentError:
+                    if attempt == 2:
+                        return _version_conflict(appointment.id)
+                    appointment.refresh_from_db()
+                    if appointment.payment_status == 'paid':
+                        return Response({
+                            "message": "Appointment already paid",
+                            "appointment_id": appointment.id,
+                            "payment_status": "paid"
+                        }, status=200)
 
             # ✅ Notify doctor of confirmed appointment
-            Notification.objects.create(
-                recipient=appointment.doctor,
-                message=f"Appointment with {appointment.patient.username} (Token #{appointment.token_number}) has been confirmed and paid."
-            )
+            notify(appointment.doctor, f"Appointment with {appointment.patient.username} (Token #{appointment.token_number}) has been confirmed and paid.")
 
             return Response({
                 "message": "Payment verified and appointment confirmed",
@@ -817,21 +1171,26 @@ def cancel_my_appointment(request, pk):
         if request.user != appointment.patient:
             return Response({"error": "Unauthorized"}, status=403)
             
-        # Only allow cancelling pending/confirmed, not completed
-        if appointment.status == 'completed':
-            return Response({"error": "Cannot cancel a completed appointment"}, status=400)
-            
         if appointment.status == 'cancelled':
              return Response({"message": "Already cancelled"}, status=200)
 
-        appointment.status = 'cancelled'
-        appointment.save()
-        
-        # Notify Doctor
-        Notification.objects.create(
-            recipient=appointment.doctor,
-            message=f"Appointment with {request.user.username} (Token #{appointment.token_number}) was cancelled by the patient."
-        )
+        conflict = _check_version(appointment, request.data)
+        if conflict:
+            return conflict
+
+        # Patients may cancel pending/confirmed bookings; the doctor is told by a transition hook
+        effects = transitions.Effects()
+        try:
+            with transaction.atomic():
+                transitions.transition(appointment, 'cancelled', request.user, effects)
+                appointment.save()
+                effects.flush()
+        except transitions.TransitionError as e:
+            if e.status == 409:
+                return Response({"error": f"Cannot cancel a {appointment.status.replace('_', ' ')} appointment"}, status=400)
+            return Response({"error": str(e)}, status=e.status)
+        except StaleAppointmentError:
+            return _version_conflict(appointment.id)
         
         return Response({"message": "Appointment cancelled successfully", "status": "cancelled"})
     except Appointment.DoesNotExist:
@@ -876,97 +1235,119 @@ def create_prescription(request):
     except User.DoesNotExist:
         return Response({"error": "Patient not found"}, status=404)
 
-@api_view(["GET"])
-@permission_classes([IsAuthenticated])
-def get_prescriptions(request):
-    user = request.user
+def _prescriptions_for(user):
     if user.role == "doctor":
-        scripts = Prescription.objects.filter(doctor=user).order_by('-date')
+        return Prescription.objects.filter(doctor=user).order_by('-date')
     elif user.role == "patient":
-        scripts = Prescription.objects.filter(patient=user).order_by('-date')
+        return Prescription.objects.filter(patient=user).order_by('-date')
     elif user.role == "staff":
         # Staff sees all undispensed scripts? Or all?
         # Let's show non-dispensed first
-        scripts = Prescription.objects.all().order_by('is_dispensed', '-date')
-    else:
+        return Prescription.objects.all().order_by('is_dispensed', '-date')
+    return None
+
+
+def _prescriptions_version(request):
+    scripts = _prescriptions_for(request.user)
+    if scripts is None:
+        return None
+    return list_version(scripts, Count("id", filter=Q(is_dispensed=True)))
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@conditional_list("prescriptions", _prescriptions_version)
+def get_prescriptions(request):
+    scripts = _prescriptions_for(request.user)
+    if scripts is None:
         return Response([])
         
-    return Response(PrescriptionSerializer(scripts, many=True).data)
+    return Response(PrescriptionSerializer(scripts.select_related("doctor", "patient"), many=True).data)
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def dispensing_queue(request):
+    """
+    Undispensed scripts, oldest first (accounts.dispensing). Pass the returned
+    ?cursor= back to get only scripts written and ids dispensed since then.
+    """
+    if request.user.role != "staff":
+        return Response({"error": "Unauthorized"}, status=403)
+    try:
+        return Response(dispensing.queue(since=request.query_params.get("cursor")))
+    except InvalidCursor as e:
+        return Response({"error": str(e)}, status=400)
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
-def dispense_prescription(request, pk):
+def dispense_prescription(request, pk=None):
+    """
+    prescriptions/<pk>/dispense/ for one script, or prescriptions/dispense/ with
+    {"ids": [...]} to dispense a batch in one UPDATE.
+    """
     if request.user.role != "staff":
         return Response({"error": "Only staff can dispense"}, status=403)
-        
+
+    if pk is None:
+        ids = request.data.get("ids")
+        if not isinstance(ids, list) or not ids:
+            return Response({"error": "ids (a list) is required"}, status=400)
+        if len(ids) > dispensing.MAX_BATCH:
+            return Response({"error": f"At most {dispensing.MAX_BATCH} prescriptions per request"}, status=400)
+        try:
+            ids = list(dict.fromkeys(int(script_id) for script_id in ids))
+        except (TypeError, ValueError):
+            return Response({"error": "ids must be integers"}, status=400)
+        dispensed = dispensing.dispense(ids)
+        done = set(dispensed)
+        return Response({"dispensed": dispensed, "skipped": [script_id for script_id in ids if script_id not in done]})
+
     try:
         script = Prescription.objects.get(pk=pk)
         script.is_dispensed = True
+        script.dispensed_at = script.dispensed_at or timezone.now()
         script.save()
         return Response({"message": "Prescription marked as dispensed"})
     except Prescription.DoesNotExist:
         return Response({"error": "Script not found"}, status=404)
 
+MAX_INSIGHT_DAYS = 365
+MAX_TOP_SYMPTOMS = 50
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def ai_insights(request):
     if request.user.role not in ['doctor', 'admin']:
          return Response({"error": "Unauthorized"}, status=403)
     
-    # 1. Total Patients & Age Distribution aggregated
-    from django.db.models import Case, When, Value, CharField, Q
+    # 1-4. Patient counts, demographics and the last 7 days of appointments all come
+    # from the rollup tables in accounts.analytics, not from scanning the base tables.
+    age_dist = dict(analytics.age_distribution())
+    total_patients = analytics.total_patients()
+    gender_dist = [{"gender": gender, "count": count} for gender, count in analytics.gender_distribution()]
     
-    patients = User.objects.filter(role='patient')
-    
-    # Efficient Age Aggregation (Single DB Query)
-    age_buckets = patients.aggregate(
-        age_0_18=Count('id', filter=Q(age__lte=18)),
-        age_19_35=Count('id', filter=Q(age__gt=18, age__lte=35)),
-        age_36_50=Count('id', filter=Q(age__gt=35, age__lte=50)),
-        age_51_65=Count('id', filter=Q(age__gt=50, age__lte=65)),
-        age_65_plus=Count('id', filter=Q(age__gt=65))
-    )
-    
-    age_dist = {
-        '0-18': age_buckets['age_0_18'],
-        '19-35': age_buckets['age_19_35'],
-        '36-50': age_buckets['age_36_50'],
-        '51-65': age_buckets['age_51_65'],
-        '65+': age_buckets['age_65_plus'],
-    }
-    
-    total_patients = patients.count()
-    
-    # 3. Gender Distribution
-    gender_dist = list(patients.values('gender').annotate(count=Count('gender')))
-    
-    # 4. Recent Appointment Trends (Last 7 days)
     today = timezone.now().date()
     start_date = today - timedelta(days=6)
+    appointments_last_7 = analytics.appointment_total(start_date, today)
+    status_stats = analytics.appointment_status_counts(start_date, today)
     
-    # Fetch appointments once for this range
-    range_appts = Appointment.objects.filter(date__date__range=[start_date, today])
-    appointments_last_7 = range_appts.count()
-    
-    # By Status
-    status_stats = list(range_appts.values('status').annotate(count=Count('status')))
-    
-    # 5. Symptom Analysis (Optimize loop)
-    # We can fetch all reasons and process in python for small sets, or use Q objects.
-    # For scalability, Q objects with aggregate is better than N queries.
-    symptoms = ['fever', 'cough', 'pain', 'headache', 'fatigue', 'nausea']
-    
-    # Build a dict of aggregation args dynamically? 
-    # Or just write it out. 
-    # Actually, iterate and build Qs.
-    symptom_aggs = {}
-    for sym in symptoms:
-        symptom_aggs[sym] = Count('id', filter=Q(reason__icontains=sym))
-        
-    symptom_counts = range_appts.aggregate(**symptom_aggs)
-    
-    # Cleanup 0s
-    symptom_stats = {k: v for k, v in symptom_counts.items() if v > 0}
+    # 5. Symptom Analysis from the indexed reason terms (accounts.symptoms).
+    # ?symptoms=fever,rash picks the vocabulary, ?top=N asks for the N most common
+    # terms instead, and ?days=N widens the window (default: the same 7 days).
+    try:
+        days = min(max(int(request.query_params.get("days", 7)), 1), MAX_INSIGHT_DAYS)
+        top = request.query_params.get("top")
+        top = min(max(int(top), 1), MAX_TOP_SYMPTOMS) if top else None
+    except ValueError:
+        return Response({"error": "days and top must be integers"}, status=400)
+    vocabulary = request.query_params.get("symptoms")
+    if vocabulary:
+        vocabulary = vocabulary.split(",")
+    elif top is None:
+        vocabulary = symptoms.DEFAULT_SYMPTOMS
+    window_start = analytics.day_start(today - timedelta(days=days - 1))
+    window_end = analytics.day_start(today + timedelta(days=1))
+    symptom_stats = symptoms.symptom_counts(window_start, window_end, vocabulary=vocabulary, top=top)
 
     return Response({
         'overview': {
@@ -987,11 +1368,18 @@ def ai_insights(request):
 
 from .models import MedicalRecord
 from .serializers import MedicalRecordSerializer
-from django.db.models import Sum
-from django.db.models.functions import TruncMonth
+
+def _medical_records_version(request, patient_id):
+    if request.user.role not in ['admin', 'doctor', 'patient']:
+        return None
+    if request.user.role == 'patient' and request.user.id != patient_id:
+        return None
+    return list_version(MedicalRecord.objects.filter(patient_id=patient_id))
+
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@conditional_list("medical-records", _medical_records_version)
 def get_medical_records(request, patient_id):
     if request.user.role not in ['admin', 'doctor', 'patient']:
         return Response({"error": "Unauthorized"}, status=403)
@@ -999,7 +1387,7 @@ def get_medical_records(request, patient_id):
     if request.user.role == 'patient' and request.user.id != patient_id:
         return Response({"error": "Unauthorized"}, status=403)
         
-    records = MedicalRecord.objects.filter(patient_id=patient_id).order_by('-date')
+    records = MedicalRecord.objects.filter(patient_id=patient_id).select_related("doctor", "patient").order_by('-date')
     return Response(MedicalRecordSerializer(records, many=True).data)
 
 @api_view(["POST"])
@@ -1036,50 +1424,66 @@ def create_medical_record(request):
     except User.DoesNotExist:
         return Response({"error": "Patient not found"}, status=404)
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def admin_export(request, resource, fmt):
+    """
+    Streams a whole table as CSV or NDJSON, e.g. exports/appointments.csv or
+    exports/lab-reports.ndjson?date_from=2025-01-01. Optional ?date_from / ?date_to.
+    """
+    if request.user.role != 'admin':
+        return Response({"error": "Unauthorized"}, status=403)
+    if resource not in exports.EXPORTS or fmt not in exports.FORMATS:
+        return Response({"error": "Unknown export"}, status=404)
+
+    model, _ = exports.EXPORTS[resource]
+    try:
+        rows = _filter_date_range(model.objects.all(), request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    return exports.streaming_export(resource, fmt, rows)
+
+
+@api_view(["GET", "POST"])
+@permission_classes([IsAuthenticated])
+def admin_profiling(request):
+    """
+    Query profiling switch for all workers (accounts.profiling). POST {"enabled": true|false},
+    or {"enabled": null} to go back to the QUERY_PROFILING setting.
+    """
+    if request.user.role != 'admin':
+        return Response({"error": "Unauthorized"}, status=403)
+    if request.method == "POST":
+        enabled = request.data.get("enabled")
+        if enabled is None:
+            profiling.reset_switch()
+        elif isinstance(enabled, bool):
+            profiling.set_enabled(enabled)
+        else:
+            return Response({"error": "enabled must be true, false or null"}, status=400)
+    return Response({"enabled": profiling.is_enabled(), "budgets": profiling.budgets()})
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def admin_analytics(request):
     if request.user.role != 'admin':
          return Response({"error": "Unauthorized"}, status=403)
          
-    # Patient Demographics
-    patients = User.objects.filter(role='patient')
-    gender_dist = list(patients.values('gender').annotate(count=Count('gender')))
-    
-    age_buckets = patients.aggregate(
-        age_0_18=Count('id', filter=Q(age__lte=18)),
-        age_19_35=Count('id', filter=Q(age__gt=18, age__lte=35)),
-        age_36_50=Count('id', filter=Q(age__gt=35, age__lte=50)),
-        age_51_65=Count('id', filter=Q(age__gt=50, age__lte=65)),
-        age_65_plus=Count('id', filter=Q(age__gt=65))
-    )
-    
-    age_dist = [
-        {"name": "0-18", "value": age_buckets['age_0_18']},
-        {"name": "19-35", "value": age_buckets['age_19_35']},
-        {"name": "36-50", "value": age_buckets['age_36_50']},
-        {"name": "51-65", "value": age_buckets['age_51_65']},
-        {"name": "65+", "value": age_buckets['age_65_plus']},
-    ]
-
-    six_months_ago = timezone.now() - timedelta(days=180)
-    paid_appts = Appointment.objects.filter(payment_status='paid', date__gte=six_months_ago)
-    
-    monthly_revenue = list(paid_appts.annotate(month=TruncMonth('date'))
-                                     .values('month')
-                                     .annotate(revenue=Sum('doctor__consultation_fee'))
-                                     .order_by('month'))
+    # Served from the rollup tables (accounts.analytics)
+    age_dist = [{"name": name, "value": count} for name, count in analytics.age_distribution()]
+    gender_dist = analytics.gender_distribution()
+
+    six_months_ago = (timezone.now() - timedelta(days=180)).date()
+    monthly_revenue = analytics.monthly_revenue(six_months_ago)
                                      
     revenue_data = [{"month": item['month'].strftime('%b %Y') if item['month'] else "Unknown", "revenue": float(item['revenue'] or 0)} for item in monthly_revenue]
 
-    all_appts = Appointment.objects.filter(date__gte=six_months_ago)
-    status_stats = list(all_appts.values('status').annotate(count=Count('status')))
-    status_data = [{"status": item['status'], "count": item['count']} for item in status_stats]
+    status_data = analytics.appointment_status_counts(six_months_ago)
     
     return Response({
         "revenue_trends": revenue_data,
         "demographics_age": age_dist,
-        "demographics_gender": [{"name": item['gender'] or 'Unknown', "value": item['count']} for item in gender_dist],
+        "demographics_gender": [{"name": gender or 'Unknown', "value": count} for gender, count in gender_dist],
         "appointment_status": status_data
     })
 
@@ -1093,15 +1497,10 @@ def doctor_analytics(request):
     today = timezone.now().date()
     start_of_week = today - timedelta(days=today.weekday())
     
-    appts_this_week = Appointment.objects.filter(doctor=doctor, date__gte=start_of_week)
-    
-    paid_this_week = appts_this_week.filter(payment_status='paid')
-    revenue_this_week = float(paid_this_week.aggregate(total=Sum('doctor__consultation_fee'))['total'] or 0)
-    
-    status_stats = list(appts_this_week.values('status').annotate(count=Count('status')))
+    revenue_this_week = float(analytics.revenue_total(start_of_week, doctor=doctor))
     
     return Response({
-         "total_appointments_this_week": appts_this_week.count(),
+         "total_appointments_this_week": analytics.appointment_total(start_of_week, doctor=doctor),
          "revenue_this_week": revenue_this_week,
-         "appointment_status": [{"status": item['status'], "count": item['count']} for item in status_stats]
+         "appointment_status": analytics.appointment_status_counts(start_of_week, doctor=doctor)
     })
@@ -28,6 +28,13 @@ LOGGING = {
         'console': {
             'class': 'logging.StreamHandler',
         },
+        'profiling_file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.getenv('QUERY_PROFILE_LOG', str(BASE_DIR / 'query_profile.log')),
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+        },
     },
     'root': {
         'handlers': ['console'],
@@ -39,6 +46,12 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        # Requests over the query budgets (accounts.profiling), one JSON object per line
+        'accounts.profiling': {
+            'handlers': ['profiling_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
@@ -78,15 +91,25 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'accounts.middleware.QueryProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'accounts.middleware.ExceptionLoggingMiddleware',
 ]
 
+# Query profiling (accounts.profiling). Off by default; admins can switch it at
+# runtime with POST /api/accounts/admin/profiling/ {"enabled": true}. Requests over
+# any budget are logged with their duplicated (N+1) queries.
+QUERY_PROFILING = os.getenv('QUERY_PROFILING', 'False') == 'True'
+QUERY_BUDGET_COUNT = int(os.getenv('QUERY_BUDGET_COUNT', '50'))
+QUERY_BUDGET_DB_MS = int(os.getenv('QUERY_BUDGET_DB_MS', '200'))
+QUERY_BUDGET_WALL_MS = int(os.getenv('QUERY_BUDGET_WALL_MS', '1000'))
+# Same query shape this many times in one request counts as an N+1
+QUERY_BUDGET_DUPLICATES = int(os.getenv('QUERY_BUDGET_DUPLICATES', '5'))
+
 
 ROOT_URLCONF = 'backend.urls'
 
@@ -111,13 +134,40 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connection reuse, from the environment (`manage.py check` reports the mode in use):
+#   DB_CONN_MAX_AGE  seconds a worker keeps its connection open (0 = new one per request)
+#   DB_POOL=True     psycopg 3 connection pool on PostgreSQL, sized by DB_POOL_MIN_SIZE /
+#                    DB_POOL_MAX_SIZE, waiting at most DB_POOL_TIMEOUT seconds for a
+#                    connection. Replaces persistent connections and is the one to use
+#                    under the ASGI server, where connections aren't reused across requests.
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '0'))
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+
 DATABASES = {
     'default': dj_database_url.config(
         default=f'sqlite:///{BASE_DIR / "db.sqlite3"}',
-        conn_max_age=0,
+        conn_max_age=DB_CONN_MAX_AGE,
         conn_health_checks=True,
     )
 }
+if DB_POOL and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    # Pooled connections go back to the pool after each request; Django refuses
+    # CONN_MAX_AGE > 0 together with a pool.
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+        'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+        'timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),
+    }
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Concurrent bookings contend for the same token counter row. Take the write lock
+    # up front and wait for it instead of failing with "database is locked".
+    DATABASES['default'].setdefault('OPTIONS', {}).update({
+        'timeout': 20,
+        'transaction_mode': 'IMMEDIATE',
+    })
+    # A file-backed test database; the shared in-memory one can't be written from several threads.
+    DATABASES['default']['TEST'] = {'NAME': BASE_DIR / 'test_db.sqlite3'}
 # Trigger reload
 
 
@@ -200,7 +250,10 @@ CORS_ALLOW_HEADERS = list(default_headers) + [
     "pragma",
     "expires",
     "authorization",
+    "if-none-match",
 ]
+# List endpoints answer If-None-Match with 304 (accounts.conditional)
+CORS_EXPOSE_HEADERS = ["ETag"]
 
 
 AUTH_USER_MODEL = 'accounts.User'
@@ -210,10 +263,14 @@ from datetime import timedelta
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.TokenClaimsAuthentication',
     ),
 }
 
+# How long a token's user (role, active flag) stays in the local memory cache; with
+# REDIS_URL saves clear it for every worker (see accounts/authentication.py)
+AUTH_USER_CACHE_SECONDS = int(os.getenv('AUTH_USER_CACHE_SECONDS', '30'))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -221,7 +278,46 @@ SIMPLE_JWT = {
 }
 
 # Email Backend (Console for Development)
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# Views only queue mail in the outbox; `python manage.py process_outbox` delivers it.
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'False') == 'True'
+EMAIL_TIMEOUT = int(os.getenv('EMAIL_TIMEOUT', '10'))
+# Used by django.core.mail.backends.filebased.EmailBackend
+EMAIL_FILE_PATH = os.getenv('EMAIL_FILE_PATH', os.path.join(BASE_DIR, 'sent_emails'))
+
+# Outbox worker: SMS/WhatsApp provider and retry policy
+OUTBOX_SMS_BACKEND = os.getenv('OUTBOX_SMS_BACKEND', 'accounts.outbox.ConsoleSMSBackend')
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))
+OUTBOX_RETRY_BASE_SECONDS = int(os.getenv('OUTBOX_RETRY_BASE_SECONDS', '30'))
+
+# Shared cache for the doctor directory, admin id list, etc. Local memory is per
+# process, so with several workers set REDIS_URL to share it and its invalidations.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Server push (/api/accounts/events/). Needs the ASGI app, as the Procfile runs it:
+#   gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker
+# The in-process broker only reaches clients connected to the same process, so it
+# is only complete with one worker (WEB_CONCURRENCY=1; see the accounts.W002 check).
+EVENTS_BROKER = os.getenv('EVENTS_BROKER', 'accounts.events.InProcessBroker')
+EVENTS_HEARTBEAT_SECONDS = int(os.getenv('EVENTS_HEARTBEAT_SECONDS', '15'))
+EVENTS_TICKET_SECONDS = int(os.getenv('EVENTS_TICKET_SECONDS', '30'))
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
 
 # Stripe Configuration
 # ⚠️ IMPORTANT: These MUST be set in production environment variables
@@ -1,5 +1,5 @@
 const isDev = import.meta.env.DEV;
-let BASE_URL = "";
+export let BASE_URL = "";
 
 if (isDev) {
   // In development, use relative path to trigger Vite proxy
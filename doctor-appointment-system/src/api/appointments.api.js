@@ -7,13 +7,8 @@ export async function createAppointment(appointmentData) {
 }
 
 export async function getAppointments() {
-  const { data } = await apiClient.get(`/appointments/?_t=${new Date().getTime()}`, {
-    headers: {
-      'Cache-Control': 'no-cache, no-store, must-revalidate',
-      'Pragma': 'no-cache',
-      'Expires': '0'
-    }
-  });
+  // "no-cache" revalidates with the stored ETag; an unchanged list comes back as a 304
+  const { data } = await apiClient.get("/appointments/", { cache: "no-cache" });
   return data;
 }
 
@@ -38,3 +33,10 @@ export async function createPaymentIntent(id) {
   const { data } = await apiClient.post(`/appointments/create-payment-intent/${id}/`, {});
   return data;
 }
+
+export async function getDoctorQueue(params = {}) {
+  // Doctors get their own queue; staff pass { doctor_id }. Optional { date: "YYYY-MM-DD" }
+  const query = new URLSearchParams(params).toString();
+  const { data } = await apiClient.get(`/doctor/queue/${query ? `?${query}` : ""}`);
+  return data;
+}
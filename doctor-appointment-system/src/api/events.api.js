@@ -0,0 +1,91 @@
+import apiClient, { BASE_URL } from "./apiClient";
+
+// With several server processes an event is only pushed by the process that handled
+// the write, so even a connected client resyncs this often
+const CONNECTED_RESYNC_MS = 60000;
+const MIN_RECONNECT_MS = 5000;
+const MAX_RECONNECT_MS = 60000;
+
+/**
+ * Subscribe to server-pushed events (notification, appointment, prescription).
+ *
+ * `resync` reloads the caller's data. It runs each time the stream (re)connects,
+ * every `pollMs` while the stream is down (e.g. backend running under WSGI) and
+ * every minute while it is up, so updates are never lost, only delayed.
+ * Returns { close, isConnected }.
+ */
+export function subscribeToEvents(handlers, { resync, pollMs = 5000 } = {}) {
+  if (typeof EventSource === "undefined") {
+    const interval = resync ? setInterval(resync, pollMs) : null;
+    return { close: () => clearInterval(interval), isConnected: () => false };
+  }
+
+  let source = null;
+  let connected = false;
+  let closed = false;
+  let retryTimer = null;
+  let retryMs = MIN_RECONNECT_MS;
+  let lastSync = Date.now();
+
+  const sync = () => {
+    lastSync = Date.now();
+    if (resync) resync();
+  };
+
+  const reconnectLater = () => {
+    if (closed) return;
+    retryTimer = setTimeout(connect, retryMs);
+    retryMs = Math.min(retryMs * 2, MAX_RECONNECT_MS);
+  };
+
+  const connect = async () => {
+    if (closed || !localStorage.getItem("access_token")) return;
+    let ticket;
+    try {
+      // EventSource can't send headers; a short-lived ticket keeps the access token out of URLs
+      ({ data: { ticket } } = await apiClient.post("/events/ticket/", {}));
+    } catch (err) {
+      // 501: the backend runs under WSGI and has no stream, so stay on polling
+      if (err.response?.status !== 501) reconnectLater();
+      return;
+    }
+    if (closed) return;
+
+    source = new EventSource(`${BASE_URL}/events/?ticket=${encodeURIComponent(ticket)}`);
+    source.onopen = () => {
+      connected = true;
+      retryMs = MIN_RECONNECT_MS;
+      sync(); // catch up on anything published while we were away
+    };
+    source.onerror = () => {
+      connected = false;
+      // The browser retries a dropped stream itself, but with the same (by then expired)
+      // ticket; once it gives up, start over with a new one
+      if (source.readyState === EventSource.CLOSED) reconnectLater();
+    };
+    Object.entries(handlers).forEach(([type, handler]) => {
+      source.addEventListener(type, (e) => {
+        try {
+          handler(JSON.parse(e.data));
+        } catch (err) {
+          console.error(`Bad ${type} event`, err);
+        }
+      });
+    });
+  };
+
+  const interval = setInterval(() => {
+    if (Date.now() - lastSync >= (connected ? CONNECTED_RESYNC_MS : pollMs)) sync();
+  }, pollMs);
+  connect();
+
+  return {
+    close: () => {
+      closed = true;
+      clearInterval(interval);
+      clearTimeout(retryTimer);
+      if (source) source.close();
+    },
+    isConnected: () => connected,
+  };
+}
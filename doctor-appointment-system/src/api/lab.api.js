@@ -1,7 +1,18 @@
 import apiClient from "./apiClient";
 
-export async function getLabReports() {
-    const { data } = await apiClient.get("/lab-reports/");
+// filters: { patient, test_name, status, date_from, date_to }
+export async function getLabReports(filters = {}) {
+    const params = new URLSearchParams();
+    Object.entries(filters).forEach(([key, value]) => {
+        if (value !== undefined && value !== null && value !== "") params.set(key, value);
+    });
+    const query = params.toString();
+    const { data } = await apiClient.get(`/lab-reports/${query ? `?${query}` : ""}`);
+    return data;
+}
+
+export async function getLabReport(id) {
+    const { data } = await apiClient.get(`/lab-reports/${id}/`);
     return data;
 }
 
@@ -9,3 +20,11 @@ export async function createLabReport(reportData) {
     const { data } = await apiClient.post("/lab-reports/create/", reportData);
     return data;
 }
+
+// file: a CSV or JSON lines export, one report per row with its own patient_id
+export async function importLabReports(file) {
+    const form = new FormData();
+    form.append("file", file);
+    const { data } = await apiClient.post("/lab-reports/import/", form);
+    return data;
+}
@@ -1,11 +1,25 @@
 import apiClient from "./apiClient";
 
-export async function getNotifications() {
-    const { data } = await apiClient.get("/notifications/");
+export async function getNotifications({ sinceId, limit } = {}) {
+    const params = new URLSearchParams();
+    if (sinceId) params.set("since_id", sinceId);
+    if (limit) params.set("limit", limit);
+    const query = params.toString();
+    const { data } = await apiClient.get(`/notifications/${query ? `?${query}` : ""}`);
     return data;
 }
 
+export async function getUnreadCount() {
+    const { data } = await apiClient.get("/notifications/unread-count/");
+    return data.unread;
+}
+
 export async function markAsRead(id) {
     const { data } = await apiClient.put(`/notifications/${id}/read/`, {});
     return data;
 }
+
+export async function markAllAsRead() {
+    const { data } = await apiClient.put("/notifications/read-all/", {});
+    return data;
+}
@@ -0,0 +1,34 @@
+import apiClient from "./apiClient";
+
+export async function getMySchedule() {
+    const { data } = await apiClient.get("/doctor/schedule/");
+    return data;
+}
+
+// templates: [{ weekday: 0-6 (Mon-Sun), start_time: "09:00", end_time: "13:00", slot_minutes, capacity }]
+export async function saveMySchedule(templates) {
+    const { data } = await apiClient.put("/doctor/schedule/", { templates });
+    return data;
+}
+
+// exception: { day, start_time?, end_time?, is_available, reason }; no times = whole day off
+export async function addScheduleException(exception) {
+    const { data } = await apiClient.post("/doctor/schedule/exceptions/", exception);
+    return data;
+}
+
+export async function removeScheduleException(id) {
+    const { data } = await apiClient.delete(`/doctor/schedule/exceptions/${id}/`);
+    return data;
+}
+
+// filters: { specialization, doctor_id, date_from, date_to, limit }
+export async function findFreeSlots(filters = {}) {
+    const params = new URLSearchParams();
+    Object.entries(filters).forEach(([key, value]) => {
+        if (value !== undefined && value !== null && value !== "") params.set(key, value);
+    });
+    const query = params.toString();
+    const { data } = await apiClient.get(`/schedule/slots/${query ? `?${query}` : ""}`);
+    return data;
+}
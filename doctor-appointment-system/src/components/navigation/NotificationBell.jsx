@@ -1,25 +1,60 @@
 import { useState, useRef, useEffect } from "react";
-import { getNotifications, markAsRead } from "../../api/notifications.api";
+import { getNotifications, getUnreadCount, markAsRead, markAllAsRead } from "../../api/notifications.api";
+import { subscribeToEvents } from "../../api/events.api";
 import toast from "react-hot-toast";
 
+const PAGE_SIZE = 50;
+
 export default function NotificationBell() {
     const [notifications, setNotifications] = useState([]);
+    const [unreadCount, setUnreadCount] = useState(0);
     const [open, setOpen] = useState(false);
     const dropdownRef = useRef(null);
-
-    const unreadCount = notifications.filter(n => !n.is_read).length;
+    // Newest notification id fetched so far; polls ask for everything after it. Pushed
+    // notifications don't move it: ids in between may only reach us through a poll.
+    const lastIdRef = useRef(0);
+    // Ids already in the list, so a notification both pushed and polled shows once
+    const seenIdsRef = useRef(new Set());
 
     useEffect(() => {
         fetchNotifications();
-        // Poll for new notifications every 30 seconds
-        const interval = setInterval(fetchNotifications, 30000);
-        return () => clearInterval(interval);
+        // New notifications are pushed by the server; resyncs cover reconnects and
+        // events published by another server process (every 30 seconds when the stream is down)
+        const events = subscribeToEvents({
+            notification: (n) => {
+                if (seenIdsRef.current.has(n.id)) return;
+                seenIdsRef.current.add(n.id);
+                setNotifications(prev => [n, ...prev].slice(0, PAGE_SIZE));
+                setUnreadCount(prev => prev + 1);
+            },
+        }, { resync: fetchNotifications, pollMs: 30000 });
+        return () => events.close();
     }, []);
 
     const fetchNotifications = async () => {
         try {
-            const data = await getNotifications();
-            setNotifications(data);
+            const unread = getUnreadCount();
+            let fresh;
+            if (!lastIdRef.current) {
+                // First load: the newest page
+                fresh = await getNotifications({ limit: PAGE_SIZE });
+            } else {
+                // Deltas come oldest first; keep asking from the last id until a page is short
+                fresh = [];
+                let page;
+                do {
+                    page = await getNotifications({ sinceId: lastIdRef.current, limit: PAGE_SIZE });
+                    if (page.length > 0) lastIdRef.current = page[page.length - 1].id;
+                    fresh = [...page.reverse(), ...fresh];
+                } while (page.length === PAGE_SIZE);
+            }
+            if (fresh.length > 0) {
+                lastIdRef.current = Math.max(lastIdRef.current, fresh[0].id);
+                const unseen = fresh.filter(n => !seenIdsRef.current.has(n.id));
+                unseen.forEach(n => seenIdsRef.current.add(n.id));
+                setNotifications(prev => [...unseen, ...prev].sort((a, b) => b.id - a.id).slice(0, PAGE_SIZE));
+            }
+            setUnreadCount(await unread);
         } catch (err) {
             console.error("Failed to fetch notifications", err);
         }
@@ -29,11 +64,22 @@ export default function NotificationBell() {
         try {
             await markAsRead(id);
             setNotifications(prev => prev.map(n => n.id === id ? { ...n, is_read: true } : n));
+            setUnreadCount(prev => Math.max(0, prev - 1));
         } catch (err) {
             toast.error("Failed to update notification");
         }
     };
 
+    const handleMarkAllAsRead = async () => {
+        try {
+            await markAllAsRead();
+            setNotifications(prev => prev.map(n => ({ ...n, is_read: true })));
+            setUnreadCount(0);
+        } catch (err) {
+            toast.error("Failed to update notifications");
+        }
+    };
+
     useEffect(() => {
         function handleClickOutside(event) {
             if (dropdownRef.current && !dropdownRef.current.contains(event.target)) {
@@ -64,9 +110,18 @@ export default function NotificationBell() {
                 <div className="absolute right-0 mt-3 w-80 bg-white rounded-2xl shadow-2xl border border-slate-100 overflow-hidden z-50 animate-fade-in-up origin-top-right">
                     <div className="px-4 py-3 bg-slate-50 border-b border-slate-100 flex items-center justify-between">
                         <span className="text-sm font-bold text-slate-800">Notifications</span>
-                        <span className="text-[10px] uppercase font-bold text-slate-400 tracking-wider">
-                            {unreadCount} Unread
-                        </span>
+                        {unreadCount > 0 ? (
+                            <button
+                                onClick={handleMarkAllAsRead}
+                                className="text-[10px] uppercase font-bold text-teal-600 hover:text-teal-700 tracking-wider"
+                            >
+                                {unreadCount} Unread · Mark all read
+                            </button>
+                        ) : (
+                            <span className="text-[10px] uppercase font-bold text-slate-400 tracking-wider">
+                                {unreadCount} Unread
+                            </span>
+                        )}
                     </div>
 
                     <div className="max-h-[400px] overflow-y-auto">
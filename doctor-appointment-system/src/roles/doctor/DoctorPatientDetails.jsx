@@ -145,7 +145,7 @@ export default function DoctorPatientDetails() {
 
         // Fetch doctors and labs
         apiClient.get('/doctors/').then(res => setDoctors(res.data));
-        getLabReports().then(setReports);
+        getLabReports({ patient: id }).then(setReports);
 
         apiClient.get('/appointments/').then(res => {
             const patientApps = res.data.filter(a =>
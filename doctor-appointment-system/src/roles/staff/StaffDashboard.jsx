@@ -1,4 +1,4 @@
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import { useNavigate } from "react-router-dom";
 import { useAppointments } from "../../hooks/useAppointments";
 import { createLabReport, getLabReports } from "../../api/lab.api";
@@ -10,6 +10,7 @@ import Button from "../../components/ui/Button";
 import Input from "../../components/ui/Input";
 import LabReportTemplate from "../../components/domain/LabReportTemplate";
 import apiClient from "../../api/apiClient";
+import { subscribeToEvents } from "../../api/events.api";
 
 export default function StaffDashboard() {
   const navigate = useNavigate();
@@ -493,36 +494,77 @@ function PatientCard({ appt, actionLabel, onAction, actionColor, readOnly, onAdd
 
 
 function PharmacySection() {
+  // Every script seen this session, in the order it was queued or dispensed
   const [scripts, setScripts] = useState([]);
+  const cursor = useRef(null);
+  const pending = scripts.filter(s => !s.is_dispensed);
+  const completed = scripts.filter(s => s.is_dispensed).reverse();
+
+  // Move scripts to the end of the list as dispensed, so the newest lead the history
+  const withDispensed = (list, ids) => {
+    const byId = new Map(list.map(s => [s.id, s]));
+    ids.forEach(id => {
+      const script = byId.get(id);
+      if (script && !script.is_dispensed) {
+        byId.delete(id);
+        byId.set(id, { ...script, is_dispensed: true });
+      }
+    });
+    return [...byId.values()];
+  };
 
   useEffect(() => {
-    const loadScripts = () => {
-      apiClient.get('/prescriptions/').then(res => setScripts(res.data));
+    // Only the queue endpoint is read: the whole pending queue once, then deltas since the last cursor
+    const loadQueue = () => {
+      const since = cursor.current;
+      const query = since ? `?${new URLSearchParams({ cursor: since })}` : '';
+      apiClient.get(`/prescriptions/queue/${query}`).then(res => {
+        const { results, dispensed, cursor: next } = res.data;
+        setScripts(prev => {
+          // A full reload replaces the pending scripts and keeps this session's history
+          const byId = new Map((since ? prev : prev.filter(s => s.is_dispensed)).map(s => [s.id, s]));
+          results.forEach(s => byId.set(s.id, s));
+          return withDispensed([...byId.values()], dispensed);
+        });
+        cursor.current = next;
+      });
     };
 
-    loadScripts(); // Initial load
-    const interval = setInterval(loadScripts, 5000); // Poll every 5 seconds
-
-    return () => clearInterval(interval);
+    loadQueue(); // Initial load
+    // Reload when the server pushes a prescription change; resyncs cover the rest
+    const events = subscribeToEvents({ prescription: loadQueue }, { resync: loadQueue });
+    return () => events.close();
   }, []);
 
+  const markDispensed = (ids) => setScripts(prev => withDispensed(prev, ids));
+
   const dispense = async (id) => {
     try {
       await apiClient.post(`/prescriptions/${id}/dispense/`);
       toast.success("Dispensed");
-      setScripts(scripts.map(s => s.id === id ? { ...s, is_dispensed: true } : s));
+      markDispensed([id]);
     } catch (err) {
       toast.error("Failed");
     }
   };
 
-  const pending = scripts.filter(s => !s.is_dispensed);
-  const completed = scripts.filter(s => s.is_dispensed);
+  const dispenseAll = async () => {
+    try {
+      const { data } = await apiClient.post('/prescriptions/dispense/', { ids: pending.map(s => s.id) });
+      toast.success(`Dispensed ${data.dispensed.length}`);
+      markDispensed([...data.dispensed, ...data.skipped]);
+    } catch (err) {
+      toast.error("Failed");
+    }
+  };
 
   return (
     <div className="grid grid-cols-1 lg:grid-cols-2 gap-8">
       <div>
-        <h3 className="text-xl font-black text-slate-800 mb-4">Pending Fulfillment ({pending.length})</h3>
+        <div className="flex justify-between items-center mb-4">
+          <h3 className="text-xl font-black text-slate-800">Pending Fulfillment ({pending.length})</h3>
+          {pending.length > 1 && <Button onClick={dispenseAll} className="bg-slate-900 text-white">Dispense All</Button>}
+        </div>
         <div className="space-y-4">
           {pending.length === 0 ? <p className="text-slate-400">No pending prescriptions.</p> : pending.map(s => (
             <Card key={s.id} className="p-6 border-l-4 border-l-amber-400">
@@ -543,7 +585,7 @@ function PharmacySection() {
         </div>
       </div>
       <div>
-        <h3 className="text-xl font-black text-slate-800 mb-4">Dispensed History</h3>
+        <h3 className="text-xl font-black text-slate-800 mb-4">Dispensed This Session</h3>
         <div className="space-y-4 opacity-75">
           {completed.map(s => (
             <div key={s.id} className="bg-white p-4 rounded-2xl border border-slate-100 flex justify-between items-center">